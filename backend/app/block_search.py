@@ -0,0 +1,45 @@
+from .rows import BLOCK_COLUMNS
+
+# Each filter of a block search, with the index of the blocks table that serves it:
+# number by the primary key, hash by idx_blocks_hash, author by idx_blocks_author,
+# the time range by idx_blocks_timestamp. Results are ordered by the primary key.
+BLOCK_SEARCH_FILTERS = {
+    'block_number': "number = %s",
+    'hash': "hash = %s",
+    'author': "authorid = %s",
+    'finalized': "finalized = %s",
+    'start_time': "timestamp >= %s",
+    'end_time': "timestamp <= %s",
+}
+
+
+def block_search_query(table_name, limit, **filters):
+    """
+    Build the query of a block search, with every filter applied in SQL.
+
+    Args:
+        table_name (str): The blocks table of the chain.
+        limit (int): The maximum number of blocks returned.
+        **filters: Values of the BLOCK_SEARCH_FILTERS. Filters that are None are not applied.
+            start_time and end_time are inclusive Unix times in milliseconds.
+
+    Returns:
+        tuple: The SQL, newest block first, and its parameters.
+    """
+    conditions = []
+    params = []
+    for name, value in filters.items():
+        if name not in BLOCK_SEARCH_FILTERS:
+            raise ValueError(f"Unknown block search filter: {name}")
+        if value is not None:
+            conditions.append(BLOCK_SEARCH_FILTERS[name])
+            params.append(value)
+    where_clause = " AND ".join(conditions) if conditions else "1=1"
+    query = f"""
+        SELECT {BLOCK_COLUMNS}
+        FROM {table_name}
+        WHERE {where_clause}
+        ORDER BY number DESC
+        LIMIT %s
+    """
+    return query, params + [limit]
@@ -0,0 +1,126 @@
+import time
+from .pallet_methods import id_condition
+
+DEFAULT_CACHE_SECONDS = 10.0
+MAX_CACHED_TOTALS = 1024
+
+EXACT = 'exact'
+ESTIMATED = 'estimated'
+
+
+class RowCounter:
+    """
+    Totals for the paginated endpoints without counting the matching rows.
+
+    - Totals within one block come from the counts stored with the block, or
+      are counted over that block alone.
+    - Event totals filtered by an extrinsic are counted over its block.
+    - Other event totals, which can only filter by pallet and method, add
+      up the counts of the matching pallet and method ids the ingest
+      maintains in event_counts and event_count_deltas, or are the
+      planner's row estimate on databases without them.
+
+    Every total is returned with its kind, 'exact' or 'estimated'. Totals
+    that are not limited to one block are cached for cache_seconds.
+    """
+
+    def __init__(self, db, relay_chain, chain, cache_seconds=DEFAULT_CACHE_SECONDS):
+        """
+        Args:
+            db (AsyncDatabasePool): The pool the counts are queried through.
+            relay_chain (str): The name of the relay chain.
+            chain (str): The name of the chain.
+            cache_seconds (float): How long a total across blocks is reused.
+        """
+        self.db = db
+        self.suffix = f"{relay_chain}_{chain}"
+        self.cache_seconds = cache_seconds
+        self._cache = {}
+        self._has_event_counts = False
+
+    async def block_total(self, table, block_number, where_clause, params, filtered):
+        """
+        Count the rows of one block that match a filter.
+
+        Args:
+            table (str): 'events' or 'extrinsics'.
+            block_number (str): The block the rows belong to.
+            where_clause (str): The filter, including the block number condition.
+            params (list): The filter values.
+            filtered (bool): Whether where_clause has conditions besides the block number.
+
+        Returns:
+            tuple: The total and its kind.
+        """
+        if not filtered:
+            result = await self.db.query(
+                f"SELECT {table}_count AS count FROM blocks_{self.suffix} WHERE number = %s", [block_number])
+            if result and result[0]['count'] is not None:
+                return int(result[0]['count']), EXACT
+        result = await self.db.query(f"SELECT COUNT(*) AS count FROM {table}_{self.suffix} WHERE {where_clause}", params)
+        return int(result[0]['count']), EXACT
+
+    async def events_total(self, where_clause, params, pallet_method_ids=None, extrinsic_id=None):
+        """
+        Count the events across all blocks that match a filter.
+
+        Args:
+            where_clause (str): The filter.
+            params (list): The filter values.
+            pallet_method_ids (list): The ids of the pallet and method pairs filtered on, if any.
+            extrinsic_id (str): The extrinsic filtered on, if any.
+
+        Returns:
+            tuple: The total and its kind.
+        """
+        key = (where_clause, tuple(tuple(param) if isinstance(param, list) else param for param in params))
+        cached = self._cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        if extrinsic_id:
+            # An extrinsic belongs to the block named in its id, so only that block is counted
+            block_number = str(extrinsic_id).split('-')[0]
+            result = await self.db.query(
+                f"SELECT COUNT(*) AS count FROM events_{self.suffix} WHERE {where_clause} AND number = %s",
+                params + [block_number])
+            total = (int(result[0]['count']), EXACT)
+        elif await self._event_counts_exist():
+            total = (await self._event_count(pallet_method_ids), EXACT)
+        else:
+            total = (await self.estimate(f"events_{self.suffix}", where_clause, params), ESTIMATED)
+
+        if len(self._cache) >= MAX_CACHED_TOTALS:
+            self._cache.clear()
+        self._cache[key] = (time.monotonic() + self.cache_seconds, total)
+        return total
+
+    async def estimate(self, table_name, where_clause, params):
+        """
+        Return the planner's estimate of the number of rows matching a filter.
+        """
+        result = await self.db.query(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {table_name} WHERE {where_clause}", params)
+        plan = result[0]['QUERY PLAN']
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    async def _event_counts_exist(self):
+        # Only a positive answer is kept, the ingest may create the tables later
+        if not self._has_event_counts:
+            result = await self.db.query("SELECT to_regclass(%s) IS NOT NULL AS found", [f"event_count_deltas_{self.suffix}"])
+            self._has_event_counts = result[0]['found']
+        return self._has_event_counts
+
+    async def _event_count(self, pallet_method_ids):
+        if pallet_method_ids is None:
+            where_clause, params = "1=1", []
+        else:
+            where_clause, value = id_condition(pallet_method_ids)
+            params = [value]
+        result = await self.db.query(f"""
+            SELECT COALESCE(SUM(count), 0) AS count FROM (
+                SELECT count FROM event_counts_{self.suffix} WHERE {where_clause}
+                UNION ALL
+                SELECT delta FROM event_count_deltas_{self.suffix} WHERE {where_clause}
+            ) counts
+        """, params + params)
+        return int(result[0]['count'])
@@ -0,0 +1,121 @@
+import functools
+import orjson
+from psycopg import AsyncConnection
+from psycopg.conninfo import make_conninfo
+from psycopg.types.json import set_json_loads
+from psycopg_pool import AsyncConnectionPool
+from .postgres_utils import TEXT_RESULT_COLUMNS
+from .binary_ids import decode_id
+
+# Type of the bytea columns binary ids are stored in
+BYTEA_OID = 17
+
+DEFAULT_MIN_SIZE = 2
+DEFAULT_MAX_SIZE = 20
+DEFAULT_STATEMENT_TIMEOUT_MS = 10000
+DEFAULT_ACQUIRE_TIMEOUT = 10.0
+
+
+class AsyncDatabasePool:
+    """
+    Application-lifetime pool of async PostgreSQL connections for the API.
+
+    Queries are awaited on the event loop, so a slow query only holds up the
+    request that issued it. Every connection runs with a statement timeout,
+    and a request waits at most acquire_timeout seconds for a free connection.
+    Query values are passed as parameters, never formatted into the SQL.
+
+    Rows are returned as plain dicts, built as they are read, and JSON
+    columns are decoded with orjson.
+    """
+
+    def __init__(self, database_info, min_size=DEFAULT_MIN_SIZE, max_size=DEFAULT_MAX_SIZE,
+                 statement_timeout_ms=DEFAULT_STATEMENT_TIMEOUT_MS, acquire_timeout=DEFAULT_ACQUIRE_TIMEOUT):
+        """
+        Args:
+            database_info (dict): The database connection settings.
+            min_size (int): The number of connections kept open while idle.
+            max_size (int): The maximum number of open connections.
+            statement_timeout_ms (int): Cancel queries running longer than this. 0 disables the timeout.
+            acquire_timeout (float): Seconds a request waits for a free connection.
+        """
+        conninfo = make_conninfo(
+            host=database_info['host'],
+            port=database_info['port'],
+            dbname=database_info['name'],
+            user=database_info['user'],
+            password=database_info['password'],
+            options=f"-c statement_timeout={int(statement_timeout_ms)}",
+            client_encoding='utf8'
+        )
+        self._conninfo = conninfo
+        max_size = max(1, max_size)
+        self._pool = AsyncConnectionPool(
+            conninfo,
+            min_size=min(max(0, min_size), max_size),
+            max_size=max_size,
+            timeout=acquire_timeout,
+            # Reads only, so no transaction is left open between queries
+            kwargs={'autocommit': True, 'row_factory': result_row},
+            configure=_configure,
+            open=False
+        )
+
+    async def open(self):
+        await self._pool.open()
+
+    async def query(self, query_str, params=None):
+        """
+        Run a query and return its rows.
+
+        Args:
+            query_str (str): The SQL, with %s or %(name)s placeholders.
+            params (tuple or dict): The placeholder values.
+
+        Returns:
+            list: The result rows, as dicts keyed by column name.
+        """
+        async with self._pool.connection() as connection:
+            cursor = await connection.execute(query_str, params)
+            return await cursor.fetchall()
+
+    async def connect(self):
+        """
+        Open a dedicated autocommit connection outside the pool, for long-lived
+        uses such as listening for notifications.
+        """
+        return await AsyncConnection.connect(self._conninfo, autocommit=True)
+
+    async def close(self):
+        await self._pool.close()
+
+
+def result_row(cursor):
+    """
+    psycopg row factory building a dict per row, with the TEXT_RESULT_COLUMNS
+    values converted to strings and binary ids to the hashes and addresses
+    they store on the way.
+    """
+    if cursor.description is None:
+        return tuple
+    columns = [desc.name for desc in cursor.description]
+    converters = [
+        _as_text if column in TEXT_RESULT_COLUMNS
+        else functools.partial(decode_id, column) if desc.type_code == BYTEA_OID
+        else None
+        for column, desc in zip(columns, cursor.description)
+    ]
+    if not any(converters):
+        return lambda values: dict(zip(columns, values))
+    return lambda values: {
+        column: convert(value) if convert and value is not None else value
+        for column, convert, value in zip(columns, converters, values)
+    }
+
+
+def _as_text(value):
+    return str(value)
+
+
+async def _configure(connection):
+    set_json_loads(orjson.loads, connection)
@@ -1,12 +1,26 @@
-from fastapi import FastAPI, HTTPException, Query, APIRouter
+from fastapi import FastAPI, HTTPException, Query, APIRouter, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+from contextlib import asynccontextmanager
 import os
 import json
+import functools
+import inspect
+import httpx
 from dotenv import load_dotenv
-from .database_utils import connect_to_database, query_recent_blocks, query_last_block, close_connection
-from .postgres_utils import query
+from .db_pool import AsyncDatabasePool
+from .sidecar_client import AsyncSidecarClient
+from .counts import RowCounter
+from .recent_blocks import RecentBlockBuffer
+from .response_cache import ResponseCache, IMMUTABLE_CACHE_CONTROL, etag_matches, finalized_etag
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, row_index
+from .block_search import block_search_query
+from .search import classify_search, search_target_query
+from .binary_ids import BinaryIds
+from .pallet_methods import PalletMethods, id_condition
+from .rows import BLOCK_COLUMNS, EVENT_COLUMNS, EXTRINSIC_COLUMNS, LOG_COLUMNS, shape_event, shape_extrinsic, shape_log
 
 # Load environment variables
 load_dotenv()
@@ -14,10 +28,54 @@ load_dotenv()
 # Create router with /api prefix
 router = APIRouter(prefix="/api")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled sidecar client for the lifetime of the application
+    app.state.sidecar = AsyncSidecarClient(
+        os.getenv('SIDECAR_URL', 'http://172.18.0.1:8080'),
+        timeout=float(os.getenv('SIDECAR_TIMEOUT', '10')),
+        max_in_flight=int(os.getenv('SIDECAR_MAX_IN_FLIGHT', '16'))
+    )
+    # One pool of database connections, shared by all requests
+    app.state.db = AsyncDatabasePool(
+        DATABASE_CONFIG,
+        min_size=int(os.getenv('DATABASE_POOL_MIN_SIZE', '2')),
+        max_size=int(os.getenv('DATABASE_POOL_MAX_SIZE', '20')),
+        statement_timeout_ms=int(os.getenv('DATABASE_STATEMENT_TIMEOUT_MS', '10000')),
+        acquire_timeout=float(os.getenv('DATABASE_POOL_TIMEOUT', '10'))
+    )
+    await app.state.db.open()
+    # The tables that store hashes and addresses as bytes
+    app.state.binary_ids = BinaryIds(app.state.db, os.getenv('RELAY_CHAIN'), os.getenv('CHAIN'))
+    # The pallet and method names of the ids extrinsics and events store
+    app.state.pallet_methods = PalletMethods(app.state.db, os.getenv('RELAY_CHAIN'), os.getenv('CHAIN'))
+    app.state.counts = RowCounter(
+        app.state.db, os.getenv('RELAY_CHAIN'), os.getenv('CHAIN'),
+        cache_seconds=float(os.getenv('COUNT_CACHE_SECONDS', '10'))
+    )
+    # The latest blocks, kept current by the ingest's commit notifications
+    app.state.recent = RecentBlockBuffer(
+        app.state.db, app.state.pallet_methods, os.getenv('RELAY_CHAIN'), os.getenv('CHAIN'),
+        size=int(os.getenv('RECENT_BLOCKS_SIZE', '100'))
+    )
+    app.state.recent.start()
+    # Rendered responses of finalized blocks, which never change
+    app.state.responses = ResponseCache(
+        max_bytes=int(os.getenv('RESPONSE_CACHE_MB', '64')) * 1024 * 1024,
+        disk_path=os.getenv('RESPONSE_CACHE_PATH') or None,
+        disk_max_bytes=int(os.getenv('RESPONSE_CACHE_DISK_MB', '1024')) * 1024 * 1024
+    )
+    yield
+    app.state.responses.close()
+    await app.state.recent.stop()
+    await app.state.db.close()
+    await app.state.sidecar.aclose()
+
 app = FastAPI(
     title="Dotlake Block Explorer API",
     description="API for exploring blockchain blocks and transactions",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -30,6 +88,16 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
+# Responses that may change soon, such as the chain head, are reusable for a block time at most
+RECENT_CACHE_CONTROL = f"public, max-age={int(os.getenv('RECENT_CACHE_SECONDS', '6'))}"
+
+@app.middleware("http")
+async def default_cache_control(request: Request, call_next):
+    response = await call_next(request)
+    if request.method == "GET" and response.status_code == 200 and 'cache-control' not in response.headers:
+        response.headers['Cache-Control'] = RECENT_CACHE_CONTROL
+    return response
+
 # Database configuration
 DATABASE_CONFIG = {
     "database": os.getenv("DATABASE_TYPE", "postgres"),
@@ -44,7 +112,8 @@ DATABASE_CONFIG = {
     "cred_path": os.getenv("DATABASE_CRED_PATH"),
 }
 
-# Pydantic models for request/response validation
+# Pydantic models documenting the responses. Row endpoints return ORJSONResponse
+# bodies shaped from the selected columns, which FastAPI does not validate again.
 class BlockResponse(BaseModel):
     relay_chain: str
     chain: str
@@ -75,10 +144,12 @@ class EventResponse(BaseModel):
 
 class PaginatedEventResponse(BaseModel):
     events: List[EventResponse]
-    total: int
-    page: int
+    total: Optional[int] = None  # Not counted when paging by cursor
+    total_kind: Optional[str] = None  # 'exact' or 'estimated'
+    page: Optional[int] = None
     page_size: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None
 
 class RecentBlocksResponse(BaseModel):
     blocks: List[BlockResponse]
@@ -104,10 +175,16 @@ class ExtrinsicResponse(BaseModel):
 
 class PaginatedExtrinsicResponse(BaseModel):
     extrinsics: List[ExtrinsicResponse]
-    total: int
-    page: int
+    total: Optional[int] = None  # Not counted when paging by cursor
+    total_kind: Optional[str] = None  # 'exact' or 'estimated'
+    page: Optional[int] = None
     page_size: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None
+
+class SearchResponse(BaseModel):
+    type: str  # 'block', 'extrinsic' or 'account'
+    id: str
 
 class AccountBalanceResponse(BaseModel):
     account_id: str
@@ -115,6 +192,71 @@ class AccountBalanceResponse(BaseModel):
     relay_chain: str
     chain: str
 
+def parse_cursor(cursor):
+    """
+    Decode the cursor query parameter, rejecting cursors this API did not issue.
+    """
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def cache_if_finalized():
+    """
+    Serve an endpoint from the response cache once the block it describes is finalized.
+
+    The endpoint returns the response content, which is rendered here. The
+    block is the endpoint's block_number argument, or the block of the
+    returned object. Responses of blocks that are not finalized yet, and
+    errors, are never cached.
+
+    Finalized responses carry a strong ETag and an immutable Cache-Control
+    header. A request whose If-None-Match holds the ETag gets a 304 without
+    a cache lookup or query.
+    """
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        async def cached_endpoint(request: Request, **kwargs):
+            key = f"{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')}:{endpoint.__name__}:{json.dumps(kwargs, sort_keys=True, default=str)}"
+            headers = {'ETag': finalized_etag(key), 'Cache-Control': IMMUTABLE_CACHE_CONTROL}
+            if etag_matches(request.headers.get('if-none-match'), headers['ETag']):
+                return Response(status_code=304, headers=headers)
+            body = await app.state.responses.get(key)
+            if body is not None:
+                return Response(content=body, media_type="application/json", headers=headers)
+
+            result = await endpoint(**kwargs)
+            response = ORJSONResponse(result)
+            if await block_is_finalized(kwargs.get('block_number'), result):
+                await app.state.responses.put(key, response.body)
+                response.headers.update(headers)
+            return response
+
+        # FastAPI reads the endpoint's parameters, plus the request
+        signature = inspect.signature(endpoint)
+        cached_endpoint.__signature__ = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter('request', inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+        ])
+        return cached_endpoint
+    return decorator
+
+async def block_is_finalized(block_number, result):
+    if 'finalized' in result:
+        finalized = result['finalized']
+    else:
+        block_number = block_number if block_number is not None else result.get('number')
+        if block_number is None:
+            return False
+        block = await app.state.db.query(
+            f"SELECT finalized FROM blocks_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')} WHERE number = %s", (block_number,))
+        if not block:
+            return False
+        finalized = block[0]['finalized']
+    return finalized is True
+
 @router.get("/")
 async def root():
     return {"message": "Welcome to Dotlake Block Explorer API"}
@@ -125,150 +267,161 @@ async def get_recent_blocks(limit: int = 50):
     Get the most recent blocks
     """
     try:
-        db_connection = connect_to_database(DATABASE_CONFIG)
-        blocks = query(db_connection, f"SELECT * FROM blocks_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')} ORDER BY timestamp DESC LIMIT {limit}")
-        close_connection(db_connection, DATABASE_CONFIG)
-        return {"blocks": blocks.to_dict('records')}
+        blocks = app.state.recent.blocks(limit)
+        if blocks is None:
+            blocks = await app.state.db.query(f"SELECT {BLOCK_COLUMNS} FROM blocks_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')} ORDER BY timestamp DESC LIMIT %s", (limit,))
+        return ORJSONResponse({"blocks": blocks})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/blocks/{block_number}", response_model=BlockResponse)
-async def get_block(block_number: str):
+@router.get("/blocks/search", response_model=RecentBlocksResponse)
+async def search_blocks(
+    block_number: Optional[int] = Query(None, description="Filter by block number"),
+    hash: Optional[str] = Query(None, description="Filter by block hash"),
+    author: Optional[str] = Query(None, description="Filter by block author"),
+    finalized: Optional[bool] = Query(None, description="Filter by finalized status"),
+    start_time: Optional[int] = Query(None, description="Only blocks at or after this Unix time in milliseconds"),
+    end_time: Optional[int] = Query(None, description="Only blocks at or before this Unix time in milliseconds"),
+    limit: int = Query(50, ge=1, le=100, description="Number of blocks to return")
+):
     """
-    Get block details by block number
+    Search blocks with various filters. Every filter is applied by an indexed
+    query over the whole chain, newest block first.
     """
     try:
-        db_connection = connect_to_database(DATABASE_CONFIG)
-        block = query(db_connection, f"SELECT * FROM blocks_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')} WHERE number = '{block_number}'")
-        close_connection(db_connection, DATABASE_CONFIG)
-        
-        if block.empty:
-            raise HTTPException(status_code=404, detail="Block not found")
-            
-        return block.iloc[0].to_dict()
+        hash = await app.state.binary_ids.param('blocks', 'hash', hash or None)
+        author = await app.state.binary_ids.param('blocks', 'authorid', author or None)
+    except ValueError:
+        # Not a hash or address the blocks table can hold
+        return ORJSONResponse({"blocks": []})
+    try:
+        search_query, params = block_search_query(
+            f"blocks_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')}", limit,
+            block_number=block_number, hash=hash, author=author, finalized=finalized,
+            start_time=start_time, end_time=end_time
+        )
+        blocks = await app.state.db.query(search_query, params)
+        return ORJSONResponse({"blocks": blocks})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/blocks/search")
-async def search_blocks(
-    block_number: Optional[str] = None,
-    hash: Optional[str] = None,
-    author: Optional[str] = None,
-    finalized: Optional[bool] = None,
-    limit: int = 50
-):
+@router.get("/search", response_model=SearchResponse)
+async def search(query: str = Query(..., description="A block number or hash, an extrinsic hash or id, or an account address")):
     """
-    Search blocks with various filters
+    Resolve a search input to the block, extrinsic or account it identifies.
+    The input is classified by its shape, and only the index of that kind of
+    identifier is probed, so a search takes one round trip.
     """
+    query = query.strip()
+    kind = classify_search(query)
+    if kind is None:
+        raise HTTPException(status_code=400, detail="Not a block number or hash, extrinsic hash or id, or account address")
+    if kind == 'account':
+        return ORJSONResponse({'type': 'account', 'id': query})
+
     try:
-        db_connection = connect_to_database(DATABASE_CONFIG)
-        blocks = query(db_connection, f"SELECT * FROM blocks_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')} ORDER BY number DESC LIMIT {limit}")
-        close_connection(db_connection, DATABASE_CONFIG)
+        target_query, params = search_target_query(f"{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')}", kind, query,
+                                                   await app.state.binary_ids.tables())
+        target = await app.state.db.query(target_query, params)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not target:
+        raise HTTPException(status_code=404, detail="No block or extrinsic found")
+    return ORJSONResponse(target[0])
+
+@router.get("/blocks/{block_number}", response_model=BlockResponse)
+@cache_if_finalized()
+async def get_block(block_number: str):
+    """
+    Get block details by block number
+    """
+    try:
+        block = await app.state.db.query(f"SELECT {BLOCK_COLUMNS} FROM blocks_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')} WHERE number = %s", (block_number,))
         
-        # Apply filters
-        if block_number:
-            blocks = blocks[blocks['number'] == block_number]
-        if hash:
-            blocks = blocks[blocks['hash'] == hash]
-        if author:
-            blocks = blocks[blocks['authorid'] == author]
-        if finalized is not None:
-            blocks = blocks[blocks['finalized'] == finalized]
+        if not block:
+            raise HTTPException(status_code=404, detail="Block not found")
             
-        return {"blocks": blocks.head(limit).to_dict('records')}
+        return block[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/blocks/{block_number}/events", response_model=PaginatedEventResponse)
+@cache_if_finalized()
 async def get_block_events(
     block_number: str,
     pallet: Optional[str] = Query(None, description="Filter events by pallet name"),
     method: Optional[str] = Query(None, description="Filter events by method name"),
     extrinsic_id: Optional[str] = Query(None, description="Filter events by extrinsic ID"),
     page: int = Query(1, ge=1, description="Page number for pagination"), 
-    page_size: int = Query(50, ge=1, le=100, description="Number of events per page")
+    page_size: int = Query(50, ge=1, le=100, description="Number of events per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page, used instead of page")
 ):
     """
     Get all events for a specific block from the events table.
-    Supports filtering by pallet, method, and extrinsic ID, and pagination.
+    Supports filtering by pallet, method, and extrinsic ID, and pagination
+    by page number or by cursor.
     """
+    position = parse_cursor(cursor)
+    if position is not None and str(position[0]) != str(block_number):
+        raise HTTPException(status_code=400, detail="Cursor does not belong to this block")
     try:
-        db_connection = connect_to_database(DATABASE_CONFIG)
-        
         # Build the query with filters
-        query_filters = [f"number = '{block_number}'"]
-        if pallet:
-            query_filters.append(f"pallet = '{pallet}'")
-        if method:
-            query_filters.append(f"method = '{method}'")
+        query_filters = ["number = %s"]
+        params = [block_number]
+        if pallet or method:
+            condition, value = id_condition(await app.state.pallet_methods.ids(pallet, method))
+            query_filters.append(condition)
+            params.append(value)
         if extrinsic_id:
-            query_filters.append(f"extrinsic_id = '{extrinsic_id}'")
+            query_filters.append("extrinsic_id = %s")
+            params.append(extrinsic_id)
             
         where_clause = " AND ".join(query_filters)
-        
-        # Calculate offset for pagination
-        offset = (page - 1) * page_size
-        
-        # Get total count
-        count_query = f"""
-            SELECT COUNT(*) as count 
-            FROM events_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')}
-            WHERE {where_clause}
-        """
-        count_result = query(db_connection, count_query)
-        total_events = count_result['count'].iloc[0]
-        
+
+        # One extra row tells whether there is a next page
+        limit_clause = "LIMIT %s"
+        limit_params = [page_size + 1]
+        total_events = total_kind = total_pages = None
+        if position is None:
+            # Page-number mode: count the matches and skip to the page
+            total_events, total_kind = await app.state.counts.block_total(
+                'events', block_number, where_clause, params, filtered=len(params) > 1)
+            total_pages = (total_events + page_size - 1) // page_size
+            limit_clause += " OFFSET %s"
+            limit_params.append((page - 1) * page_size)
+        else:
+            # Cursor mode: continue right after the last event of the previous page
+            where_clause += " AND event_index > %s"
+            params.append(position[1])
+
         # Get paginated events
         events_query = f"""
-            SELECT * 
+            SELECT {EVENT_COLUMNS}
             FROM events_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')}
             WHERE {where_clause}
-            ORDER BY event_id
-            LIMIT {page_size} OFFSET {offset}
+            ORDER BY event_index
+            {limit_clause}
         """
-        events = query(db_connection, events_query)
-        close_connection(db_connection, DATABASE_CONFIG)
+        events = await app.state.pallet_methods.named(await app.state.db.query(events_query, params + limit_params))
+        has_more = len(events) > page_size
+        events = events[:page_size]
 
-        if events.empty and page == 1:
+        if not events and page == 1 and position is None:
             raise HTTPException(status_code=404, detail="No events found for this block")
-            
-        # Process events
-        processed_events = []
-        for _, event in events.iterrows():
-            # Parse JSON data field
-            data = event['data']
-            if isinstance(data, str):
-                try:
-                    data = json.loads(data)
-                except json.JSONDecodeError:
-                    data = {'raw': data}
-            
-            # If data is a list, convert it to a dictionary with index keys
-            if isinstance(data, list):
-                data = {str(i): item for i, item in enumerate(data)}
-                    
-            processed_events.append({
-                'relay_chain': event['relay_chain'],
-                'chain': event['chain'],
-                'timestamp': event['timestamp'],
-                'number': event['number'],
-                'hash': event['hash'],
-                'extrinsic_id': event['extrinsic_id'],
-                'event_id': event['event_id'],
-                'pallet': event['pallet'],
-                'method': event['method'],
-                'data': data,
-                'source': event['source']
-            })
-            
-        total_pages = (total_events + page_size - 1) // page_size
-        
+
+        next_cursor = None
+        if has_more:
+            last_event = events[-1]
+            next_cursor = encode_cursor(last_event['number'], row_index(last_event['event_id']))
+
         return {
-            'events': processed_events,
+            'events': [shape_event(event) for event in events],
             'total': total_events,
-            'page': page,
+            'total_kind': total_kind,
+            'page': page if position is None else None,
             'page_size': page_size,
-            'total_pages': total_pages
+            'total_pages': total_pages,
+            'next_cursor': next_cursor
         }
         
     except Exception as e:
@@ -287,90 +440,61 @@ async def get_recent_extrinsics(
     success status and pays_fee status, with a configurable limit.
     """
     try:
-        db_connection = connect_to_database(DATABASE_CONFIG)
-
-        # Build WHERE clause
+        # Build WHERE clause, and the same filter for the recent block buffer
         where_clauses = []
+        params = []
+        filters = {}
+        if pallet or method:
+            condition, value = id_condition(await app.state.pallet_methods.ids(pallet, method))
+            where_clauses.append(condition)
+            params.append(value)
         if pallet:
-            where_clauses.append(f"LOWER(pallet) = LOWER('{pallet}')")
+            filters['pallet'] = pallet
         if method:
-            where_clauses.append(f"LOWER(method) = LOWER('{method}')")
+            filters['method'] = method
         if success is not None:
-            where_clauses.append(f"success = {success}")
+            where_clauses.append("success = %s")
+            params.append(success)
+            filters['success'] = success
         if pays_fee is not None:
-            where_clauses.append(f"pays_fee = {pays_fee}")
+            where_clauses.append("pays_fee = %s")
+            params.append(pays_fee)
+            filters['pays_fee'] = pays_fee
 
         where_clause = " AND ".join(where_clauses) if where_clauses else "1=1"
 
-        # Get extrinsics ordered by block number and extrinsic ID
-        extrinsics_query = f"""
-            SELECT *
-            FROM extrinsics_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')}
-            WHERE {where_clause}
-            ORDER BY CAST(split_part(number, '-', 1) AS BIGINT) DESC, 
-                     CAST(split_part(extrinsic_id, '-', 2) AS INTEGER) DESC
-            LIMIT {limit}
-        """
-        
-        extrinsics = query(db_connection, extrinsics_query)
-        close_connection(db_connection, DATABASE_CONFIG)
-
-        if extrinsics.empty:
+        extrinsics = app.state.recent.extrinsics(limit, filters)
+        if extrinsics is None:
+            # Get extrinsics ordered by block number and position in the block
+            extrinsics_query = f"""
+                SELECT {EXTRINSIC_COLUMNS}
+                FROM extrinsics_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')}
+                WHERE {where_clause}
+                ORDER BY number DESC, 
+                         extrinsic_index DESC
+                LIMIT %s
+            """
+            extrinsics = await app.state.pallet_methods.named(await app.state.db.query(extrinsics_query, params + [limit]))
+
+        if not extrinsics:
             raise HTTPException(status_code=404, detail="No extrinsics found")
 
-        # Process extrinsics
-        processed_extrinsics = []
-        for _, extrinsic in extrinsics.iterrows():
-            # Parse JSON fields
-            args = extrinsic['args']
-            info = extrinsic['info']
-            if isinstance(args, str):
-                try:
-                    args = json.loads(args)
-                except json.JSONDecodeError:
-                    args = {'raw': args}
-            if isinstance(info, str):
-                try:
-                    info = json.loads(info)
-                except json.JSONDecodeError:
-                    info = {'raw': info}
-
-            processed_extrinsics.append({
-                'method': {
-                    'pallet': extrinsic['pallet'],
-                    'method': extrinsic['method']
-                },
-                'signature': json.loads(extrinsic['signature']) if extrinsic['signature'] else None,
-                'nonce': extrinsic['nonce'],
-                'args': args,
-                'tip': extrinsic['tip'],
-                'hash': extrinsic['extrinsic_hash'],
-                'info': info,
-                'era': json.loads(extrinsic['era']) if extrinsic['era'] else None,
-                'success': extrinsic['success'],
-                'pays_fee': extrinsic['pays_fee'],
-                'index': extrinsic['extrinsic_id'],
-                'relay_chain': extrinsic['relay_chain'],
-                'chain': extrinsic['chain'],
-                'timestamp': extrinsic['timestamp'],
-                'number': extrinsic['number'],
-                'block_hash': extrinsic['hash'],
-                'event_count': extrinsic['event_count']
-            })
-
-        return {
-            'extrinsics': processed_extrinsics,
-            'total': len(processed_extrinsics),
+        return ORJSONResponse({
+            'extrinsics': [shape_extrinsic(extrinsic) for extrinsic in extrinsics],
+            'total': len(extrinsics),
+            'total_kind': None,
             'page': 1,
             'page_size': limit,
-            'total_pages': 1
-        }
+            'total_pages': 1,
+            'next_cursor': None
+        })
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/blocks/{block_number}/extrinsics", response_model=PaginatedExtrinsicResponse)
+@cache_if_finalized()
 async def get_block_extrinsics(
     block_number: str,
     pallet: Optional[str] = Query(None, description="Filter extrinsics by pallet name"),
@@ -379,221 +503,151 @@ async def get_block_extrinsics(
     pays_fee: Optional[bool] = Query(None, description="Filter by pays_fee status"),
     extrinsic_id: Optional[str] = Query(None, description="Filter by extrinsic ID"),
     page: int = Query(1, ge=1, description="Page number for pagination"),
-    page_size: int = Query(50, ge=1, le=100, description="Number of extrinsics per page")
+    page_size: int = Query(50, ge=1, le=100, description="Number of extrinsics per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page, used instead of page")
 ):
     """
     Get all extrinsics for a specific block. Supports filtering by pallet, method,
-    success status, pays_fee status and extrinsic_id, with pagination.
+    success status, pays_fee status and extrinsic_id, with pagination by page
+    number or by cursor.
     """
+    position = parse_cursor(cursor)
+    if position is not None and str(position[0]) != str(block_number):
+        raise HTTPException(status_code=400, detail="Cursor does not belong to this block")
     try:
-        db_connection = connect_to_database(DATABASE_CONFIG)
-
         # Build WHERE clause
-        where_clauses = [f"number = '{block_number}'"]
-        if pallet:
-            where_clauses.append(f"LOWER(pallet) = LOWER('{pallet}')")
-        if method:
-            where_clauses.append(f"LOWER(method) = LOWER('{method}')")
+        where_clauses = ["number = %s"]
+        params = [block_number]
+        if pallet or method:
+            condition, value = id_condition(await app.state.pallet_methods.ids(pallet, method))
+            where_clauses.append(condition)
+            params.append(value)
         if success is not None:
-            where_clauses.append(f"success = {success}")
+            where_clauses.append("success = %s")
+            params.append(success)
         if pays_fee is not None:
-            where_clauses.append(f"pays_fee = {pays_fee}")
+            where_clauses.append("pays_fee = %s")
+            params.append(pays_fee)
         if extrinsic_id:
-            where_clauses.append(f"extrinsic_id = '{extrinsic_id}'")
+            where_clauses.append("extrinsic_id = %s")
+            params.append(extrinsic_id)
 
         where_clause = " AND ".join(where_clauses)
 
-        # Get total count
-        count_query = f"""
-            SELECT COUNT(*) as count
-            FROM extrinsics_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')}
-            WHERE {where_clause}
-        """
-        count_result = query(db_connection, count_query)
-        total_extrinsics = count_result['count'].iloc[0]
-
-        # Calculate pagination
-        offset = (page - 1) * page_size
-        total_pages = (total_extrinsics + page_size - 1) // page_size
+        # One extra row tells whether there is a next page
+        limit_clause = "LIMIT %s"
+        limit_params = [page_size + 1]
+        total_extrinsics = total_kind = total_pages = None
+        if position is None:
+            # Page-number mode: count the matches and skip to the page
+            total_extrinsics, total_kind = await app.state.counts.block_total(
+                'extrinsics', block_number, where_clause, params, filtered=len(params) > 1)
+            total_pages = (total_extrinsics + page_size - 1) // page_size
+            limit_clause += " OFFSET %s"
+            limit_params.append((page - 1) * page_size)
+        else:
+            # Cursor mode: continue right after the last extrinsic of the previous page
+            where_clause += " AND extrinsic_index > %s"
+            params.append(position[1])
 
         # Get paginated extrinsics
         extrinsics_query = f"""
-            SELECT *
+            SELECT {EXTRINSIC_COLUMNS}
             FROM extrinsics_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')}
             WHERE {where_clause}
-            ORDER BY extrinsic_id
-            LIMIT {page_size} OFFSET {offset}
+            ORDER BY extrinsic_index
+            {limit_clause}
         """
-        extrinsics = query(db_connection, extrinsics_query)
-        close_connection(db_connection, DATABASE_CONFIG)
+        extrinsics = await app.state.pallet_methods.named(await app.state.db.query(extrinsics_query, params + limit_params))
+        has_more = len(extrinsics) > page_size
+        extrinsics = extrinsics[:page_size]
 
-        if extrinsics.empty and page == 1:
+        if not extrinsics and page == 1 and position is None:
             raise HTTPException(status_code=404, detail="No extrinsics found for this block")
 
-        # Process extrinsics
-        processed_extrinsics = []
-        for _, extrinsic in extrinsics.iterrows():
-            # Parse JSON fields
-            args = extrinsic['args']
-            info = extrinsic['info']
-            signature = extrinsic['signature']
-            era = extrinsic['era']
-
-            if isinstance(args, str):
-                args = json.loads(args)
-            if isinstance(info, str):
-                info = json.loads(info)
-            if isinstance(signature, str):
-                signature = json.loads(signature)
-            if isinstance(era, str):
-                era = json.loads(era)
-
-            processed_extrinsics.append({
-                'method': {
-                    'pallet': extrinsic['pallet'],
-                    'method': extrinsic['method']
-                },
-                'signature': signature,
-                'nonce': extrinsic['nonce'],
-                'args': args,
-                'tip': extrinsic['tip'],
-                'hash': extrinsic['extrinsic_hash'],
-                'info': info,
-                'era': era,
-                'success': extrinsic['success'],
-                'pays_fee': extrinsic['pays_fee'],
-                'index': extrinsic['extrinsic_id'],
-                'relay_chain': extrinsic['relay_chain'],
-                'chain': extrinsic['chain'],
-                'timestamp': extrinsic['timestamp'],
-                'number': extrinsic['number'],
-                'block_hash': extrinsic['hash'],
-                'event_count': extrinsic['event_count']
-            })
+        next_cursor = None
+        if has_more:
+            last_extrinsic = extrinsics[-1]
+            next_cursor = encode_cursor(last_extrinsic['number'], row_index(last_extrinsic['extrinsic_id']))
 
         return {
-            'extrinsics': processed_extrinsics,
+            'extrinsics': [shape_extrinsic(extrinsic) for extrinsic in extrinsics],
             'total': total_extrinsics,
-            'page': page,
+            'total_kind': total_kind,
+            'page': page if position is None else None,
             'page_size': page_size,
-            'total_pages': total_pages
+            'total_pages': total_pages,
+            'next_cursor': next_cursor
         }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/blocks/{block_number}/logs")
+@cache_if_finalized()
 async def get_block_logs(block_number: str):
     """
     Get logs for a specific block number
     """
     try:
-        db_connection = connect_to_database(DATABASE_CONFIG)
         logs_query = f"""
-            SELECT * FROM logs_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')} 
-            WHERE number = '{block_number}'
+            SELECT {LOG_COLUMNS} FROM logs_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')} 
+            WHERE number = %s
             ORDER BY index
         """
-        logs = query(db_connection, logs_query)
-        close_connection(db_connection, DATABASE_CONFIG)
+        logs = await app.state.db.query(logs_query, (block_number,))
 
-        if logs.empty:
+        if not logs:
             raise HTTPException(status_code=404, detail="No logs found for this block")
 
-        processed_logs = []
-        for _, log in logs.iterrows():
-            # Parse JSON value field if it's stored as a string
-            value = log['value']
-            if isinstance(value, str):
-                value = json.loads(value)
-
-            processed_logs.append({
-                'type': log['type'],
-                'index': log['index'],
-                'value': value
-            })
-
-        return {'logs': processed_logs}
+        return {'logs': [shape_log(log) for log in logs]}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/blocks/hash/{block_hash}", response_model=BlockResponse)
+@cache_if_finalized()
 async def get_block_by_hash(block_hash: str):
     """
     Get block details by block hash
     """
     try:
-        db_connection = connect_to_database(DATABASE_CONFIG)
-        block = query(db_connection, f"SELECT * FROM blocks_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')} WHERE hash = '{block_hash}'")
-        close_connection(db_connection, DATABASE_CONFIG)
+        hash_param = await app.state.binary_ids.param('blocks', 'hash', block_hash)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Block not found")
+    try:
+        block = await app.state.db.query(f"SELECT {BLOCK_COLUMNS} FROM blocks_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')} WHERE hash = %s", (hash_param,))
         
-        if block.empty:
+        if not block:
             raise HTTPException(status_code=404, detail="Block not found")
             
-        return block.iloc[0].to_dict()
+        return block[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/extrinsics/hash/{extrinsic_hash}", response_model=ExtrinsicResponse)
+@cache_if_finalized()
 async def get_extrinsic_by_hash(extrinsic_hash: str):
     """
     Get extrinsic details by extrinsic hash
     """
     try:
-        db_connection = connect_to_database(DATABASE_CONFIG)
+        hash_param = await app.state.binary_ids.param('extrinsics', 'extrinsic_hash', extrinsic_hash)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Extrinsic not found")
+    try:
         extrinsic_query = f"""
-            SELECT *
+            SELECT {EXTRINSIC_COLUMNS}
             FROM extrinsics_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')}
-            WHERE extrinsic_hash = '{extrinsic_hash}'
+            WHERE extrinsic_hash = %s
         """
-        extrinsic = query(db_connection, extrinsic_query)
-        close_connection(db_connection, DATABASE_CONFIG)
+        extrinsic = await app.state.pallet_methods.named(await app.state.db.query(extrinsic_query, (hash_param,)))
 
-        if extrinsic.empty:
+        if not extrinsic:
             raise HTTPException(status_code=404, detail="Extrinsic not found")
 
-        # Process the extrinsic
-        row = extrinsic.iloc[0]
-        
-        # Parse JSON fields
-        args = row['args']
-        info = row['info']
-        signature = row['signature']
-        era = row['era']
-
-        if isinstance(args, str):
-            args = json.loads(args)
-        if isinstance(info, str):
-            info = json.loads(info)
-        if isinstance(signature, str):
-            signature = json.loads(signature)
-        if isinstance(era, str):
-            era = json.loads(era)
-
-        return {
-            'method': {
-                'pallet': row['pallet'],
-                'method': row['method']
-            },
-            'signature': signature,
-            'nonce': row['nonce'],
-            'args': args,
-            'tip': row['tip'],
-            'hash': row['extrinsic_hash'],
-            'info': info,
-            'era': era,
-            'success': row['success'],
-            'pays_fee': row['pays_fee'],
-            'index': row['extrinsic_id'],
-            'relay_chain': row['relay_chain'],
-            'chain': row['chain'],
-            'timestamp': row['timestamp'],
-            'number': row['number'],
-            'block_hash': row['hash'],
-            'event_count': row['event_count']
-        }
+        return shape_extrinsic(extrinsic[0])
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -603,21 +657,18 @@ async def get_account_balances(account_id: str):
     Get account balances by account ID from the sidecar instance
     """
     try:
-        import httpx
-        sidecar_url = os.getenv('SIDECAR_URL', 'http://172.18.0.1:8080')
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{sidecar_url}/accounts/{account_id}/asset-balances")
-            if response.status_code == 404:
-                raise HTTPException(status_code=404, detail="Account not found")
-            response.raise_for_status()
-            
-            balances_data = response.json()
-            return {
-                'account_id': account_id,
-                'balances': balances_data.get('assets', []),
-                'relay_chain': os.getenv('RELAY_CHAIN'),
-                'chain': os.getenv('CHAIN')
-            }
+        response = await app.state.sidecar.get(f"/accounts/{account_id}/asset-balances")
+        if response.status_code == 404:
+            raise HTTPException(status_code=404, detail="Account not found")
+        response.raise_for_status()
+
+        balances_data = response.json()
+        return {
+            'account_id': account_id,
+            'balances': balances_data.get('assets', []),
+            'relay_chain': os.getenv('RELAY_CHAIN'),
+            'chain': os.getenv('CHAIN')
+        }
     except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch account balances: {str(e)}")
     except Exception as e:
@@ -629,93 +680,100 @@ async def get_recent_events(
     method: Optional[str] = Query(None, description="Filter events by method name"),
     extrinsic_id: Optional[str] = Query(None, description="Filter events by extrinsic ID"),
     page: int = Query(1, ge=1, description="Page number for pagination"),
-    page_size: int = Query(50, ge=1, le=100, description="Number of events per page")
+    page_size: int = Query(50, ge=1, le=100, description="Number of events per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page, used instead of page")
 ):
     """
     Get the most recent events. Supports filtering by pallet, method,
-    and extrinsic ID, with pagination.
+    and extrinsic ID, with pagination by page number or by cursor.
+
+    Deep pages should be fetched by cursor: the query then seeks straight to
+    the cursor position instead of reading and discarding the rows of every
+    earlier page, and the total count is skipped.
     """
+    position = parse_cursor(cursor)
     try:
-        db_connection = connect_to_database(DATABASE_CONFIG)
-
-        # Build WHERE clause
+        # Build WHERE clause, and the same filter for the recent block buffer
         where_clauses = []
+        params = []
+        filters = {}
+        pallet_method_ids = None
+        if pallet or method:
+            pallet_method_ids = await app.state.pallet_methods.ids(pallet, method)
+            condition, value = id_condition(pallet_method_ids)
+            where_clauses.append(condition)
+            params.append(value)
         if pallet:
-            where_clauses.append(f"LOWER(pallet) = LOWER('{pallet}')")
+            filters['pallet'] = pallet
         if method:
-            where_clauses.append(f"LOWER(method) = LOWER('{method}')")
+            filters['method'] = method
         if extrinsic_id:
-            where_clauses.append(f"extrinsic_id = '{extrinsic_id}'")
+            where_clauses.append("extrinsic_id = %s")
+            params.append(extrinsic_id)
+            filters['extrinsic_id'] = extrinsic_id
 
         where_clause = " AND ".join(where_clauses) if where_clauses else "1=1"
 
-        # Get total count
-        count_query = f"""
-            SELECT COUNT(*) as count
-            FROM events_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')}
-            WHERE {where_clause}
-        """
-        count_result = query(db_connection, count_query)
-        total_events = count_result['count'].iloc[0]
-
-        # Calculate pagination
-        offset = (page - 1) * page_size
-        total_pages = (total_events + page_size - 1) // page_size
-
-        # Get paginated events
-        events_query = f"""
-            SELECT *
-            FROM events_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')}
-            WHERE {where_clause}
-            ORDER BY timestamp DESC, event_id
-            LIMIT {page_size} OFFSET {offset}
-        """
-        events = query(db_connection, events_query)
-        close_connection(db_connection, DATABASE_CONFIG)
-
-        if events.empty and page == 1:
+        # One extra row tells whether there is a next page
+        limit_clause = "LIMIT %s"
+        limit_params = [page_size + 1]
+        total_events = total_kind = total_pages = None
+        if position is None:
+            # Page-number mode: look up the total and skip to the page
+            total_events, total_kind = await app.state.counts.events_total(
+                where_clause, params, pallet_method_ids=pallet_method_ids, extrinsic_id=extrinsic_id)
+            total_pages = (total_events + page_size - 1) // page_size
+            limit_clause += " OFFSET %s"
+            limit_params.append((page - 1) * page_size)
+        else:
+            # Cursor mode: continue after the last event of the previous page.
+            # The number bound lets the index scan start at the cursor block.
+            where_clause += " AND number <= %s AND (number < %s OR event_index > %s)"
+            params.extend([position[0], position[0], position[1]])
+
+        # The first page is usually in the recent block buffer
+        events = app.state.recent.events(page_size + 1, filters) if position is None and page == 1 else None
+        if events is None:
+            # Get paginated events, newest block first and in block order within a block
+            events_query = f"""
+                SELECT {EVENT_COLUMNS}
+                FROM events_{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')}
+                WHERE {where_clause}
+                ORDER BY number DESC, event_index
+                {limit_clause}
+            """
+            events = await app.state.pallet_methods.named(await app.state.db.query(events_query, params + limit_params))
+        has_more = len(events) > page_size
+        events = events[:page_size]
+
+        if not events and page == 1 and position is None:
             raise HTTPException(status_code=404, detail="No events found")
 
-        # Process events
-        processed_events = []
-        for _, event in events.iterrows():
-            # Parse JSON data field
-            data = event['data']
-            if isinstance(data, str):
-                try:
-                    data = json.loads(data)
-                except json.JSONDecodeError:
-                    data = {'raw': data}
-            
-            # If data is a list, convert it to a dictionary with index keys
-            if isinstance(data, list):
-                data = {str(i): item for i, item in enumerate(data)}
-                    
-            processed_events.append({
-                'relay_chain': event['relay_chain'],
-                'chain': event['chain'],
-                'timestamp': event['timestamp'],
-                'number': event['number'],
-                'hash': event['hash'],
-                'extrinsic_id': event['extrinsic_id'],
-                'event_id': event['event_id'],
-                'pallet': event['pallet'],
-                'method': event['method'],
-                'data': data,
-                'source': event['source']
-            })
+        next_cursor = None
+        if has_more:
+            last_event = events[-1]
+            next_cursor = encode_cursor(last_event['number'], row_index(last_event['event_id']))
 
-        return {
-            'events': processed_events,
+        return ORJSONResponse({
+            'events': [shape_event(event) for event in events],
             'total': total_events,
-            'page': page,
+            'total_kind': total_kind,
+            'page': page if position is None else None,
             'page_size': page_size,
-            'total_pages': total_pages
-        }
+            'total_pages': total_pages,
+            'next_cursor': next_cursor
+        })
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Get the hit, miss and eviction counters of the finalized response cache
+    """
+    return app.state.responses.summary()
+
 # Include the router in the app
 app.include_router(router)
 
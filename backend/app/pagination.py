@@ -0,0 +1,44 @@
+import base64
+import binascii
+import json
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(number, index):
+    """
+    Build the opaque cursor that resumes a listing after the given row.
+
+    Args:
+        number (int): The block number of the last row returned.
+        index (int): The position of that row within its block.
+
+    Returns:
+        str: A URL-safe cursor.
+    """
+    payload = json.dumps([int(number), int(index)], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Read the (number, index) position back from a cursor.
+
+    Raises:
+        InvalidCursor: If the cursor was not produced by encode_cursor.
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        number, index = json.loads(payload)
+        return int(number), int(index)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def row_index(identifier):
+    """
+    Return the position within the block of an event_id or extrinsic_id.
+    """
+    return int(str(identifier).split('-')[1])
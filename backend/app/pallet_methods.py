@@ -0,0 +1,101 @@
+import time
+
+DEFAULT_RELOAD_SECONDS = 60.0
+# A name that matches no pair reloads the pairs, but not more often than this
+MISS_RELOAD_SECONDS = 1.0
+
+
+def id_condition(pallet_method_ids):
+    """
+    Return the SQL condition selecting the rows of some pallet and method ids,
+    and its parameter. A single id is compared with =, which lets index scans
+    return the rows in index order.
+    """
+    if len(pallet_method_ids) == 1:
+        return "pallet_method_id = %s", pallet_method_ids[0]
+    return "pallet_method_id = ANY(%s)", pallet_method_ids
+
+
+class PalletMethods:
+    """
+    The pallet and method pairs of a chain, numbered by the ingest.
+
+    Extrinsics and events store the id of their pair from the chain's
+    pallet_methods table instead of the names. The pairs are loaded once and
+    kept in memory, so pallet and method filters are resolved to ids, and
+    the ids of the rows read back to names, without a query or a join. The
+    ingest only ever adds pairs, so the pairs are reloaded every
+    reload_seconds, and sooner when a name matches none of them or a row
+    refers to an id that is not loaded yet.
+    """
+
+    def __init__(self, db, relay_chain, chain, reload_seconds=DEFAULT_RELOAD_SECONDS):
+        """
+        Args:
+            db (AsyncDatabasePool): The pool the pairs are loaded through.
+            relay_chain (str): The name of the relay chain.
+            chain (str): The name of the chain.
+            reload_seconds (float): How long loaded pairs are used before they are reloaded.
+        """
+        self.db = db
+        self.suffix = f"{relay_chain}_{chain}"
+        self.reload_seconds = reload_seconds
+        self._names = {}
+        self._lower_names = []
+        self._loaded_at = None
+
+    async def ids(self, pallet=None, method=None):
+        """
+        Return the ids of the pairs matching a pallet and a method, compared
+        case-insensitively. A name that is None matches every pair.
+
+        Returns:
+            list: The matching ids, empty if no pair matches.
+        """
+        await self._load_if_stale()
+        ids = self._match(pallet, method)
+        if not ids and await self._reload_on_miss():
+            ids = self._match(pallet, method)
+        return ids
+
+    async def named(self, rows):
+        """
+        Return extrinsic or event rows with their pallet_method_id replaced by
+        the pallet and method names, in its place.
+        """
+        await self._load_if_stale()
+        # The ingest commits a pair before any row refers to it, so an unknown id is always new
+        if any(row['pallet_method_id'] is not None and row['pallet_method_id'] not in self._names for row in rows):
+            await self._load()
+        return [self._named(row) for row in rows]
+
+    def _named(self, row):
+        named = {}
+        for column, value in row.items():
+            if column == 'pallet_method_id':
+                named['pallet'], named['method'] = self._names.get(value, (None, None))
+            else:
+                named[column] = value
+        return named
+
+    def _match(self, pallet, method):
+        pallet = pallet.lower() if pallet else None
+        method = method.lower() if method else None
+        return [pallet_method_id for pallet_method_id, pair_pallet, pair_method in self._lower_names
+                if (pallet is None or pair_pallet == pallet) and (method is None or pair_method == method)]
+
+    async def _load_if_stale(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.reload_seconds:
+            await self._load()
+
+    async def _reload_on_miss(self):
+        if time.monotonic() - self._loaded_at <= MISS_RELOAD_SECONDS:
+            return False
+        await self._load()
+        return True
+
+    async def _load(self):
+        rows = await self.db.query(f"SELECT id, pallet, method FROM pallet_methods_{self.suffix} ORDER BY id")
+        self._names = {row['id']: (row['pallet'], row['method']) for row in rows}
+        self._lower_names = [(row['id'], row['pallet'].lower(), row['method'].lower()) for row in rows]
+        self._loaded_at = time.monotonic()
@@ -164,12 +164,22 @@ def delete_table(connection, table_name):
             cursor.close()
 
 
+# Numeric columns of the typed schema that the API has always returned as strings
+TEXT_RESULT_COLUMNS = ('number', 'index', 'tip', 'nonce')
+
 def query(connection, query_str):
     try:
         cursor = connection.cursor()
         cursor.execute(query_str)
         columns = [desc[0] for desc in cursor.description]
         results = cursor.fetchall()
+        text_positions = [position for position, column in enumerate(columns) if column in TEXT_RESULT_COLUMNS]
+        if text_positions:
+            results = [
+                tuple(str(value) if position in text_positions and value is not None else value
+                      for position, value in enumerate(row))
+                for row in results
+            ]
         df = pd.DataFrame(results, columns=columns)
         return df
     except Error as e:
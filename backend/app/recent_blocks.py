@@ -0,0 +1,180 @@
+import asyncio
+import json
+import logging
+from psycopg import sql
+from .rows import BLOCK_COLUMNS, EVENT_COLUMNS, EXTRINSIC_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZE = 100
+RECONNECT_SECONDS = 5
+
+
+class RecentBlockBuffer:
+    """
+    The latest blocks of a chain with their extrinsics and events, kept in memory.
+
+    The ingest announces every transaction that writes blocks on the chain's
+    notification channel. The buffer listens on that channel and reloads
+    exactly the announced blocks when they are committed, so the recent-data
+    endpoints are answered without database queries and never serve data
+    older than the last commit.
+
+    A lookup returns None whenever the buffer cannot answer it completely:
+    before the first load, while the notification connection is down, and
+    when the buffered blocks hold fewer matching rows than requested. The
+    caller then queries the database.
+    """
+
+    def __init__(self, db, pallet_methods, relay_chain, chain, size=DEFAULT_SIZE):
+        """
+        Args:
+            db (AsyncDatabasePool): The pool the blocks are loaded through.
+            pallet_methods (PalletMethods): The pallet and method names of the chain.
+            relay_chain (str): The name of the relay chain.
+            chain (str): The name of the chain.
+            size (int): The number of blocks kept.
+        """
+        self.db = db
+        self.pallet_methods = pallet_methods
+        self.suffix = f"{relay_chain}_{chain}"
+        self.channel = f"dotlake_blocks_{relay_chain}_{chain}"
+        self.size = max(1, size)
+        self.ready = False
+        self._blocks = {}
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def blocks(self, limit):
+        """
+        Return the latest blocks, newest first, or None if they are not all buffered.
+        """
+        if not self.ready or limit > self.size:
+            return None
+        numbers = sorted(self._blocks, reverse=True)[:limit]
+        return [self._blocks[number]['block'] for number in numbers]
+
+    def extrinsics(self, limit, filters=None):
+        """
+        Return the latest extrinsics matching the filters, newest first, or None
+        if older blocks that are not buffered may hold some of them.
+
+        Args:
+            limit (int): The number of extrinsics wanted.
+            filters (dict): Column values to match. Pallet and method match case-insensitively.
+        """
+        return self._rows('extrinsics', limit, filters or {}, newest_first=True)
+
+    def events(self, limit, filters=None):
+        """
+        Return the latest events matching the filters, or None if older blocks
+        that are not buffered may hold some of them. Blocks are ordered newest
+        first and events in block order within a block.
+
+        Args:
+            limit (int): The number of events wanted.
+            filters (dict): Column values to match. Pallet and method match case-insensitively.
+        """
+        return self._rows('events', limit, filters or {}, newest_first=False)
+
+    def _rows(self, table, limit, filters, newest_first):
+        if not self.ready:
+            return None
+        rows = []
+        for number in sorted(self._blocks, reverse=True):
+            block_rows = self._blocks[number][table]
+            for row in (reversed(block_rows) if newest_first else block_rows):
+                if _matches(row, filters):
+                    rows.append(row)
+                    if len(rows) == limit:
+                        return rows
+        if len(self._blocks) >= self.size:
+            return None
+        # Fewer blocks exist than the buffer holds, so every matching row is here
+        return rows
+
+    async def _listen(self):
+        while True:
+            try:
+                connection = await self.db.connect()
+                async with connection:
+                    await connection.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self.channel)))
+                    # Listening starts before the load, so no commit in between is missed
+                    await self._load()
+                    self.ready = True
+                    logger.info(f"Buffered the latest {len(self._blocks)} blocks of {self.suffix}")
+                    async for notify in connection.notifies():
+                        committed = json.loads(notify.payload)
+                        await self._load(committed['first'], committed['last'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Recent block notifications interrupted: {e}. Reconnecting in {RECONNECT_SECONDS} seconds.")
+            self.ready = False
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+    async def _load(self, first_block=None, last_block=None):
+        """
+        Load the committed blocks between first_block and last_block, or the
+        latest blocks if no range is given, and keep the newest size blocks.
+        """
+        if first_block is None:
+            block_filter, params = "1=1", []
+            buffered = {}
+        else:
+            if len(self._blocks) >= self.size:
+                oldest = min(self._blocks)
+                if last_block < oldest:
+                    return
+                first_block = max(first_block, oldest)
+            block_filter, params = "number BETWEEN %s AND %s", [first_block, last_block]
+            buffered = dict(self._blocks)
+
+        blocks = await self.db.query(f"""
+            SELECT {BLOCK_COLUMNS} FROM blocks_{self.suffix} WHERE {block_filter} ORDER BY number DESC LIMIT %s
+        """, params + [self.size])
+        if not blocks:
+            self._blocks = buffered
+            return
+        numbers = {int(block['number']) for block in blocks}
+        row_range = [min(numbers), max(numbers)]
+        extrinsics = await self.pallet_methods.named(await self.db.query(f"""
+            SELECT {EXTRINSIC_COLUMNS} FROM extrinsics_{self.suffix}
+            WHERE number BETWEEN %s AND %s ORDER BY number, extrinsic_index
+        """, row_range))
+        events = await self.pallet_methods.named(await self.db.query(f"""
+            SELECT {EVENT_COLUMNS} FROM events_{self.suffix}
+            WHERE number BETWEEN %s AND %s ORDER BY number, event_index
+        """, row_range))
+
+        for block in blocks:
+            buffered[int(block['number'])] = {'block': block, 'extrinsics': [], 'events': []}
+        for table, rows in (('extrinsics', extrinsics), ('events', events)):
+            for row in rows:
+                number = int(row['number'])
+                if number in numbers:
+                    buffered[number][table].append(row)
+        for number in sorted(buffered)[:-self.size]:
+            del buffered[number]
+        self._blocks = buffered
+
+
+def _matches(row, filters):
+    for column, value in filters.items():
+        if column in ('pallet', 'method'):
+            if row[column] is None or row[column].lower() != value.lower():
+                return False
+        elif row[column] != value:
+            return False
+    return True
@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_DISK_MAX_BYTES = 1024 * 1024 * 1024
+
+# Part of every key and ETag. Bump it when the body of a cached endpoint
+# changes, so that bodies rendered by an older version are not served and
+# clients holding them do not get a 304.
+RESPONSE_FORMAT_VERSION = 1
+
+# Responses of finalized blocks may be kept by any cache for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def finalized_etag(key):
+    """
+    Return the strong ETag of the finalized response cached under a key.
+
+    A finalized response never changes, so the tag depends only on the key
+    and the response format, and a request carrying it can be answered
+    without rendering or looking up anything.
+    """
+    digest = hashlib.sha256(f"{RESPONSE_FORMAT_VERSION}:{key}".encode()).hexdigest()[:32]
+    return f'"f{RESPONSE_FORMAT_VERSION}-{digest}"'
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Whether an If-None-Match header lists the ETag, compared weakly as RFC 9110 requires.
+    """
+    if not if_none_match:
+        return False
+    return any(tag.strip().removeprefix('W/') == etag for tag in if_none_match.split(','))
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of rendered JSON response bodies.
+
+    Only responses that can never change belong here, such as those of
+    finalized blocks. The memory tier holds up to max_bytes of bodies and
+    evicts the least recently used. With a disk_path, every body is also
+    written to a SQLite file bounded by disk_max_bytes, which outlives
+    restarts and refills the memory tier on a hit.
+
+    The disk tier is read and written in worker threads, so that disk
+    latency does not hold up the event loop. Disk hits are recorded in
+    memory and written with the next write to the disk tier.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, disk_path=None, disk_max_bytes=DEFAULT_DISK_MAX_BYTES):
+        """
+        Args:
+            max_bytes (int): The total size of the bodies kept in memory.
+            disk_path (str): The SQLite file of the disk tier, or None for memory only.
+            disk_max_bytes (int): The total size of the bodies kept on disk.
+        """
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'disk_evictions': 0}
+        self._disk = None
+        self._disk_lock = threading.Lock()
+        # Keys read from the disk tier since its last write, and when
+        self._disk_used = {}
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False, isolation_level=None)
+            self._disk.execute("PRAGMA journal_mode = WAL")
+            self._disk.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    body BLOB,
+                    size INTEGER,
+                    used REAL
+                )
+            """)
+            self._disk.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (used)")
+            self._disk_entries, self._disk_bytes = self._disk.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+
+    async def get(self, key):
+        """
+        Return the cached body of a key, or None.
+        """
+        key = f"{RESPONSE_FORMAT_VERSION}:{key}"
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return body
+        if self._disk is not None:
+            body = await asyncio.to_thread(self._read_disk, key)
+            if body is not None:
+                self.stats['disk_hits'] += 1
+                self._remember(key, body)
+                return body
+        self.stats['misses'] += 1
+        return None
+
+    async def put(self, key, body):
+        """
+        Cache the body of a key.
+
+        Args:
+            key (str): The key, unique per endpoint and parameters.
+            body (bytes): The rendered response body.
+        """
+        key = f"{RESPONSE_FORMAT_VERSION}:{key}"
+        self._remember(key, body)
+        if self._disk is not None and len(body) <= self.disk_max_bytes:
+            await asyncio.to_thread(self._write_disk, key, body)
+
+    def summary(self):
+        """
+        Return the hit, miss and eviction counters and the current size of each tier.
+        """
+        summary = dict(self.stats, entries=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes)
+        if self._disk is not None:
+            summary['disk_entries'] = self._disk_entries
+            summary['disk_bytes'] = self._disk_bytes
+            summary['disk_max_bytes'] = self.disk_max_bytes
+        return summary
+
+    def close(self):
+        if self._disk is not None:
+            with self._disk_lock:
+                self._touch_disk()
+                self._disk.close()
+                self._disk = None
+
+    def _remember(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous)
+        self._entries[key] = body
+        self._bytes += len(body)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.stats['evictions'] += 1
+
+    def _read_disk(self, key):
+        with self._disk_lock:
+            if self._disk is None:
+                # Closed while the read waited for the lock
+                return None
+            row = self._disk.execute("SELECT body FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._disk_used[key] = time.time()
+        return bytes(row[0])
+
+    def _write_disk(self, key, body):
+        with self._disk_lock:
+            if self._disk is None:
+                return
+            previous = self._disk.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._disk.execute("INSERT OR REPLACE INTO responses (key, body, size, used) VALUES (?, ?, ?, ?)",
+                               (key, body, len(body), time.time()))
+            self._disk_used.pop(key, None)
+            self._disk_bytes += len(body) - (previous[0] if previous else 0)
+            self._disk_entries += 0 if previous else 1
+            # Eviction picks the least recently used entries, so the recorded hits are written first
+            self._touch_disk()
+            self._evict_disk()
+
+    def _touch_disk(self):
+        if self._disk_used:
+            self._disk.executemany("UPDATE responses SET used = ? WHERE key = ?",
+                                   [(used, key) for key, used in self._disk_used.items()])
+            self._disk_used.clear()
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.disk_max_bytes:
+            # Drop the least recently used tenth of the entries at a time
+            evicted = self._disk.execute("""
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY used LIMIT MAX(1, (SELECT COUNT(*) FROM responses) / 10)
+                ) RETURNING size
+            """).fetchall()
+            self._disk_bytes -= sum(size for size, in evicted)
+            self._disk_entries -= len(evicted)
+            self.stats['disk_evictions'] += len(evicted)
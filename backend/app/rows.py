@@ -0,0 +1,68 @@
+import orjson
+
+# The columns each response is built from, in response order. Selecting only
+# these lets rows be returned as they are, without a response model dropping
+# the rest. The pallet_method_id of extrinsics and events is replaced by the
+# pallet and method names with PalletMethods.named.
+BLOCK_COLUMNS = """relay_chain, chain, timestamp, number, hash, parenthash, stateroot, extrinsicsroot,
+    authorid, finalized, extrinsics_count, events_count, logs_count"""
+EVENT_COLUMNS = "relay_chain, chain, timestamp, number, hash, extrinsic_id, event_id, pallet_method_id, data, source"
+EXTRINSIC_COLUMNS = """relay_chain, chain, timestamp, number, hash, extrinsic_id, pallet_method_id, args, info,
+    extrinsic_hash, tip, nonce, signature, era, success, pays_fee, event_count"""
+LOG_COLUMNS = "type, index, value"
+
+
+def shape_event(row):
+    """
+    Return an event row as it appears in responses. Event data is always an
+    object, so positional data is keyed by position.
+    """
+    data = _json_field(row['data'])
+    if isinstance(data, list):
+        data = {str(i): item for i, item in enumerate(data)}
+    return {**row, 'data': data}
+
+
+def shape_extrinsic(row):
+    """
+    Return an extrinsic row as it appears in responses.
+    """
+    return {
+        'method': {
+            'pallet': row['pallet'],
+            'method': row['method']
+        },
+        'signature': _json_field(row['signature']) if row['signature'] else None,
+        'nonce': row['nonce'],
+        'args': _json_field(row['args']),
+        'tip': row['tip'],
+        'hash': row['extrinsic_hash'],
+        'info': _json_field(row['info']),
+        'era': _json_field(row['era']) if row['era'] else None,
+        'success': row['success'],
+        'pays_fee': row['pays_fee'],
+        'index': row['extrinsic_id'],
+        'relay_chain': row['relay_chain'],
+        'chain': row['chain'],
+        'timestamp': row['timestamp'],
+        'number': row['number'],
+        'block_hash': row['hash'],
+        'event_count': row['event_count']
+    }
+
+
+def shape_log(row):
+    """
+    Return a log row as it appears in responses.
+    """
+    return {**row, 'value': _json_field(row['value'])}
+
+
+def _json_field(value):
+    # JSONB columns arrive decoded, columns holding JSON text do not
+    if not isinstance(value, str):
+        return value
+    try:
+        return orjson.loads(value)
+    except orjson.JSONDecodeError:
+        return {'raw': value}
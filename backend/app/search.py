@@ -0,0 +1,79 @@
+import re
+from .binary_ids import encode_id
+
+# The largest block number a BIGINT column holds
+MAX_BLOCK_NUMBER = 2 ** 63 - 1
+
+# The shapes of the identifiers a search resolves. Block numbers and extrinsic ids
+# are captured with the block number they refer to.
+BLOCK_NUMBER = re.compile(r'(\d{1,19})')
+EXTRINSIC_ID = re.compile(r'(\d{1,19})-\d{1,10}')
+HASH = re.compile(r'0x[0-9a-fA-F]{64}')
+# SS58 addresses are base58, which leaves out 0, I, O and l
+ACCOUNT = re.compile(r'[1-9A-HJ-NP-Za-km-z]{46,48}')
+
+
+def classify_search(query):
+    """
+    Tell what a search input identifies from its shape alone.
+
+    Returns:
+        str: 'block_number', 'extrinsic_id', 'hash' or 'account', or None if
+            the input has none of these shapes.
+    """
+    for kind, pattern in (('block_number', BLOCK_NUMBER), ('extrinsic_id', EXTRINSIC_ID)):
+        match = pattern.fullmatch(query)
+        if match:
+            return kind if int(match.group(1)) <= MAX_BLOCK_NUMBER else None
+    if HASH.fullmatch(query):
+        return 'hash'
+    if ACCOUNT.fullmatch(query):
+        return 'account'
+    return None
+
+
+def search_target_query(suffix, kind, query, binary_tables=frozenset()):
+    """
+    Build the single query that resolves a search input to its target.
+
+    Block numbers are looked up by the primary key of the blocks table and
+    extrinsic ids by that of the extrinsics table, which also prunes every
+    other partition. A hash is looked up by idx_blocks_hash first, and by
+    idx_extrinsics_hash only if no block has it.
+
+    Args:
+        suffix (str): The <relay_chain>_<chain> suffix of the chain's tables.
+        kind (str): The kind of the input, from classify_search. Accounts
+            are not stored and need no query.
+        query (str): The search input.
+        binary_tables (frozenset): The tables that store hashes as bytes, from BinaryIds.tables.
+
+    Returns:
+        tuple: The SQL, returning the type and the id of the target if it
+            exists, and its parameters.
+    """
+    if kind == 'block_number':
+        return f"""
+            SELECT 'block' AS type, number::text AS id
+            FROM blocks_{suffix}
+            WHERE number = %s
+        """, (int(query),)
+    if kind == 'extrinsic_id':
+        return f"""
+            SELECT 'extrinsic' AS type, extrinsic_id AS id
+            FROM extrinsics_{suffix}
+            WHERE number = %s AND extrinsic_id = %s
+        """, (int(query.split('-')[0]), query)
+    if kind == 'hash':
+        # Hashes are stored in lowercase. The Append stops at the first row, so a
+        # block hash never probes the extrinsics.
+        query = query.lower()
+        block_hash = encode_id('hash', query) if 'blocks' in binary_tables else query
+        extrinsic_hash = encode_id('extrinsic_hash', query) if 'extrinsics' in binary_tables else query
+        return f"""
+            (SELECT 'block' AS type, number::text AS id FROM blocks_{suffix} WHERE hash = %s LIMIT 1)
+            UNION ALL
+            (SELECT 'extrinsic' AS type, extrinsic_id AS id FROM extrinsics_{suffix} WHERE extrinsic_hash = %s LIMIT 1)
+            LIMIT 1
+        """, (block_hash, extrinsic_hash)
+    raise ValueError(f"No search query for {kind}")
@@ -0,0 +1,76 @@
+import asyncio
+import httpx
+
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MAX_CONNECTIONS = 32
+DEFAULT_MAX_IN_FLIGHT = 16
+
+
+class AsyncSidecarClient:
+    """
+    Pooled async client for the Substrate API Sidecar.
+
+    Connections are kept alive and reused across requests, responses are
+    negotiated as gzip, every request has a timeout and the number of
+    requests in flight is bounded by a semaphore.
+    """
+
+    def __init__(self, base_url, timeout=DEFAULT_TIMEOUT, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        """
+        Args:
+            base_url (str): The sidecar base URL.
+            timeout (float): Seconds allowed for each request.
+            max_connections (int): The size of the keep-alive connection pool.
+            max_in_flight (int): The maximum number of concurrent requests.
+        """
+        self.base_url = base_url.rstrip('/')
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            headers={'Accept-Encoding': 'gzip'}
+        )
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def get(self, path, params=None):
+        """
+        Issue a GET request against the sidecar.
+
+        Args:
+            path (str): The request path, e.g. '/blocks/head'.
+            params (dict): Optional query parameters.
+
+        Returns:
+            httpx.Response: The response, which has not been status-checked.
+        """
+        async with self._in_flight:
+            return await self._client.get(path, params=params)
+
+    async def get_json(self, path, params=None):
+        response = await self.get(path, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def get_block(self, block_id):
+        """
+        Fetch a single block and check it is the one requested.
+
+        Args:
+            block_id (int): The block number to fetch.
+
+        Returns:
+            dict: The raw sidecar block payload.
+        """
+        block_data = await self.get_json(f'/blocks/{block_id}')
+        if int(block_id) != int(block_data['number']):
+            raise Exception(f"Block Id mismatch for {block_id}. Sidecar cloud run service returned wrong block. "
+                            f"Returned block data {block_data}")
+        return block_data
+
+    async def get_chain_head(self):
+        head_data = await self.get_json('/blocks/head')
+        return int(head_data['number'])
+
+    async def aclose(self):
+        await self._client.aclose()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Tests of the conversion of hashes and addresses to and from their stored bytes.
+"""
+
+import pytest
+
+from app.binary_ids import decode_id, encode_id
+from app.search import search_target_query
+
+ALICE_KEY = "d43593c715fdd31c61141abd04a99fd6822c8558854ccde39a5684e7a56da27d"
+BLOCK_HASH = "0x" + "ab" * 32
+
+
+@pytest.mark.parametrize("address, payload", [
+    ("15oF4uVJwmo4TdGW7VfQxNLavjCXviqxT9S1MgbjMNHr6Sp5", "00" + ALICE_KEY),
+    ("5GrwvaEF5zXb26Fz9rcQpDWS57CtERHpNehXCPcNoHGKutQY", "2a" + ALICE_KEY),
+])
+def test_address_round_trip(address, payload):
+    assert encode_id('authorid', address) == bytes.fromhex(payload)
+    assert decode_id('authorid', bytes.fromhex(payload)) == address
+
+
+@pytest.mark.parametrize("column, value", [
+    ('hash', BLOCK_HASH),
+    ('extrinsic_hash', "0x"),
+    ('authorid', "0x" + "12" * 20),
+])
+def test_hex_round_trip(column, value):
+    assert decode_id(column, encode_id(column, value)) == value
+
+
+@pytest.mark.parametrize("column, value", [
+    ('hash', BLOCK_HASH[2:]),
+    ('hash', "0xzz"),
+    ('authorid', "15oF4uVJwmo4TdGW7VfQxNLavjCXviqxT9S1MgbjMNHr6Sp6"),
+    ('authorid', "0x00" + ALICE_KEY),
+])
+def test_rejected(column, value):
+    with pytest.raises(ValueError):
+        encode_id(column, value)
+
+
+def test_search_hash_follows_table_format():
+    _, params = search_target_query("polkadot_polkadot", 'hash', BLOCK_HASH.upper().replace("0X", "0x"),
+                                    frozenset({'blocks'}))
+    assert params == (bytes.fromhex("ab" * 32), BLOCK_HASH)
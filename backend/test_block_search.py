@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Tests of the block search query builder.
+
+The plan check builds a scratch copy of the blocks table with the indexes of
+the database maintenance service in the PostgreSQL database configured by the
+DATABASE_* environment variables, and is skipped without one.
+"""
+
+import itertools
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+from app.block_search import BLOCK_SEARCH_FILTERS, block_search_query
+
+INGEST_DIR = Path(__file__).resolve().parent.parent / "ingest"
+SCRATCH_RELAY_CHAIN = "search"
+SCRATCH_CHAIN = "plan"
+SCRATCH_BLOCKS = 20000
+UNFINALIZED_BLOCKS = 10
+AUTHORS = 50
+
+
+def test_no_filters():
+    query, params = block_search_query("blocks_polkadot_polkadot", 50)
+    assert "WHERE 1=1" in query
+    assert "ORDER BY number DESC" in query
+    assert params == [50]
+
+
+def test_filter_values_are_parameters():
+    query, params = block_search_query(
+        "blocks_polkadot_polkadot", 10,
+        block_number=5, hash="0xabc", author="5Grw", finalized=True, start_time=1, end_time=2
+    )
+    assert "0xabc" not in query and "5Grw" not in query
+    assert query.count("%s") == len(params) == 7
+    assert params == [5, "0xabc", "5Grw", True, 1, 2, 10]
+
+
+def test_unset_filters_are_skipped():
+    query, params = block_search_query("blocks_polkadot_polkadot", 10, hash=None, author="5Grw")
+    assert "hash = %s" not in query
+    assert params == ["5Grw", 10]
+
+
+def test_unknown_filter():
+    with pytest.raises(ValueError):
+        block_search_query("blocks_polkadot_polkadot", 10, parent="0xabc")
+
+
+@pytest.fixture(scope="module")
+def scratch_chain():
+    """
+    A connection with a temporary blocks table shaped and indexed like the real
+    ones, filled with SCRATCH_BLOCKS blocks of which the newest are not finalized.
+    """
+    psycopg2 = pytest.importorskip("psycopg2")
+    if not os.getenv("DATABASE_HOST"):
+        pytest.skip("DATABASE_HOST is not set")
+    try:
+        connection = psycopg2.connect(
+            host=os.getenv("DATABASE_HOST"),
+            port=os.getenv("DATABASE_PORT", "5432"),
+            dbname=os.getenv("DATABASE_NAME"),
+            user=os.getenv("DATABASE_USER"),
+            password=os.getenv("DATABASE_PASSWORD")
+        )
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"Database unavailable: {e}")
+
+    sys.path.insert(0, str(INGEST_DIR))
+    from postgres_utils import TABLE_COLUMNS
+    from db_maintenance import create_indexes
+
+    suffix = f"{SCRATCH_RELAY_CHAIN}_{SCRATCH_CHAIN}"
+    with connection.cursor() as cursor:
+        # Temporary tables shadow any real tables of the same name
+        for table, columns in TABLE_COLUMNS.items():
+            cursor.execute(f"CREATE TEMP TABLE {table}_{suffix} ({columns})")
+        cursor.execute(f"""
+            INSERT INTO blocks_{suffix} (relay_chain, chain, timestamp, number, hash, parenthash,
+                                         stateroot, extrinsicsroot, authorid, finalized)
+            SELECT %s, %s, 1700000000000 + n * 6000, n, md5(n::text), md5((n - 1)::text),
+                   md5('state' || n), md5('extrinsics' || n), 'author' || n %% %s, n <= %s
+            FROM generate_series(1, %s) n
+        """, (SCRATCH_RELAY_CHAIN, SCRATCH_CHAIN, AUTHORS, SCRATCH_BLOCKS - UNFINALIZED_BLOCKS, SCRATCH_BLOCKS))
+    create_indexes(connection, SCRATCH_RELAY_CHAIN, SCRATCH_CHAIN)
+    with connection.cursor() as cursor:
+        cursor.execute(f"ANALYZE blocks_{suffix}")
+    yield connection, f"blocks_{suffix}"
+    connection.close()
+
+
+def scan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from scan_nodes(child)
+
+
+@pytest.mark.parametrize("finalized", [True, False])
+def test_every_filter_combination_uses_an_index(scratch_chain, finalized):
+    connection, table_name = scratch_chain
+    number = SCRATCH_BLOCKS - UNFINALIZED_BLOCKS // 2 if not finalized else SCRATCH_BLOCKS // 2
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT number, hash, authorid, timestamp FROM {table_name} WHERE number = %s", (number,))
+        number, block_hash, author, timestamp = cursor.fetchone()
+        values = {
+            'block_number': number,
+            'hash': block_hash,
+            'author': author,
+            'finalized': finalized,
+            'start_time': timestamp - 60000,
+            'end_time': timestamp + 60000,
+        }
+
+        for size in range(len(BLOCK_SEARCH_FILTERS) + 1):
+            for names in itertools.combinations(BLOCK_SEARCH_FILTERS, size):
+                query, params = block_search_query(table_name, 50, **{name: values[name] for name in names})
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                node_types = [node["Node Type"] for node in scan_nodes(plan[0]["Plan"])]
+                assert "Seq Scan" not in node_types, f"Search by {names or 'nothing'} scans {table_name}: {node_types}"
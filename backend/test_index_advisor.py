@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Tests that the query shapes of the ingest's index advisor are queries the backend runs.
+
+The endpoints are called with a database stub that records every query, so
+the shapes are compared with the SQL the handlers build, not with a copy of it.
+"""
+
+import asyncio
+import re
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.pagination import encode_cursor
+from app.recent_blocks import RecentBlockBuffer
+from app.response_cache import ResponseCache
+
+INGEST_DIR = Path(__file__).resolve().parent.parent / "ingest"
+RELAY_CHAIN = "advisor"
+CHAIN = "shapes"
+BLOCK_HASH = "0x" + "ab" * 32
+
+# Requests that reach every database query of the endpoints, past the first
+# page of the recent endpoints, which the recent block buffer answers
+REQUESTS = [
+    "/api/blocks/search",
+    "/api/blocks/7",
+    f"/api/blocks/hash/{BLOCK_HASH}",
+    "/api/blocks/7/events",
+    "/api/blocks/7/extrinsics",
+    "/api/blocks/7/logs",
+    f"/api/extrinsics/hash/{BLOCK_HASH}",
+    "/api/extrinsics/recent",
+    "/api/extrinsics/recent?pallet=balances&method=transfer",
+    "/api/events/recent?page=2",
+    "/api/events/recent?cursor={cursor}",
+    "/api/events/recent?pallet=balances&method=Transfer&page=2",
+    "/api/events/recent?pallet=balances&method=Transfer&cursor={cursor}",
+]
+
+
+class RecordingDatabase:
+    """
+    Records the queries it is given, and answers them with the given results in turn, then with no rows.
+    """
+
+    def __init__(self, results=()):
+        self.queries = []
+        self.results = list(results)
+
+    async def query(self, query, params=None):
+        self.queries.append(query)
+        return self.results.pop(0) if self.results else []
+
+
+class NoRecentBlocks:
+    def blocks(self, limit):
+        return None
+
+    def extrinsics(self, limit, filters=None):
+        return None
+
+    def events(self, limit, filters=None):
+        return None
+
+
+class OnePalletMethod:
+    async def ids(self, pallet=None, method=None):
+        return [3]
+
+    async def named(self, rows):
+        return rows
+
+
+class NoCounts:
+    async def block_total(self, *args, **kwargs):
+        return 0, 'exact'
+
+    async def events_total(self, *args, **kwargs):
+        return 0, 'exact'
+
+
+class TextIds:
+    async def param(self, table, column, value):
+        return value
+
+
+def normalized(query):
+    """
+    The shape of a query: whitespace collapsed, the column list replaced by * and every parameter by %s.
+    """
+    query = " ".join(query.split())
+    query = re.sub(r"^SELECT .*? FROM ", "SELECT * FROM ", query)
+    return re.sub(r"%\(\w+\)s", "%s", query)
+
+
+@pytest.fixture(scope="module")
+def backend_queries():
+    monkeypatch = pytest.MonkeyPatch()
+    monkeypatch.setenv("RELAY_CHAIN", RELAY_CHAIN)
+    monkeypatch.setenv("CHAIN", CHAIN)
+    db = RecordingDatabase()
+    main.app.state.db = db
+    main.app.state.recent = NoRecentBlocks()
+    main.app.state.pallet_methods = OnePalletMethod()
+    main.app.state.counts = NoCounts()
+    main.app.state.binary_ids = TextIds()
+    main.app.state.responses = ResponseCache()
+    # Without a context manager the client does not run the lifespan, which would connect to the database
+    client = TestClient(main.app)
+    for request in REQUESTS:
+        client.get(request.format(cursor=encode_cursor(7, 25)))
+    # The buffer loads the rows of the blocks its first query returns
+    buffer_db = RecordingDatabase([[{'number': 7}]])
+    asyncio.run(RecentBlockBuffer(buffer_db, OnePalletMethod(), RELAY_CHAIN, CHAIN)._load())
+    monkeypatch.undo()
+    return {normalized(query) for query in db.queries + buffer_db.queries}
+
+
+@pytest.fixture(scope="module")
+def endpoint_queries():
+    # The advisor imports the ingest's database utilities
+    pytest.importorskip("psycopg2")
+    sys.path.insert(0, str(INGEST_DIR))
+    from index_advisor import ENDPOINT_QUERIES
+    return ENDPOINT_QUERIES
+
+
+def test_endpoint_queries_are_backend_queries(endpoint_queries, backend_queries):
+    for endpoint, table, query, _ in endpoint_queries:
+        shape = normalized(query.format(table=f"{table}_{RELAY_CHAIN}_{CHAIN}"))
+        assert shape in backend_queries, f"{endpoint}: the backend no longer runs {shape}"
+
+
+def test_endpoints_are_backend_routes(endpoint_queries):
+    routes = {route.path for route in main.app.routes}
+    for endpoint, *_ in endpoint_queries:
+        if not endpoint.startswith("recent block buffer"):
+            assert f"/api{endpoint.split('?')[0]}" in routes
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Tests of the memory and disk tiers of the finalized response cache.
+"""
+
+import asyncio
+
+from app.response_cache import ResponseCache
+
+
+def test_disk_tier_outlives_restarts(tmp_path):
+    async def run():
+        cache = ResponseCache(disk_path=str(tmp_path / "responses.db"))
+        await cache.put("block:1", b'{"number": 1}')
+        cache.close()
+
+        cache = ResponseCache(disk_path=str(tmp_path / "responses.db"))
+        assert await cache.get("block:1") == b'{"number": 1}'
+        assert await cache.get("block:1") == b'{"number": 1}'
+        assert await cache.get("block:2") is None
+        summary = cache.summary()
+        cache.close()
+        return summary
+
+    summary = asyncio.run(run())
+    assert (summary['disk_hits'], summary['hits'], summary['misses']) == (1, 1, 1)
+    assert (summary['disk_entries'], summary['disk_bytes']) == (1, len(b'{"number": 1}'))
+
+
+def test_disk_eviction_keeps_recently_read_entries(tmp_path):
+    async def run():
+        # Nothing fits in memory, so every read goes to the disk tier
+        cache = ResponseCache(max_bytes=0, disk_path=str(tmp_path / "responses.db"), disk_max_bytes=100)
+        for number in range(10):
+            await cache.put(f"block:{number}", b"x" * 10)
+        # The oldest entry is read, so the next write evicts the one after it
+        assert await cache.get("block:0") is not None
+        await cache.put("block:10", b"x" * 10)
+        kept = [number for number in range(11) if await cache.get(f"block:{number}") is not None]
+        summary = cache.summary()
+        cache.close()
+        return kept, summary
+
+    kept, summary = asyncio.run(run())
+    assert kept == [0] + list(range(2, 11))
+    assert (summary['disk_entries'], summary['disk_bytes'], summary['disk_evictions']) == (10, 100, 1)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Tests of the search input classification and target queries.
+"""
+
+import pytest
+
+from app.search import classify_search, search_target_query
+
+BLOCK_HASH = "0x" + "ab" * 32
+
+
+@pytest.mark.parametrize("query, kind", [
+    ("0", 'block_number'),
+    ("1500", 'block_number'),
+    ("9223372036854775807", 'block_number'),
+    ("9223372036854775808", None),
+    ("1500-2", 'extrinsic_id'),
+    ("1500-", None),
+    (BLOCK_HASH, 'hash'),
+    (BLOCK_HASH.upper().replace("0X", "0x"), 'hash'),
+    (BLOCK_HASH[:-1], None),
+    ("15oF4uVJwmo4TdGW7VfQxNLavjCXviqxT9S1MgbjMNHr6Sp5", 'account'),
+    ("15oF4uVJwmo4TdGW7VfQxNLavjCXviqxT9S1MgbjMNHr6Sp0", None),
+    ("", None),
+    ("Balances", None),
+])
+def test_classify_search(query, kind):
+    assert classify_search(query) == kind
+
+
+def test_hash_is_looked_up_in_lowercase():
+    query, params = search_target_query("polkadot_polkadot", 'hash', BLOCK_HASH.upper().replace("0X", "0x"))
+    assert "blocks_polkadot_polkadot" in query and "extrinsics_polkadot_polkadot" in query
+    assert params == (BLOCK_HASH, BLOCK_HASH)
+
+
+def test_extrinsic_id_is_looked_up_by_its_block():
+    query, params = search_target_query("polkadot_polkadot", 'extrinsic_id', "1500-2")
+    assert params == (1500, "1500-2")
+
+
+def test_accounts_need_no_query():
+    with pytest.raises(ValueError):
+        search_target_query("polkadot_polkadot", 'account', "15oF4uVJwmo4TdGW7VfQxNLavjCXviqxT9S1MgbjMNHr6Sp5")
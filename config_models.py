@@ -9,6 +9,12 @@ class IngestMode(str, Enum):
     HISTORICAL = "historical"
 
 
+class WriteMode(str, Enum):
+    ROW = "row"
+    BATCH = "batch"
+    COPY = "copy"
+
+
 class DatabaseType(str, Enum):
     POSTGRES = "postgres"
     MYSQL = "mysql"
@@ -43,6 +49,14 @@ class IngestConfig(BaseModel):
     """Ingest configuration settings"""
     mode: IngestMode = Field(default=IngestMode.LIVE, description="Ingest mode")
     block_range: Optional[BlockRange] = Field(default=None, description="Block range for historical ingest")
+    workers: int = Field(default=8, ge=1, le=64, description="Concurrent fetch workers for historical ingest")
+    fetch_batch_size: int = Field(default=50, ge=1, le=500, description="Blocks fetched per sidecar range request")
+    write_mode: WriteMode = Field(default=WriteMode.BATCH, description="Row-by-row, multi-row batched or COPY-based inserts")
+    group_commit_blocks: int = Field(default=1, ge=1, le=1000, description="Maximum blocks per commit in historical ingest (1 disables group commit)")
+    group_commit_ms: int = Field(default=1000, ge=1, description="Maximum time a block waits for its group commit in milliseconds")
+    partition_size: int = Field(default=0, ge=0, description="Blocks per partition of the PostgreSQL extrinsics and events tables (0 disables partitioning)")
+    bulk_load: bool = Field(default=False, description="Defer secondary indexes and database maintenance until a historical range is ingested")
+    binary_ids: bool = Field(default=False, description="Store hashes and SS58 addresses as bytes in new PostgreSQL tables")
 
     @model_validator(mode='after')
     def validate_block_range_for_historical(self):
@@ -145,6 +159,14 @@ class DotLakeConfig(BaseModel):
             'CHAIN': self.chain.name,
             'WSS': self.chain.wss_endpoint,
             'INGEST_MODE': self.ingest.mode.value,
+            'INGEST_WORKERS': str(self.ingest.workers),
+            'INGEST_FETCH_BATCH_SIZE': str(self.ingest.fetch_batch_size),
+            'INGEST_WRITE_MODE': self.ingest.write_mode.value,
+            'INGEST_GROUP_COMMIT_BLOCKS': str(self.ingest.group_commit_blocks),
+            'INGEST_GROUP_COMMIT_MS': str(self.ingest.group_commit_ms),
+            'INGEST_PARTITION_SIZE': str(self.ingest.partition_size),
+            'INGEST_BULK_LOAD': str(self.ingest.bulk_load).lower(),
+            'INGEST_BINARY_IDS': str(self.ingest.binary_ids).lower(),
             'SQLALCHEMY_URI': self.database.get_sqlalchemy_uri(),
         }
 
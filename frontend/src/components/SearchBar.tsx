@@ -9,6 +9,7 @@ import {
   Alert,
 } from '@mui/material';
 import SearchIcon from '@mui/icons-material/Search';
+import axios from 'axios';
 import api from '../api/axios';
 
 interface SearchBarProps {
@@ -24,46 +25,30 @@ const SearchBar: React.FC<SearchBarProps> = ({ size = 'large' }) => {
     e.preventDefault();
     setError(null);
 
-    if (!searchQuery) return;
+    const query = searchQuery.trim();
+    if (!query) return;
 
-    // Case 1: If it's a number, search for block number
-    if (/^\d+$/.test(searchQuery)) {
-      navigate(`/block/${searchQuery}`);
-      return;
-    }
-
-    // Case 2 & 3: If it starts with 0x, try block hash first, then extrinsic hash
-    if (searchQuery.startsWith('0x')) {
-      // Try block hash first
-      try {
-        const blockResponse = await api.get(`/blocks/hash/${searchQuery}`);
-        
-        if (blockResponse.data !== null) {
-          navigate(`/block/${blockResponse.data.number}`);
-          return;
-        }
-      } catch (err) {
-        console.error('Error searching for block:', err);
+    // The backend tells what the input identifies and where it exists, in one request
+    try {
+      const response = await api.get('/search', { params: { query } });
+      const { type, id } = response.data;
+      if (type === 'block') {
+        navigate(`/block/${id}`);
+      } else if (type === 'extrinsic') {
+        navigate(`/extrinsic/${id}`);
+      } else if (type === 'account') {
+        navigate(`/account?id=${encodeURIComponent(id)}`);
       }
-
-      // If block not found or error occurred, try extrinsic hash
-      try {
-        const extrinsicResponse = await api.get(`/extrinsics/hash/${searchQuery}`);
-
-        if (extrinsicResponse.data !== null) {
-          navigate(`/extrinsic/${extrinsicResponse.data.index}`);
-          return;
-        }
-
-        // If we get here, neither block nor extrinsic was found
-        setError('No block or extrinsic found with the provided hash');
-      } catch (err) {
-        setError('Error searching for hash');
-        console.error('Error searching for hash:', err);
+    } catch (err) {
+      if (axios.isAxiosError(err) && err.response?.status === 404) {
+        setError('No block or extrinsic found');
+      } else if (axios.isAxiosError(err) && err.response?.status === 400) {
+        // For any other search term, redirect to search page
+        navigate(`/search?query=${encodeURIComponent(query)}`);
+      } else {
+        setError('Error searching');
+        console.error('Error searching:', err);
       }
-    } else {
-      // For any other search term, redirect to search page
-      navigate(`/search?query=${encodeURIComponent(searchQuery)}`);
     }
   };
 
@@ -89,7 +74,7 @@ const SearchBar: React.FC<SearchBarProps> = ({ size = 'large' }) => {
           <TextField
             fullWidth
             variant="outlined"
-            placeholder="Search by block number, block hash (0x...), or extrinsic hash (0x...)"
+            placeholder="Search by block number or hash (0x...), extrinsic hash (0x...) or id, or account"
             value={searchQuery}
             onChange={(e) => setSearchQuery(e.target.value)}
             InputProps={{
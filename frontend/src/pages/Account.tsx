@@ -1,4 +1,5 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
+import { useSearchParams } from 'react-router-dom';
 import { useDispatch, useSelector } from 'react-redux';
 import {
   Box,
@@ -22,7 +23,17 @@ import { AppDispatch, RootState } from '../store';
 const Account: React.FC = () => {
   const dispatch = useDispatch<AppDispatch>();
   const { accountId, balances, loading, error } = useSelector((state: RootState) => state.account);
-  const [searchInput, setSearchInput] = useState('');
+  const [searchParams] = useSearchParams();
+  const [searchInput, setSearchInput] = useState(searchParams.get('id') || '');
+
+  // Accounts found by the search bar arrive as ?id=
+  useEffect(() => {
+    const id = searchParams.get('id');
+    if (id) {
+      setSearchInput(id);
+      dispatch(fetchAccountBalances(id));
+    }
+  }, [searchParams, dispatch]);
 
   const handleSearch = async (e: React.FormEvent) => {
     e.preventDefault();
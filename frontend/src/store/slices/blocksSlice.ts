@@ -64,8 +64,8 @@ export const fetchBlock = createAsyncThunk<Block | null, string>(
 
 export const searchBlocks = createAsyncThunk<Block[], SearchParams>(
   'blocks/search',
-  async (params: SearchParams) => {
-    const response = await api.get('/blocks/search', { params });
+  async ({ blockNumber, ...params }: SearchParams) => {
+    const response = await api.get('/blocks/search', { params: { ...params, block_number: blockNumber } });
     return response.data.blocks;
   }
 );
@@ -0,0 +1,241 @@
+import logging
+import queue
+import threading
+import time
+import traceback
+from write_block import fetch_block_range, build_block_rows
+from database_utils import insert_block_group, query_checkpoint, uses_bulk_writes, create_bulk_sink, ensure_partitions, \
+    create_bulk_load_session, is_transient_error
+from connection_pool import get_pool
+from group_commit import GroupCommitter
+
+logger = logging.getLogger('backfill')
+
+
+class BackfillEngine:
+    """
+    Historical ingest with parallel fetch workers and a single ordered writer.
+
+    Fetch workers pull windows of contiguous block numbers from a shared work
+    queue, fetch each window with one sidecar range request, flatten the
+    blocks, and hand the rows to the writer. The writer commits blocks
+    strictly in order and records the last committed block as the range's
+    high-water mark, so a restarted backfill resumes at the first uncommitted
+    block instead of start_block.
+
+    Each block, together with the high-water mark, is written in one
+    transaction. With group commit enabled several consecutive blocks share a
+    transaction. In copy write mode the writer buffers blocks in a bulk sink
+    instead, and the high-water mark advances with each flush of the sink.
+
+    In bulk load mode the chain's secondary indexes are dropped for the
+    duration of the range and rebuilt once it completes, database maintenance
+    is paused, and writes commit without waiting for the WAL flush.
+    """
+
+    def __init__(self, database_info, chain, relay_chain, sidecar_url, start_block, end_block,
+                 workers=8, fetch_batch_size=50, max_pending=None, retry_delay=6,
+                 group_commit_blocks=1, group_commit_ms=1000, bulk_load=False):
+        """
+        Args:
+            database_info (dict): The database connection settings.
+            chain (str): The name of the chain.
+            relay_chain (str): The name of the relay chain.
+            sidecar_url (str): The sidecar base URL.
+            start_block (int): The first block of the range.
+            end_block (int): The last block of the range.
+            workers (int): The number of concurrent fetch workers.
+            fetch_batch_size (int): The number of blocks fetched per sidecar request.
+            max_pending (int): The maximum number of fetched blocks held ahead of
+                the writer. Defaults to two windows per worker.
+            retry_delay (int): Seconds to wait before retrying a failed fetch, or a write that
+                failed on a lost connection, a deadlock or a timeout. Other write errors stop the backfill.
+            group_commit_blocks (int): The most blocks committed per transaction. 1 disables group commit.
+            group_commit_ms (int): The longest a written block may wait for its group to commit.
+            bulk_load (bool): Defer secondary indexes and maintenance until the range is ingested.
+        """
+        self.database_info = database_info
+        self.chain = chain
+        self.relay_chain = relay_chain
+        self.sidecar_url = sidecar_url
+        self.start_block = start_block
+        self.end_block = end_block
+        self.workers = max(1, workers)
+        self.fetch_batch_size = max(1, fetch_batch_size)
+        self.max_pending = max(max_pending or self.workers * self.fetch_batch_size * 2, self.fetch_batch_size)
+        self.retry_delay = retry_delay
+
+        self._work_queue = queue.Queue(maxsize=self.workers * 2)
+        self._slots = threading.Semaphore(self.max_pending)
+        self._results = {}
+        self._results_ready = threading.Condition()
+        self._stop = threading.Event()
+        self._pool = get_pool(database_info)
+        self._db_connection = None
+        self._sink = None
+        self._bulk_load = create_bulk_load_session(database_info, chain, relay_chain) if bulk_load else None
+        self._committer = GroupCommitter(self._commit_group, max_group_size=group_commit_blocks,
+                                         max_delay_ms=group_commit_ms)
+
+    def run(self):
+        """
+        Ingest the configured range, resuming after the stored high-water mark.
+        """
+        if self._bulk_load is None:
+            self._ingest()
+            return
+        self._bulk_load.begin()
+        try:
+            self._ingest()
+            # Also rebuilds indexes left deferred by an interrupted bulk load of this chain
+            self._bulk_load.finish()
+        finally:
+            self._bulk_load.close()
+
+    def _ingest(self):
+        self._db_connection = self._acquire()
+        high_water_mark = query_checkpoint(self._db_connection, self.database_info, self.chain,
+                                           self.relay_chain, self.start_block, self.end_block)
+        first_block = self.start_block if high_water_mark is None else high_water_mark + 1
+        if first_block > self.end_block:
+            logger.info(f"Range {self.start_block}-{self.end_block} already ingested")
+            self._release()
+            return
+        if first_block != self.start_block:
+            logger.info(f"Resuming backfill at block {first_block} (high-water mark {high_water_mark})")
+        ensure_partitions(self._db_connection, self.database_info, self.chain, self.relay_chain, first_block, self.end_block)
+        if uses_bulk_writes(self.database_info):
+            self._sink = create_bulk_sink(self._db_connection, self.database_info, self.chain, self.relay_chain)
+
+        threads = [threading.Thread(target=self._feed, args=(first_block,), daemon=True)]
+        threads += [threading.Thread(target=self._fetch_worker, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+
+        started = time.time()
+        try:
+            block_id = first_block
+            while block_id <= self.end_block:
+                block_rows = self._wait_for(block_id, timeout=self._committer.time_until_due())
+                if block_rows is None:
+                    # The pending group is due before the next block arrived
+                    self._retry(block_id - 1, self._committer.flush)
+                    continue
+                self._write(block_id, block_rows)
+                self._slots.release()
+                if (block_id - first_block + 1) % 1000 == 0:
+                    rate = (block_id - first_block + 1) / (time.time() - started)
+                    logger.info(f"Wrote up to block {block_id} ({rate:.1f} blocks/s)")
+                block_id += 1
+            self._retry(self.end_block, self._committer.flush)
+        finally:
+            self._stop.set()
+            if self._db_connection is not None:
+                self._release()
+
+    def _feed(self, first_block):
+        for window_start in range(first_block, self.end_block + 1, self.fetch_batch_size):
+            window_end = min(window_start + self.fetch_batch_size - 1, self.end_block)
+            # A slot is held from the moment a block is queued until the writer
+            # commits it, which bounds how far workers can run ahead.
+            for _ in range(window_end - window_start + 1):
+                self._slots.acquire()
+            if self._stop.is_set():
+                return
+            self._work_queue.put((window_start, window_end))
+        for _ in range(self.workers):
+            self._work_queue.put(None)
+
+    def _fetch_worker(self):
+        while not self._stop.is_set():
+            window = self._work_queue.get()
+            if window is None:
+                return
+            window_start, window_end = window
+            window_rows = None
+            while window_rows is None and not self._stop.is_set():
+                try:
+                    blocks = fetch_block_range(self.sidecar_url, window_start, window_end)
+                    window_rows = {
+                        block_id: build_block_rows(block_data, self.chain, self.relay_chain)
+                        for block_id, block_data in blocks.items()
+                    }
+                except Exception as e:
+                    logger.error(f"Error fetching blocks {window_start}-{window_end}: {e}. "
+                                 f"Retrying in {self.retry_delay} seconds.")
+                    time.sleep(self.retry_delay)
+            with self._results_ready:
+                self._results.update(window_rows or {})
+                self._results_ready.notify_all()
+
+    def _wait_for(self, block_id, timeout=None):
+        with self._results_ready:
+            if not self._results_ready.wait_for(lambda: block_id in self._results, timeout=timeout):
+                return None
+            return self._results.pop(block_id)
+
+    def _write(self, block_id, block_rows):
+        if self._sink is not None:
+            self._retry(block_id, self._add_to_sink, block_rows)
+            if self._sink.should_flush() or block_id == self.end_block:
+                self._retry(block_id, self._flush_sink, block_id)
+            return
+        self._committer.add(block_id, block_rows)
+        if self._committer.is_due():
+            self._retry(block_id, self._committer.flush)
+
+    def _commit_group(self, block_rows_list, last_block_id):
+        insert_block_group(self.database_info, self._db_connection, block_rows_list, self.chain, self.relay_chain,
+                           checkpoint=(self.start_block, self.end_block, last_block_id))
+        print(f"Processed blocks up to {last_block_id}")
+
+    def _add_to_sink(self, block_rows):
+        # Adding a block can commit new pallet and method pairs
+        self._sink.connection = self._db_connection
+        self._sink.add(block_rows)
+
+    def _flush_sink(self, block_id):
+        self._sink.connection = self._db_connection
+        self._sink.flush(checkpoint=(self.start_block, self.end_block, block_id))
+        print(f"Processed blocks up to {block_id}")
+
+    def _retry(self, block_id, write, *args):
+        while True:
+            try:
+                if self._db_connection is None:
+                    self._db_connection = self._acquire()
+                write(*args)
+                return
+            except Exception as e:
+                if not is_transient_error(self.database_info, e):
+                    # Writing the same rows again would fail the same way and stall the range
+                    logger.error(f"Error writing block {block_id}: {e}. The error is permanent, stopping the backfill.")
+                    raise
+                logger.error(f"Error writing block {block_id}: {e}. Retrying in {self.retry_delay} seconds.")
+                logger.error(traceback.format_exc())
+                # Hand the connection back so the pool can replace it if it is broken
+                if self._db_connection is not None:
+                    self._release()
+                time.sleep(self.retry_delay)
+
+    def _acquire(self):
+        db_connection = self._pool.acquire()
+        if self._bulk_load is not None:
+            try:
+                self._bulk_load.configure(db_connection)
+            except Exception:
+                self._pool.release(db_connection)
+                raise
+        return db_connection
+
+    def _release(self):
+        db_connection, self._db_connection = self._db_connection, None
+        if self._bulk_load is not None:
+            try:
+                # Pooled connections are shared with writes that need full durability
+                self._bulk_load.reset(db_connection)
+            except Exception as e:
+                logger.warning(f"Discarding database connection with bulk load settings: {e}")
+                self._pool.discard(db_connection)
+                return
+        self._pool.release(db_connection)
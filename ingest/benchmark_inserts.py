@@ -0,0 +1,125 @@
+import argparse
+import contextlib
+import io
+import os
+import time
+from write_block import build_block_rows
+from database_utils import connect_to_database, close_connection, create_tables, insert_block_rows, uses_bulk_writes, create_bulk_sink
+
+WRITE_MODES = ["row", "batch", "copy"]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark block row inserts for each write mode")
+    parser.add_argument("--database", default="postgres", help="Name of the database")
+    parser.add_argument("--db_host", required=True, help="Database host")
+    parser.add_argument("--db_port", required=True, help="Database port")
+    parser.add_argument("--db_user", required=True, help="Database user")
+    parser.add_argument("--db_password", default="", help="Database password")
+    parser.add_argument("--db_name", required=True, help="Database name")
+    parser.add_argument("--blocks", type=int, default=200, help="Number of synthetic blocks to insert per mode")
+    parser.add_argument("--extrinsics", type=int, default=20, help="Extrinsics per synthetic block")
+    parser.add_argument("--events", type=int, default=15, help="Events per synthetic extrinsic")
+    parser.add_argument("--binary_ids", action="store_true", help="Store hashes and addresses as bytes")
+    parser.add_argument("--modes", nargs="+", choices=WRITE_MODES, default=WRITE_MODES, help="Write modes to benchmark")
+    return parser.parse_args()
+
+
+def synthetic_block(number, extrinsic_count, events_per_extrinsic):
+    """
+    Build a sidecar-shaped block payload with the given number of extrinsics and events.
+    """
+    def event(pallet, method):
+        return {'method': {'pallet': pallet, 'method': method}, 'data': ['5GrwvaEF5zXb26Fz9rcQpDWS57CtERHpNehXCPcNoHGKutQY', '1000000000']}
+
+    extrinsics = [{
+        'method': {'pallet': 'timestamp', 'method': 'set'},
+        'args': {'now': str(1700000000000 + number * 6000)},
+        'hash': '0x' + f'{number:032x}' * 2,
+        'tip': None, 'nonce': None, 'signature': None,
+        'era': {'immortalEra': '0x00'}, 'info': {}, 'success': True, 'paysFee': False,
+        'events': [event('system', 'ExtrinsicSuccess')]
+    }]
+    for index in range(1, extrinsic_count):
+        extrinsics.append({
+            'method': {'pallet': 'balances', 'method': 'transferKeepAlive'},
+            'args': {'dest': {'id': '5FHneW46xGXgs5mUiveU4sbTyGBzmstUspZC92UhjJM694ty'}, 'value': '1000000000'},
+            'hash': '0x' + f'{number:016x}{index:016x}' * 2,
+            'tip': '0', 'nonce': str(index),
+            'signature': {'signature': '0x' + 'ab' * 64, 'signer': {'id': '5GrwvaEF5zXb26Fz9rcQpDWS57CtERHpNehXCPcNoHGKutQY'}},
+            'era': {'mortalEra': ['64', '12']}, 'info': {'weight': {'refTime': '1000'}, 'class': 'Normal', 'partialFee': '100'},
+            'success': True, 'paysFee': True,
+            'events': [event('balances', 'Transfer') for _ in range(events_per_extrinsic)]
+        })
+    return {
+        'number': str(number),
+        'hash': '0x' + f'{number:064x}',
+        'parentHash': '0x' + f'{number - 1:064x}',
+        'stateRoot': '0x' + 'cd' * 32,
+        'extrinsicsRoot': '0x' + 'ef' * 32,
+        'authorId': '5GrwvaEF5zXb26Fz9rcQpDWS57CtERHpNehXCPcNoHGKutQY',
+        'finalized': True,
+        'logs': [{'type': 'PreRuntime', 'index': '6', 'value': ['0x61757261', '0x1234']}],
+        'onInitialize': {'events': []},
+        'onFinalize': {'events': [event('balances', 'Deposit')]},
+        'extrinsics': extrinsics
+    }
+
+
+def run_mode(database_info, write_mode, block_rows_list):
+    chain = f"bench_{write_mode}_{os.getpid()}"
+    relay_chain = "benchmark"
+    database_info = dict(database_info, write_mode=write_mode)
+    db_connection = connect_to_database(database_info)
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_tables(db_connection, database_info, chain, relay_chain)
+    row_count = sum(1 + len(rows['extrinsics']) + len(rows['events']) + len(rows['logs']) for rows in block_rows_list)
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if uses_bulk_writes(database_info):
+            sink = create_bulk_sink(db_connection, database_info, chain, relay_chain)
+            for block_rows in block_rows_list:
+                sink.add(block_rows)
+                if sink.should_flush():
+                    sink.flush()
+            sink.flush()
+        else:
+            for block_rows in block_rows_list:
+                insert_block_rows(database_info, db_connection, block_rows, chain, relay_chain)
+    elapsed = time.perf_counter() - started
+
+    cursor = db_connection.cursor()
+    for table in ("blocks", "extrinsics", "events", "logs", "pallet_methods"):
+        cursor.execute(f"DROP TABLE IF EXISTS {table}_{relay_chain}_{chain}")
+    db_connection.commit()
+    cursor.close()
+    close_connection(db_connection, database_info)
+    return row_count, elapsed
+
+
+def main():
+    args = parse_arguments()
+    database_info = {
+        'database': args.database,
+        'database_host': args.db_host,
+        'database_port': args.db_port,
+        'database_user': args.db_user,
+        'database_password': args.db_password,
+        'database_name': args.db_name,
+        'binary_ids': args.binary_ids
+    }
+
+    block_rows_list = [
+        build_block_rows(synthetic_block(number, args.extrinsics, args.events), "bench", "benchmark")
+        for number in range(1, args.blocks + 1)
+    ]
+
+    print(f"{'mode':<8}{'rows':>10}{'seconds':>10}{'rows/sec':>12}")
+    for write_mode in args.modes:
+        row_count, elapsed = run_mode(database_info, write_mode, block_rows_list)
+        print(f"{write_mode:<8}{row_count:>10}{elapsed:>10.2f}{row_count / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import hashlib
+
+# Hashes and addresses are stored as bytes in tables created with binary ids:
+# hashes as the raw bytes their hex spells out, SS58 addresses as their payload,
+# the network prefix followed by the 32-byte public key, without the checksum.
+#
+# The backend decodes these columns with its own copy of this module,
+# backend/app/binary_ids.py, as the ingest and the API ship as separate images.
+# Both copies, and the dotlake_binary_id function of migrate_schema.py, must
+# stay in sync: a change to the stored format needs a change to each of them.
+
+BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+_BASE58_DIGITS = {char: digit for digit, char in enumerate(BASE58_ALPHABET)}
+
+SS58_CHECKSUM_PREFIX = b'SS58PRE'
+SS58_CHECKSUM_BYTES = 2
+ACCOUNT_ID_BYTES = 32
+
+# Columns that hold SS58 addresses. The other binary id columns hold hashes.
+ADDRESS_COLUMNS = ('authorid',)
+
+
+def base58_decode(text):
+    value = 0
+    for char in text:
+        if char not in _BASE58_DIGITS:
+            raise ValueError(f"Not a base58 string: {text}")
+        value = value * 58 + _BASE58_DIGITS[char]
+    # Every leading 1 stands for a leading zero byte
+    leading_zeros = len(text) - len(text.lstrip('1'))
+    return b'\x00' * leading_zeros + value.to_bytes((value.bit_length() + 7) // 8, 'big')
+
+
+def base58_encode(data):
+    value = int.from_bytes(data, 'big')
+    chars = []
+    while value:
+        value, digit = divmod(value, 58)
+        chars.append(BASE58_ALPHABET[digit])
+    leading_zeros = len(data) - len(data.lstrip(b'\x00'))
+    return '1' * leading_zeros + ''.join(reversed(chars))
+
+
+def _ss58_checksum(payload):
+    return hashlib.blake2b(SS58_CHECKSUM_PREFIX + payload, digest_size=64).digest()[:SS58_CHECKSUM_BYTES]
+
+
+def _is_ss58_payload(data):
+    # Prefixes below 64 take one byte, larger ones two bytes with the first in 64..127
+    prefix_bytes = 1 if data[:1] < b'\x40' else 2 if data[:1] < b'\x80' else None
+    return prefix_bytes is not None and len(data) == prefix_bytes + ACCOUNT_ID_BYTES
+
+
+def ss58_decode(address):
+    """
+    Decode the SS58 address of a 32-byte account to its payload.
+
+    Returns:
+        bytes: The network prefix followed by the public key.
+
+    Raises:
+        ValueError: If the address is not valid SS58 or not of a 32-byte account.
+    """
+    data = base58_decode(address)
+    payload, checksum = data[:-SS58_CHECKSUM_BYTES], data[-SS58_CHECKSUM_BYTES:]
+    if not _is_ss58_payload(payload) or _ss58_checksum(payload) != checksum:
+        raise ValueError(f"Not the SS58 address of a 32-byte account: {address}")
+    return payload
+
+
+def ss58_encode(payload):
+    """
+    Encode an SS58 payload, as returned by ss58_decode, to its address.
+    """
+    return base58_encode(payload + _ss58_checksum(payload))
+
+
+def encode_id(column, value):
+    """
+    Convert a hash, or the address of an address column, to the bytes it is
+    stored as. Hashes are 0x-prefixed hex. Addresses are SS58, or 0x-prefixed
+    hex for chains whose accounts are not SS58 addresses.
+
+    Raises:
+        ValueError: If the value is neither, or would not be read back as the same kind of value.
+    """
+    if value is None or isinstance(value, bytes):
+        return value
+    if column in ADDRESS_COLUMNS and not value.startswith('0x'):
+        return ss58_decode(value)
+    if not value.startswith('0x'):
+        raise ValueError(f"Not a 0x-prefixed hex value: {value}")
+    data = bytes.fromhex(value[2:])
+    if column in ADDRESS_COLUMNS and _is_ss58_payload(data):
+        raise ValueError(f"Hex address would be read back as SS58: {value}")
+    return data
+
+
+def decode_id(column, value):
+    """
+    Convert the bytes of a binary id column back to the hash or address they were stored from.
+    """
+    if value is None:
+        return None
+    value = bytes(value)
+    if column in ADDRESS_COLUMNS and _is_ss58_payload(value):
+        return ss58_encode(value)
+    return '0x' + value.hex()
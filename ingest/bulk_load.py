@@ -0,0 +1,175 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from database_utils import connect_to_database, close_connection
+from postgres_utils import TABLE_COLUMNS, maintenance_lock_key
+
+logger = logging.getLogger('bulk-load')
+
+DEFAULT_INDEX_BUILD_WORKERS = 4
+DEFAULT_MAINTENANCE_WORK_MEM = '512MB'
+
+
+class BulkLoadSession:
+    """
+    Database settings for loading a large historical range into PostgreSQL.
+
+    While the session is active the maintenance job skips its cycles for the
+    chain, secondary indexes of the chain tables are dropped, and writer
+    connections commit without waiting for the WAL flush. The dropped index
+    definitions are kept in the ingest_deferred_indexes table, so indexes
+    deferred by an interrupted load are rebuilt by the next one.
+
+    Primary keys and the natural-key indexes used by the upserts are kept.
+    """
+
+    def __init__(self, database_info, chain, relay_chain, index_build_workers=DEFAULT_INDEX_BUILD_WORKERS,
+                 maintenance_work_mem=DEFAULT_MAINTENANCE_WORK_MEM):
+        """
+        Args:
+            database_info (dict): The database connection settings.
+            chain (str): The name of the chain.
+            relay_chain (str): The name of the relay chain.
+            index_build_workers (int): The number of indexes rebuilt at the same time.
+            maintenance_work_mem (str): The memory each index build may use.
+        """
+        self.database_info = database_info
+        self.chain = chain
+        self.relay_chain = relay_chain
+        self.index_build_workers = max(1, index_build_workers)
+        self.maintenance_work_mem = maintenance_work_mem
+        self.table_names = [f"{table}_{relay_chain}_{chain}" for table in TABLE_COLUMNS]
+        self._lock_connection = None
+
+    def begin(self):
+        """
+        Pause maintenance for the chain and drop its secondary indexes.
+        """
+        self._lock_connection = self._connect()
+        cursor = self._lock_connection.cursor()
+        try:
+            # Held for the whole load. Maintenance takes the same lock exclusively.
+            cursor.execute("SELECT pg_advisory_lock_shared(hashtext(%s))", (maintenance_lock_key(self.chain, self.relay_chain),))
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ingest_deferred_indexes (
+                    index_name VARCHAR(255) PRIMARY KEY,
+                    table_name VARCHAR(255),
+                    definition TEXT
+                )
+            """)
+            cursor.execute("""
+                SELECT i.indexrelid::regclass::text, c.relname, pg_get_indexdef(i.indexrelid)
+                FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indrelid
+                WHERE c.relname = ANY(%s) AND c.relnamespace = current_schema()::regnamespace
+                AND NOT i.indisunique AND NOT i.indisprimary
+            """, (self.table_names,))
+            deferred = cursor.fetchall()
+            for index_name, table_name, definition in deferred:
+                cursor.execute("""
+                    INSERT INTO ingest_deferred_indexes (index_name, table_name, definition) VALUES (%s, %s, %s)
+                    ON CONFLICT (index_name) DO NOTHING
+                """, (index_name, table_name, definition))
+                cursor.execute(f"DROP INDEX IF EXISTS {index_name}")
+            self._lock_connection.commit()
+        finally:
+            cursor.close()
+        logger.info(f"Bulk load started. Deferred {len(deferred)} secondary indexes and paused maintenance.")
+
+    def configure(self, db_connection):
+        """
+        Relax commit durability on a writer connection. A crash may lose the
+        last moments of committed blocks, which the range checkpoint then
+        re-ingests, but cannot corrupt the database.
+        """
+        cursor = db_connection.cursor()
+        try:
+            cursor.execute("SET synchronous_commit = off")
+            db_connection.commit()
+        finally:
+            cursor.close()
+
+    def reset(self, db_connection):
+        """
+        Restore the default commit durability before a connection is reused.
+        """
+        cursor = db_connection.cursor()
+        try:
+            cursor.execute("RESET synchronous_commit")
+            db_connection.commit()
+        finally:
+            cursor.close()
+
+    def finish(self):
+        """
+        Rebuild the deferred indexes in parallel, analyze the tables and resume maintenance.
+        """
+        started = time.time()
+        cursor = self._lock_connection.cursor()
+        try:
+            cursor.execute("SELECT index_name, definition FROM ingest_deferred_indexes WHERE table_name = ANY(%s)",
+                           (self.table_names,))
+            deferred = cursor.fetchall()
+            self._lock_connection.commit()
+            with ThreadPoolExecutor(max_workers=self.index_build_workers) as executor:
+                list(executor.map(self._build_index, deferred))
+
+            for table_name in self.table_names:
+                cursor.execute(f"ANALYZE {table_name}")
+            # Only indexes the planner can use are no longer deferred
+            cursor.execute("""
+                SELECT d.index_name
+                FROM ingest_deferred_indexes d
+                JOIN pg_index i ON i.indexrelid = to_regclass(d.index_name)
+                WHERE d.table_name = ANY(%s) AND i.indisvalid
+            """, (self.table_names,))
+            rebuilt = [row[0] for row in cursor.fetchall()]
+            cursor.execute("DELETE FROM ingest_deferred_indexes WHERE index_name = ANY(%s)", (rebuilt,))
+            self._lock_connection.commit()
+        finally:
+            cursor.close()
+        invalid = sorted({index_name for index_name, _ in deferred} - set(rebuilt))
+        if invalid:
+            logger.error(f"Indexes {', '.join(invalid)} are not valid after the rebuild and stay deferred")
+        logger.info(f"Rebuilt {len(rebuilt)} indexes and analyzed {len(self.table_names)} tables "
+                    f"in {time.time() - started:.1f} seconds")
+
+    def close(self):
+        """
+        End the session and resume maintenance. Indexes that were not rebuilt
+        stay deferred until the next bulk load finishes.
+        """
+        if self._lock_connection is None:
+            return
+        close_connection(self._lock_connection, self.database_info)
+        self._lock_connection = None
+
+    def _build_index(self, deferred_index):
+        index_name, definition = deferred_index
+        started = time.time()
+        db_connection = self._connect()
+        cursor = db_connection.cursor()
+        try:
+            cursor.execute("SET maintenance_work_mem = %s", (self.maintenance_work_mem,))
+            # An index left invalid, e.g. by an interrupted build, is not replaced by IF NOT EXISTS
+            cursor.execute("""
+                SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(%s) AND NOT indisvalid
+            """, (index_name,))
+            if cursor.fetchone():
+                cursor.execute(f"DROP INDEX {index_name}")
+            # The definition of an index on a partitioned table is ON ONLY the parent,
+            # which would leave it invalid and without partition indexes. Created on the
+            # parent itself, the index is built on every partition as well.
+            cursor.execute(definition.replace("CREATE INDEX ", "CREATE INDEX IF NOT EXISTS ", 1)
+                           .replace(" ON ONLY ", " ON ", 1))
+            db_connection.commit()
+        finally:
+            cursor.close()
+            close_connection(db_connection, self.database_info)
+        logger.info(f"Rebuilt index {index_name} in {time.time() - started:.1f} seconds")
+
+    def _connect(self):
+        db_connection = connect_to_database(self.database_info)
+        if db_connection is None:
+            raise ConnectionError("Could not connect to postgres database")
+        return db_connection
@@ -0,0 +1,138 @@
+import contextlib
+import logging
+import queue
+import threading
+import time
+from database_utils import connect_to_database, close_connection, check_connection
+
+logger = logging.getLogger('connection-pool')
+
+DEFAULT_MAX_SIZE = 4
+DEFAULT_HEALTH_CHECK_SECONDS = 30
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    Process-wide pool of database connections for the ingest.
+
+    Connections are opened on demand up to max_size and returned to the pool
+    after use instead of being closed. A connection that has been idle for
+    longer than health_check_seconds is checked before it is handed out. A
+    connection that fails the check, or that cannot be rolled back when it
+    is returned, is closed and a new one is opened in its place.
+    """
+
+    def __init__(self, database_info, max_size=DEFAULT_MAX_SIZE, health_check_seconds=DEFAULT_HEALTH_CHECK_SECONDS):
+        """
+        Args:
+            database_info (dict): The database connection settings.
+            max_size (int): The maximum number of open connections.
+            health_check_seconds (float): Check idle connections older than this before reuse.
+        """
+        self.database_info = database_info
+        self.max_size = max(1, max_size)
+        self.health_check_seconds = health_check_seconds
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+
+    def acquire(self):
+        """
+        Take a healthy connection from the pool, opening one if none is idle.
+
+        Blocks while max_size connections are in use.
+        """
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    db_connection, released_at = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._open()
+                idle_seconds = time.monotonic() - released_at
+                if idle_seconds < self.health_check_seconds or check_connection(db_connection, self.database_info):
+                    return db_connection
+                logger.warning("Discarding unhealthy database connection")
+                self._close(db_connection)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, db_connection):
+        """
+        Return a connection to the pool, rolling back any open transaction.
+        """
+        try:
+            if self.database_info['database'] in ['postgres', 'mysql']:
+                db_connection.rollback()
+        except Exception as e:
+            logger.warning(f"Discarding database connection that could not be reset: {e}")
+            self.discard(db_connection)
+            return
+        self._idle.put((db_connection, time.monotonic()))
+        self._slots.release()
+
+    def discard(self, db_connection):
+        """
+        Close a connection that is known to be broken instead of returning it.
+        """
+        self._close(db_connection)
+        self._slots.release()
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Lease a connection for the duration of a with block.
+        """
+        db_connection = self.acquire()
+        try:
+            yield db_connection
+        finally:
+            # A connection broken by the failure cannot be rolled back and is replaced
+            self.release(db_connection)
+
+    def close(self):
+        """
+        Close every idle connection.
+        """
+        while True:
+            try:
+                db_connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(db_connection)
+
+    def _open(self):
+        db_connection = connect_to_database(self.database_info)
+        if db_connection is None:
+            raise ConnectionError(f"Could not connect to {self.database_info['database']} database")
+        return db_connection
+
+    def _close(self, db_connection):
+        try:
+            close_connection(db_connection, self.database_info)
+        except Exception as e:
+            logger.warning(f"Error closing database connection: {e}")
+
+
+def get_pool(database_info, **pool_options):
+    """
+    Return the process-wide pool for a database, creating it on first use.
+
+    Args:
+        database_info (dict): The database connection settings.
+        **pool_options: Options passed to ConnectionPool when the pool is created.
+
+    Returns:
+        ConnectionPool: The shared pool for the database.
+    """
+    key = (database_info['database'], database_info.get('database_host'), database_info.get('database_port'),
+           database_info.get('database_name'), database_info.get('database_user'), database_info.get('database_project'))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(database_info, **pool_options)
+            _pools[key] = pool
+        return pool
@@ -0,0 +1,151 @@
+import io
+import logging
+from postgres_utils import (BLOCK_COLUMNS, EXTRINSIC_COLUMNS, EVENT_COLUMNS, LOG_COLUMNS, BLOCK_UPSERT,
+                            EXTRINSIC_UPSERT, EVENT_UPSERT, LOG_UPSERT, basic_block_values, extrinsic_values,
+                            event_values, log_values, save_checkpoint, notify_blocks_committed, intern_pallet_methods,
+                            encode_binary_ids)
+
+logger = logging.getLogger('copy-sink')
+
+DEFAULT_FLUSH_ROWS = 50000
+DEFAULT_FLUSH_BYTES = 64 * 1024 * 1024
+
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def copy_text_value(value):
+    """
+    Render a value as a field of PostgreSQL's COPY text format.
+    """
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    if isinstance(value, bytes):
+        # bytea in hex format, its backslash escaped
+        return '\\\\x' + value.hex()
+    return str(value).translate(_COPY_ESCAPES)
+
+
+class PostgresCopySink:
+    """
+    Bulk loader that streams block rows into PostgreSQL with COPY FROM STDIN.
+
+    Rows are rendered into one in-memory buffer per table and sent when either
+    the buffered row count or byte size crosses its threshold. Each flush is a
+    single transaction that can also advance a historical range's high-water
+    mark, so the checkpoint never runs ahead of the data.
+    """
+
+    def __init__(self, connection, chain, relay_chain, flush_rows=DEFAULT_FLUSH_ROWS, flush_bytes=DEFAULT_FLUSH_BYTES,
+                 binary_ids=False):
+        """
+        Args:
+            connection (psycopg2.extensions.connection): The database connection object.
+            chain (str): The name of the chain.
+            relay_chain (str): The name of the relay chain.
+            flush_rows (int): Flush once this many rows are buffered.
+            flush_bytes (int): Flush once the buffers hold this many bytes.
+            binary_ids (bool): Whether the ingest runs with binary ids.
+        """
+        self.connection = connection
+        self.chain = chain
+        self.relay_chain = relay_chain
+        self.flush_rows = flush_rows
+        self.flush_bytes = flush_bytes
+        self.binary_ids = binary_ids
+        self._tables = {
+            'blocks': (BLOCK_COLUMNS, BLOCK_UPSERT, basic_block_values),
+            'extrinsics': (EXTRINSIC_COLUMNS, EXTRINSIC_UPSERT, extrinsic_values),
+            'events': (EVENT_COLUMNS, EVENT_UPSERT, event_values),
+            'logs': (LOG_COLUMNS, LOG_UPSERT, log_values)
+        }
+        self._reset()
+
+    def _reset(self):
+        self._buffers = {table: io.StringIO() for table in self._tables}
+        self.buffered_rows = 0
+        self.buffered_bytes = 0
+        self._block_numbers = []
+
+    def _render(self, table, row):
+        _, _, to_values = self._tables[table]
+        return '\t'.join(copy_text_value(value) for value in to_values(row)) + '\n'
+
+    def add(self, block_rows):
+        """
+        Buffer the rows of one block.
+
+        Pallet and method pairs new to the chain are committed on the sink's
+        connection first. The block is buffered only if that succeeds, so a
+        failed add can be retried on a new connection.
+
+        Args:
+            block_rows (dict): Block rows as returned by write_block.build_block_rows.
+        """
+        # Between flushes the connection holds no writes, so new pairs can be committed
+        intern_pallet_methods(self.connection, self.chain, self.relay_chain, [block_rows])
+        encode_binary_ids(self.connection, self.chain, self.relay_chain, [block_rows], self.binary_ids)
+        lines = [('blocks', self._render('blocks', block_rows['block']))]
+        for table in ('extrinsics', 'events', 'logs'):
+            lines += [(table, self._render(table, row)) for row in block_rows[table]]
+        for table, line in lines:
+            self._buffers[table].write(line)
+            self.buffered_bytes += len(line)
+        self.buffered_rows += len(lines)
+        self._block_numbers.append(int(block_rows['block']['number']))
+
+    def should_flush(self):
+        return self.buffered_rows >= self.flush_rows or self.buffered_bytes >= self.flush_bytes
+
+    def flush(self, checkpoint=None):
+        """
+        Send all buffered rows in one transaction.
+
+        Rows are copied into temporary staging tables and upserted from there,
+        so rows already written by the live ingest or an earlier attempt are
+        skipped rather than duplicated. The buffers are kept if the flush fails
+        so it can be retried on a new connection.
+
+        Args:
+            checkpoint (tuple): Optional (start_block, end_block, high_water_mark)
+                recorded in the same transaction.
+        """
+        if self.buffered_rows == 0 and checkpoint is None:
+            return
+        cursor = self.connection.cursor()
+        try:
+            for table, (columns, upsert, _) in self._tables.items():
+                if self._buffers[table].tell() == 0:
+                    continue
+                table_name = f"{table}_{self.relay_chain}_{self.chain}"
+                staging_table = f"copy_staging_{table}"
+                # Created for every flush, so it follows the table's current column types
+                cursor.execute(f"CREATE TEMP TABLE {staging_table} (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP")
+                self._copy(cursor, staging_table, columns, self._buffers[table])
+                cursor.execute(f"""
+                    INSERT INTO {table_name} AS target ({', '.join(columns)})
+                    SELECT {', '.join(columns)} FROM {staging_table}
+                    {upsert}""")
+            if self._block_numbers:
+                notify_blocks_committed(self.connection, self.chain, self.relay_chain,
+                                        min(self._block_numbers), max(self._block_numbers))
+            if checkpoint is not None:
+                start_block, end_block, high_water_mark = checkpoint
+                save_checkpoint(self.connection, self.chain, self.relay_chain, start_block, end_block,
+                                high_water_mark, commit=False)
+            self.connection.commit()
+            logger.info(f"Copied {self.buffered_rows} rows ({self.buffered_bytes} bytes)")
+            self._reset()
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def _copy(self, cursor, table, columns, buffer):
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+        buffer.seek(0, io.SEEK_END)
@@ -28,7 +28,8 @@ def connect_to_database(database_info: Dict[str, Any]):
 def create_tables(db_connection, database_info: Dict[str, Any], chain: str, relay_chain: str):
     if database_info['database'] == 'postgres':
         from postgres_utils import create_tables as create_postgres_tables
-        create_postgres_tables(db_connection, chain, relay_chain)
+        create_postgres_tables(db_connection, chain, relay_chain, partition_size=database_info.get('partition_size') or 0,
+                               binary_ids=database_info.get('binary_ids', False))
     elif database_info['database'] == 'mysql':
         from mysql_utils import create_tables as create_mysql_tables
         create_mysql_tables(db_connection, chain, relay_chain)
@@ -52,33 +53,112 @@ def insert_block_data(database_info, db_connection, block_data, chain_name, rela
         from bigquery_utils import connect_to_bigquery, insert_block
         insert_block(db_connection, database_info['database_dataset'], database_info['database_table'], block_data)
 
-def insert_basic_block_data(database_info, db_connection, basic_block_data, chain_name, relay_chain):
+def insert_basic_block_data(database_info, db_connection, basic_block_data, chain_name, relay_chain, commit=True):
     if database_info['database'] == 'postgres':
         from postgres_utils import insert_basic_block_data, close_connection
-        insert_basic_block_data(db_connection, basic_block_data, chain_name, relay_chain)
+        insert_basic_block_data(db_connection, basic_block_data, chain_name, relay_chain, commit=commit)
         # close_connection(db_connection)
 
-def insert_extrinsics(database_info, db_connection, extrinsics, chain_name, relay_chain):
+def insert_extrinsics(database_info, db_connection, extrinsics, chain_name, relay_chain, commit=True):
     if database_info['database'] == 'postgres':
         from postgres_utils import insert_extrinsics, close_connection
         for extrinsic in extrinsics:
-            insert_extrinsics(db_connection, extrinsic, chain_name, relay_chain)
+            insert_extrinsics(db_connection, extrinsic, chain_name, relay_chain, commit=commit)
         # close_connection(db_connection)
 
-def insert_events(database_info, db_connection, events, chain_name, relay_chain):
+def insert_events(database_info, db_connection, events, chain_name, relay_chain, commit=True):
     if database_info['database'] == 'postgres':
         from postgres_utils import insert_events, close_connection
         for event in events:
-            insert_events(db_connection, event, chain_name, relay_chain)
+            insert_events(db_connection, event, chain_name, relay_chain, commit=commit)
         # close_connection(db_connection)
 
-def insert_logs(database_info, db_connection, logs, chain_name, relay_chain):
+def insert_logs(database_info, db_connection, logs, chain_name, relay_chain, commit=True):
     if database_info['database'] == 'postgres':
         from postgres_utils import insert_logs, close_connection
         for log in logs:
-            insert_logs(db_connection, log, chain_name, relay_chain)
+            insert_logs(db_connection, log, chain_name, relay_chain, commit=commit)
         # close_connection(db_connection)
 
+# Backends with a multi-row, single-transaction write path
+BATCH_WRITE_BACKENDS = ('postgres',)
+
+# Backends with a bulk loader for historical ranges
+BULK_WRITE_BACKENDS = ('postgres',)
+
+def uses_batch_writes(database_info: Dict[str, Any]) -> bool:
+    # Single blocks written in copy mode (e.g. by the live ingest) use the batch path
+    return database_info.get('write_mode', 'row') in ('batch', 'copy') and database_info['database'] in BATCH_WRITE_BACKENDS
+
+def uses_bulk_writes(database_info: Dict[str, Any]) -> bool:
+    return database_info.get('write_mode', 'row') == 'copy' and database_info['database'] in BULK_WRITE_BACKENDS
+
+def create_bulk_sink(db_connection, database_info: Dict[str, Any], chain: str, relay_chain: str):
+    if database_info['database'] == 'postgres':
+        from copy_sink import PostgresCopySink
+        return PostgresCopySink(db_connection, chain, relay_chain, binary_ids=database_info.get('binary_ids', False))
+    else:
+        raise ValueError(f"Bulk writes are not supported for database type: {database_info['database']}")
+
+def create_bulk_load_session(database_info: Dict[str, Any], chain: str, relay_chain: str):
+    if database_info['database'] == 'postgres':
+        from bulk_load import BulkLoadSession
+        return BulkLoadSession(database_info, chain, relay_chain)
+    else:
+        raise ValueError(f"Bulk load mode is not supported for database type: {database_info['database']}")
+
+def insert_block_rows_batch(database_info, db_connection, block_rows_list, chain_name, relay_chain, commit=True):
+    if database_info['database'] == 'postgres':
+        from postgres_utils import insert_blocks_batch
+        insert_blocks_batch(db_connection, block_rows_list, chain_name, relay_chain, commit=commit)
+    else:
+        raise ValueError(f"Batch writes are not supported for database type: {database_info['database']}")
+
+def insert_block_group(database_info, db_connection, block_rows_list, chain_name, relay_chain, checkpoint=None):
+    # Every block in the group, and the optional (start_block, end_block, high_water_mark)
+    # checkpoint, is committed in one transaction or not at all
+    if database_info['database'] == 'postgres':
+        # New pallet and method pairs are committed first, the rows refer to them by id
+        from postgres_utils import intern_pallet_methods, encode_binary_ids
+        intern_pallet_methods(db_connection, chain_name, relay_chain, block_rows_list)
+        encode_binary_ids(db_connection, chain_name, relay_chain, block_rows_list, database_info.get('binary_ids', False))
+    try:
+        if uses_batch_writes(database_info):
+            insert_block_rows_batch(database_info, db_connection, block_rows_list, chain_name, relay_chain, commit=False)
+        else:
+            for block_rows in block_rows_list:
+                insert_basic_block_data(database_info, db_connection, block_rows['block'], chain_name, relay_chain, commit=False)
+                insert_extrinsics(database_info, db_connection, block_rows['extrinsics'], chain_name, relay_chain, commit=False)
+                insert_events(database_info, db_connection, block_rows['events'], chain_name, relay_chain, commit=False)
+                insert_logs(database_info, db_connection, block_rows['logs'], chain_name, relay_chain, commit=False)
+        if database_info['database'] == 'postgres' and block_rows_list:
+            from postgres_utils import notify_blocks_committed
+            block_numbers = [int(block_rows['block']['number']) for block_rows in block_rows_list]
+            notify_blocks_committed(db_connection, chain_name, relay_chain, min(block_numbers), max(block_numbers))
+        if checkpoint is not None:
+            start_block, end_block, high_water_mark = checkpoint
+            save_checkpoint(db_connection, database_info, chain_name, relay_chain, start_block, end_block, high_water_mark, commit=False)
+        if database_info['database'] in ['postgres', 'mysql']:
+            db_connection.commit()
+    except Exception:
+        if database_info['database'] == 'postgres' and db_connection and not db_connection.closed:
+            db_connection.rollback()
+        raise
+
+def insert_block_rows(database_info, db_connection, block_rows, chain_name, relay_chain):
+    insert_block_group(database_info, db_connection, [block_rows], chain_name, relay_chain)
+
+def query_checkpoint(db_connection, database_info: Dict[str, Any], chain: str, relay_chain: str, start_block: int, end_block: int):
+    if database_info['database'] == 'postgres':
+        from postgres_utils import query_checkpoint
+        return query_checkpoint(db_connection, chain, relay_chain, start_block, end_block)
+    return None
+
+def save_checkpoint(db_connection, database_info: Dict[str, Any], chain: str, relay_chain: str, start_block: int, end_block: int, high_water_mark: int, commit: bool = True):
+    if database_info['database'] == 'postgres':
+        from postgres_utils import save_checkpoint
+        save_checkpoint(db_connection, chain, relay_chain, start_block, end_block, high_water_mark, commit=commit)
+
 def close_connection(db_connection, database_info: Dict[str, Any]):
     if database_info['database'] in ['postgres', 'mysql']:
         if database_info['database'] == 'postgres':
@@ -94,6 +174,39 @@ def close_connection(db_connection, database_info: Dict[str, Any]):
     else:
         raise ValueError(f"Unsupported database type: {database_info['database']}")
 
+def ensure_partitions(db_connection, database_info: Dict[str, Any], chain: str, relay_chain: str, first_block: int, last_block: int):
+    # Only PostgreSQL tables are range-partitioned
+    partition_size = database_info.get('partition_size') or 0
+    if database_info['database'] == 'postgres' and partition_size > 0:
+        from postgres_utils import ensure_partitions as ensure_postgres_partitions
+        ensure_postgres_partitions(db_connection, chain, relay_chain, first_block, last_block, partition_size)
+
+def check_connection(db_connection, database_info: Dict[str, Any]) -> bool:
+    if database_info['database'] == 'postgres':
+        from postgres_utils import check_connection as check_postgres
+        return check_postgres(db_connection)
+    elif database_info['database'] == 'mysql':
+        from mysql_utils import check_connection as check_mysql
+        return check_mysql(db_connection)
+    elif database_info['database'] == 'bigquery':
+        # The BigQuery client is stateless HTTP and reconnects by itself
+        return db_connection is not None
+    else:
+        raise ValueError(f"Unsupported database type: {database_info['database']}")
+
+def is_transient_error(database_info: Dict[str, Any], error: Exception) -> bool:
+    # Lost connections, deadlocks and timeouts can succeed when retried. Rows the
+    # database rejects, or ids that cannot be stored as bytes, fail every time.
+    if isinstance(error, ConnectionError):
+        return True
+    if database_info['database'] == 'postgres':
+        import psycopg2
+        return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+    elif database_info['database'] == 'mysql':
+        from mysql.connector import errors
+        return isinstance(error, (errors.OperationalError, errors.InterfaceError))
+    return False
+
 def query_last_block(db_connection, database_info: Dict[str, Any], chain: str, relay_chain: str, block_num = None):
     if database_info['database'] == 'postgres':
         from postgres_utils import query
@@ -1,8 +1,12 @@
+import argparse
+import math
 import os
 import time
 import logging
 from datetime import datetime
 from database_utils import connect_to_database, close_connection
+from postgres_utils import maintenance_lock_key, leaf_tables, fold_event_counts
+from index_advisor import advise
 
 # Set up logging
 logging.basicConfig(
@@ -34,15 +38,38 @@ logging.info(f"Port: {DATABASE_CONFIG['database_port']}")
 logging.info(f"Database: {DATABASE_CONFIG['database_name']}")
 logging.info(f"User: {DATABASE_CONFIG['database_user']}")
 
+# Scheduler settings. Statistics are checked every interval and a table or
+# index is only maintained once one of the thresholds below is crossed.
+MAINTENANCE_CONFIG = {
+    # Seconds between statistics checks
+    "interval_seconds": int(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "600")),
+    # VACUUM a table once this share of its rows are dead tuples...
+    "vacuum_dead_ratio": float(os.getenv("MAINTENANCE_VACUUM_DEAD_RATIO", "0.1")),
+    # ...and there are at least this many of them
+    "vacuum_min_dead_rows": int(os.getenv("MAINTENANCE_VACUUM_MIN_DEAD_ROWS", "10000")),
+    # ANALYZE a table once this share of its rows changed since the last analyze...
+    "analyze_modified_ratio": float(os.getenv("MAINTENANCE_ANALYZE_MODIFIED_RATIO", "0.05")),
+    # ...and at least this many rows changed
+    "analyze_min_modified_rows": int(os.getenv("MAINTENANCE_ANALYZE_MIN_MODIFIED_ROWS", "1000")),
+    # REINDEX CONCURRENTLY a B-tree index once this share of its size is estimated bloat...
+    "reindex_bloat_ratio": float(os.getenv("MAINTENANCE_REINDEX_BLOAT_RATIO", "0.3")),
+    # ...and the index is at least this large
+    "reindex_min_mb": int(os.getenv("MAINTENANCE_REINDEX_MIN_MB", "10")),
+    # Give up on an action instead of queueing behind ingest or API locks
+    "lock_timeout": os.getenv("MAINTENANCE_LOCK_TIMEOUT", "5s"),
+}
+
+CHAIN_TABLES = ('blocks', 'extrinsics', 'events', 'logs')
+
 def create_indexes(conn, relay_chain, chain):
-    """Create all necessary indexes"""
+    """
+    Create all necessary indexes. Lookups by block number use the primary and natural keys,
+    pallet and method filters the indexes the ingest creates with the pallet_methods table.
+    """
     try:
         with conn.cursor() as cur:
             # Blocks table indexes
             cur.execute(f"""
-                CREATE INDEX IF NOT EXISTS idx_blocks_number 
-                ON blocks_{relay_chain}_{chain} (number);
-                
                 CREATE INDEX IF NOT EXISTS idx_blocks_hash 
                 ON blocks_{relay_chain}_{chain} (hash);
                 
@@ -55,34 +82,26 @@ def create_indexes(conn, relay_chain, chain):
                 CREATE INDEX IF NOT EXISTS idx_blocks_finalized 
                 ON blocks_{relay_chain}_{chain} (finalized) 
                 WHERE finalized = true;
+
+                CREATE INDEX IF NOT EXISTS idx_blocks_unfinalized 
+                ON blocks_{relay_chain}_{chain} (number DESC) 
+                WHERE finalized = false;
             """)
 
             # Events table indexes
             cur.execute(f"""
-                CREATE INDEX IF NOT EXISTS idx_events_block_number 
-                ON events_{relay_chain}_{chain} (number);
-                
                 CREATE INDEX IF NOT EXISTS idx_events_extrinsic_id 
                 ON events_{relay_chain}_{chain} (extrinsic_id);
                 
-                CREATE INDEX IF NOT EXISTS idx_events_pallet_method 
-                ON events_{relay_chain}_{chain} (pallet, method);
-                
                 CREATE INDEX IF NOT EXISTS idx_events_timestamp 
                 ON events_{relay_chain}_{chain} (timestamp DESC);
             """)
 
             # Extrinsics table indexes
             cur.execute(f"""
-                CREATE INDEX IF NOT EXISTS idx_extrinsics_block_number 
-                ON extrinsics_{relay_chain}_{chain} (number);
-                
                 CREATE INDEX IF NOT EXISTS idx_extrinsics_hash 
                 ON extrinsics_{relay_chain}_{chain} (extrinsic_hash);
                 
-                CREATE INDEX IF NOT EXISTS idx_extrinsics_pallet_method 
-                ON extrinsics_{relay_chain}_{chain} (pallet, method);
-                
                 CREATE INDEX IF NOT EXISTS idx_extrinsics_success 
                 ON extrinsics_{relay_chain}_{chain} (success) 
                 WHERE success = true;
@@ -93,9 +112,6 @@ def create_indexes(conn, relay_chain, chain):
 
             # Logs table indexes
             cur.execute(f"""
-                CREATE INDEX IF NOT EXISTS idx_logs_block_number 
-                ON logs_{relay_chain}_{chain} (number);
-                
                 CREATE INDEX IF NOT EXISTS idx_logs_index 
                 ON logs_{relay_chain}_{chain} (index);
             """)
@@ -107,54 +123,163 @@ def create_indexes(conn, relay_chain, chain):
         logging.error(f"Error creating indexes: {str(e)}")
         raise
 
-def analyze_tables(conn, relay_chain, chain):
-    """Analyze tables to update statistics"""
-    try:
-        with conn.cursor() as cur:
-            tables = [
-                f'blocks_{relay_chain}_{chain}',
-                f'events_{relay_chain}_{chain}',
-                f'extrinsics_{relay_chain}_{chain}',
-                f'logs_{relay_chain}_{chain}'
-            ]
-            
-            for table in tables:
-                cur.execute(f"ANALYZE {table};")
-                logging.info(f"Analyzed table: {table}")
-        
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        logging.error(f"Error analyzing tables: {str(e)}")
-        raise
+def discover_chains(conn):
+    """Find the table suffix (<relay_chain>_<chain>) of every chain with ingest tables"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT substr(c.relname, length('blocks_') + 1)
+            FROM pg_class c
+            WHERE c.relname LIKE 'blocks\\_%%' AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+            AND c.relnamespace = current_schema()::regnamespace
+            AND c.relname NOT LIKE '%%\\_\\_typed' AND c.relname NOT LIKE '%%\\_\\_legacy'
+            AND EXISTS (
+                SELECT 1 FROM pg_class e
+                WHERE e.relname = 'events_' || substr(c.relname, length('blocks_') + 1)
+                AND e.relnamespace = c.relnamespace
+            )
+            ORDER BY 1
+        """)
+        return [row[0] for row in cur.fetchall()]
+
+def try_lock_chain(conn, chain_suffix):
+    """Take the chain's maintenance lock, which fails while a bulk load of the chain is running"""
+    relay_chain, chain = chain_suffix.split('_', 1)
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (maintenance_lock_key(chain, relay_chain),))
+        return cur.fetchone()[0]
+
+def unlock_chain(conn, chain_suffix):
+    relay_chain, chain = chain_suffix.split('_', 1)
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (maintenance_lock_key(chain, relay_chain),))
+
+def table_statistics(conn, chain_suffix):
+    """Row statistics of the chain's tables, one row per leaf partition for partitioned tables"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT s.relid::regclass::text, s.n_live_tup, s.n_dead_tup, s.n_mod_since_analyze,
+                   coalesce(s.last_analyze, s.last_autoanalyze) IS NOT NULL
+            FROM pg_stat_user_tables s
+            WHERE s.relid = ANY(%s::regclass[])
+            ORDER BY 1
+        """, (leaf_tables(cur, [f"{table}_{chain_suffix}" for table in CHAIN_TABLES]),))
+        return cur.fetchall()
+
+def index_statistics(conn, table_name):
+    """
+    Size and estimated bloat of the valid B-tree indexes of a table.
 
-def reindex_tables(conn, relay_chain, chain):
-    """Reindex all tables"""
+    The expected size assumes every entry takes a tuple header, a line pointer
+    and the average width of its columns at the default 90% leaf fill. Indexes
+    on expressions have no column statistics and are not estimated.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.oid::regclass::text, c.relpages, c.reltuples,
+                   (SELECT sum(s.avg_width) FROM pg_attribute a
+                    JOIN pg_stats s ON s.schemaname = n.nspname AND s.tablename = t.relname AND s.attname = a.attname
+                    WHERE a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)),
+                   (SELECT count(*) FROM unnest(i.indkey) k WHERE k <> 0) = i.indnatts,
+                   current_setting('block_size')::int
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_class t ON t.oid = i.indrelid
+            JOIN pg_namespace n ON n.oid = t.relnamespace
+            JOIN pg_am am ON am.oid = c.relam
+            WHERE i.indrelid = %s::regclass AND am.amname = 'btree' AND i.indisvalid
+            ORDER BY 1
+        """, (table_name,))
+        indexes = []
+        for index_name, pages, tuples, width, plain_columns, block_size in cur.fetchall():
+            bloat_ratio = None
+            if plain_columns and width is not None and pages > 1 and tuples > 0:
+                entry_bytes = 8 + 4 + ((int(width) + 7) // 8) * 8
+                # Leaf pages plus the metapage
+                expected_pages = math.ceil(tuples * entry_bytes / (block_size * 0.9)) + 1
+                bloat_ratio = max(0.0, 1 - expected_pages / pages)
+            indexes.append((index_name, pages * block_size, bloat_ratio))
+        return indexes
+
+def plan_actions(conn, chain_suffix):
+    """List the maintenance due for a chain as (statement, target, reason) tuples"""
+    actions = []
+    for table_name, live, dead, modified, analyzed in table_statistics(conn, chain_suffix):
+        if dead >= MAINTENANCE_CONFIG["vacuum_min_dead_rows"] and \
+                dead >= MAINTENANCE_CONFIG["vacuum_dead_ratio"] * (live + dead):
+            # VACUUM (ANALYZE) also refreshes the statistics
+            actions.append((f"VACUUM (ANALYZE) {table_name}", table_name, f"{dead} dead rows, {live} live"))
+        elif (not analyzed and live > 0) or (modified >= MAINTENANCE_CONFIG["analyze_min_modified_rows"] and
+                                             modified >= MAINTENANCE_CONFIG["analyze_modified_ratio"] * live):
+            actions.append((f"ANALYZE {table_name}", table_name, f"{modified} rows modified since the last analyze"))
+
+        for index_name, size, bloat_ratio in index_statistics(conn, table_name):
+            if bloat_ratio is not None and bloat_ratio >= MAINTENANCE_CONFIG["reindex_bloat_ratio"] and \
+                    size >= MAINTENANCE_CONFIG["reindex_min_mb"] * 1024 * 1024:
+                actions.append((f"REINDEX INDEX CONCURRENTLY {index_name}", index_name,
+                                f"{size / 1024 / 1024:.0f} MB, {bloat_ratio:.0%} estimated bloat"))
+    return actions
+
+def drop_invalid_indexes(conn, chain_suffix):
+    """Drop the leftover copies of interrupted concurrent reindexes"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT i.indexrelid::regclass::text
+            FROM pg_index i
+            JOIN pg_class t ON t.oid = i.indrelid
+            WHERE NOT i.indisvalid AND t.relname LIKE %s
+            AND i.indexrelid::regclass::text ~ '_ccnew[0-9]*$'
+        """, (f"%\\_{chain_suffix}%",))
+        invalid = [row[0] for row in cur.fetchall()]
+    return [(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}", index_name, "invalid index left by an interrupted reindex")
+            for index_name in invalid]
+
+def run_actions(conn, actions):
+    """Run maintenance statements one by one, returning (statement, reason, seconds, error) for each"""
+    report = []
+    with conn.cursor() as cur:
+        cur.execute("SET lock_timeout = %s", (MAINTENANCE_CONFIG["lock_timeout"],))
+        for statement, target, reason in actions:
+            started = time.time()
+            error = None
+            try:
+                cur.execute(statement)
+            except Exception as e:
+                error = str(e).strip()
+            elapsed = time.time() - started
+            if error is None:
+                logging.info(f"{statement} ({reason}) took {elapsed:.1f} seconds")
+            else:
+                logging.error(f"{statement} ({reason}) failed after {elapsed:.1f} seconds: {error}")
+            report.append((statement, reason, elapsed, error))
+    return report
+
+def maintain_chain(conn, chain_suffix):
+    """Run the maintenance due for one chain, unless a bulk load of the chain is running"""
+    # Folding the event count deltas does not touch indexes, so it also runs during bulk loads
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s)", (f"event_count_deltas_{chain_suffix}",))
+        if cur.fetchone()[0] is not None:
+            relay_chain, chain = chain_suffix.split('_', 1)
+            folded = fold_event_counts(cur, chain, relay_chain)
+            if folded:
+                logging.info(f"Folded {folded} event count deltas of {chain_suffix}")
+
+    # Bulk loads drop and rebuild indexes themselves, so skip the chain
+    # instead of maintaining tables under them
+    if not try_lock_chain(conn, chain_suffix):
+        logging.info(f"Bulk load of {chain_suffix} in progress, skipping its maintenance")
+        return []
     try:
-        with conn.cursor() as cur:
-            tables = [
-                f'blocks_{relay_chain}_{chain}',
-                f'events_{relay_chain}_{chain}',
-                f'extrinsics_{relay_chain}_{chain}',
-                f'logs_{relay_chain}_{chain}'
-            ]
-            
-            for table in tables:
-                cur.execute(f"REINDEX TABLE {table};")
-                logging.info(f"Reindexed table: {table}")
-        
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        logging.error(f"Error reindexing tables: {str(e)}")
-        raise
+        if chain_suffix == f"{os.getenv('RELAY_CHAIN')}_{os.getenv('CHAIN')}":
+            create_indexes(conn, os.getenv('RELAY_CHAIN'), os.getenv('CHAIN'))
+        actions = drop_invalid_indexes(conn, chain_suffix) + plan_actions(conn, chain_suffix)
+        return run_actions(conn, actions)
+    finally:
+        unlock_chain(conn, chain_suffix)
 
 def maintenance_cycle():
     """Main maintenance cycle"""
-    relay_chain = os.getenv('RELAY_CHAIN')
-    chain = os.getenv('CHAIN')
-    
-    logging.info(f"Starting maintenance cycle for {relay_chain}_{chain}")
+    logging.info(f"Starting maintenance scheduler (checking statistics every {MAINTENANCE_CONFIG['interval_seconds']} seconds)")
     
     # Initial delay to allow database to boot up
     logging.info("Waiting for database to be ready...")
@@ -181,26 +306,54 @@ def maintenance_cycle():
                     else:
                         raise Exception("Max retries reached. Could not connect to database.")
             
-            logging.info("Starting maintenance cycle")
-            
-            # Create/update indexes
-            create_indexes(conn, relay_chain, chain)
-            
-            # Analyze tables
-            analyze_tables(conn, relay_chain, chain)
-            
-            # Reindex tables
-            reindex_tables(conn, relay_chain, chain)
-            
-            close_connection(conn, DATABASE_CONFIG)
-            logging.info("Maintenance cycle completed successfully")
+            # VACUUM and concurrent reindexes cannot run inside a transaction
+            conn.autocommit = True
+            started = time.time()
+            report = []
+            try:
+                for chain_suffix in discover_chains(conn):
+                    report += maintain_chain(conn, chain_suffix)
+            finally:
+                close_connection(conn, DATABASE_CONFIG)
+
+            failed = sum(1 for _, _, _, error in report if error is not None)
+            logging.info(f"Maintenance cycle completed: {len(report) - failed} actions succeeded, {failed} failed, "
+                         f"in {time.time() - started:.1f} seconds")
             
-            # Wait for 2 hours
-            time.sleep(7200)  # 2 hours in seconds
+            time.sleep(MAINTENANCE_CONFIG["interval_seconds"])
             
         except Exception as e:
             logging.error(f"Error in maintenance cycle: {str(e)}")
             time.sleep(300)  # Wait 5 minutes before retrying
 
+def advise_indexes(args):
+    """Report index problems of the chains in the database and optionally create the proposed indexes"""
+    conn = connect_to_database(DATABASE_CONFIG)
+    if conn is None:
+        raise Exception("Could not connect to database.")
+    # Proposed indexes are built concurrently, which cannot run inside a transaction
+    conn.autocommit = True
+    try:
+        chains = [f"{args.relay_chain}_{args.chain}"] if args.chain and args.relay_chain else discover_chains(conn)
+        for chain_suffix in chains:
+            advise(conn, chain_suffix, apply=args.apply, min_rows=args.min_rows)
+    finally:
+        close_connection(conn, DATABASE_CONFIG)
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Database maintenance for the ingest tables")
+    subcommands = parser.add_subparsers(dest="command")
+    subcommands.add_parser("run", help="Run the maintenance scheduler (default)")
+    advisor = subcommands.add_parser("advise-indexes", help="Check the backend queries' plans and the index usage of every chain")
+    advisor.add_argument("--chain", help="Only check this chain (requires --relay_chain)")
+    advisor.add_argument("--relay_chain", help="Relay chain of --chain")
+    advisor.add_argument("--apply", action="store_true", help="Create the proposed indexes without blocking writes")
+    advisor.add_argument("--min_rows", type=int, default=10000, help="Report sequential scans and sorts of at least this many rows")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    maintenance_cycle() 
\ No newline at end of file
+    args = parse_arguments()
+    if args.command == "advise-indexes":
+        advise_indexes(args)
+    else:
+        maintenance_cycle()
@@ -0,0 +1,79 @@
+import logging
+import time
+
+logger = logging.getLogger('group-commit')
+
+
+class GroupCommitter:
+    """
+    Batches consecutive blocks into one database transaction.
+
+    A group is committed once it holds group_size blocks or its oldest block
+    has waited max_delay_ms. The group size adapts to observed commit latency:
+    it doubles while commits finish well under target_commit_ms and halves
+    when they take longer, within 1 and max_group_size.
+    """
+
+    def __init__(self, write_group, max_group_size=1, max_delay_ms=1000, target_commit_ms=250):
+        """
+        Args:
+            write_group (callable): Called as write_group(block_rows_list, last_block_id)
+                and must commit the whole group atomically.
+            max_group_size (int): The largest number of blocks per commit. 1 disables grouping.
+            max_delay_ms (int): The longest a block may wait for its group to commit.
+            target_commit_ms (int): The commit latency the group size is tuned towards.
+        """
+        self.write_group = write_group
+        self.max_group_size = max(1, max_group_size)
+        self.max_delay = max_delay_ms / 1000
+        self.target_commit = target_commit_ms / 1000
+        self.group_size = 1
+        self._pending = []
+        self._last_block_id = None
+        self._oldest = None
+
+    def add(self, block_id, block_rows):
+        """
+        Queue a block for the next group commit.
+        """
+        if not self._pending:
+            self._oldest = time.monotonic()
+        self._pending.append(block_rows)
+        self._last_block_id = block_id
+
+    def is_due(self):
+        """
+        Whether the pending group is full or its oldest block has waited max_delay_ms.
+        """
+        return bool(self._pending) and (len(self._pending) >= self.group_size or self.time_until_due() == 0)
+
+    def time_until_due(self):
+        """
+        Seconds until the pending group must be committed, or None if nothing is pending.
+        """
+        if not self._pending:
+            return None
+        return max(0.0, self.max_delay - (time.monotonic() - self._oldest))
+
+    def flush(self):
+        """
+        Commit the pending group. The group is kept if the write fails so it can be retried.
+        """
+        if not self._pending:
+            return
+        started = time.monotonic()
+        self.write_group(self._pending, self._last_block_id)
+        elapsed = time.monotonic() - started
+        committed = len(self._pending)
+        self._pending = []
+        self._adapt(committed, elapsed)
+
+    def _adapt(self, committed, elapsed):
+        previous = self.group_size
+        if elapsed > self.target_commit:
+            self.group_size = max(1, self.group_size // 2)
+        elif elapsed < self.target_commit / 2 and committed >= self.group_size:
+            self.group_size = min(self.max_group_size, self.group_size * 2)
+        if self.group_size != previous:
+            logger.info(f"Group commit size {previous} -> {self.group_size} "
+                        f"({committed} blocks committed in {elapsed * 1000:.0f} ms)")
@@ -0,0 +1,348 @@
+import json
+import logging
+import time
+from postgres_utils import TABLE_COLUMNS, is_partitioned, leaf_tables
+
+logger = logging.getLogger('index-advisor')
+
+# Indexes the advisor can propose, by name suffix: (table, key columns)
+CANDIDATE_INDEXES = {
+    'hash': ('blocks', 'hash'),
+    'extrinsic_hash': ('extrinsics', 'extrinsic_hash'),
+}
+
+# The queries the backend runs against the database: (endpoint, table, query, candidate index).
+# They are written as the backend writes them, with the column list replaced by *, and
+# backend/test_index_advisor.py checks that the backend still runs each of them.
+# Parameters are filled with values sampled from the chain's own rows. Pallet and
+# method filters are served by the indexes created with the pallet_methods table.
+# The recent block buffer answers the first page of the recent endpoints, and
+# loads the newest blocks with their extrinsics and events.
+ENDPOINT_QUERIES = [
+    ("recent block buffer (blocks)", 'blocks',
+     "SELECT * FROM {table} WHERE 1=1 ORDER BY number DESC LIMIT %(recent_blocks)s", None),
+    ("recent block buffer (extrinsics)", 'extrinsics',
+     "SELECT * FROM {table} WHERE number BETWEEN %(first_number)s AND %(number)s "
+     "ORDER BY number, extrinsic_index", None),
+    ("recent block buffer (events)", 'events',
+     "SELECT * FROM {table} WHERE number BETWEEN %(first_number)s AND %(number)s "
+     "ORDER BY number, event_index", None),
+    ("/blocks/{block_number}", 'blocks',
+     "SELECT * FROM {table} WHERE number = %(number)s", None),
+    ("/blocks/search", 'blocks',
+     "SELECT * FROM {table} WHERE 1=1 ORDER BY number DESC LIMIT %(limit)s", None),
+    ("/blocks/hash/{block_hash}", 'blocks',
+     "SELECT * FROM {table} WHERE hash = %(hash)s", 'hash'),
+    ("/blocks/{block_number}/events", 'events',
+     "SELECT * FROM {table} WHERE number = %(number)s ORDER BY event_index LIMIT %(limit)s OFFSET %(offset)s", None),
+    ("/blocks/{block_number}/extrinsics", 'extrinsics',
+     "SELECT * FROM {table} WHERE number = %(number)s ORDER BY extrinsic_index LIMIT %(limit)s OFFSET %(offset)s", None),
+    ("/blocks/{block_number}/logs", 'logs',
+     "SELECT * FROM {table} WHERE number = %(number)s ORDER BY index", None),
+    ("/extrinsics/hash/{extrinsic_hash}", 'extrinsics',
+     "SELECT * FROM {table} WHERE extrinsic_hash = %(extrinsic_hash)s", 'extrinsic_hash'),
+    ("/extrinsics/recent", 'extrinsics',
+     "SELECT * FROM {table} WHERE 1=1 ORDER BY number DESC, extrinsic_index DESC LIMIT %(limit)s", None),
+    ("/extrinsics/recent?pallet&method", 'extrinsics',
+     "SELECT * FROM {table} WHERE pallet_method_id = %(extrinsic_pallet_method_id)s "
+     "ORDER BY number DESC, extrinsic_index DESC LIMIT %(limit)s", None),
+    ("/events/recent?page", 'events',
+     "SELECT * FROM {table} WHERE 1=1 ORDER BY number DESC, event_index LIMIT %(limit)s OFFSET %(offset)s", None),
+    ("/events/recent?cursor", 'events',
+     "SELECT * FROM {table} WHERE 1=1 AND number <= %(number)s AND (number < %(number)s OR event_index > %(event_index)s) "
+     "ORDER BY number DESC, event_index LIMIT %(limit)s", None),
+    ("/events/recent?pallet&method&page", 'events',
+     "SELECT * FROM {table} WHERE pallet_method_id = %(event_pallet_method_id)s "
+     "ORDER BY number DESC, event_index LIMIT %(limit)s OFFSET %(offset)s", None),
+    ("/events/recent?pallet&method&cursor", 'events',
+     "SELECT * FROM {table} WHERE pallet_method_id = %(event_pallet_method_id)s "
+     "AND number <= %(number)s AND (number < %(number)s OR event_index > %(event_index)s) "
+     "ORDER BY number DESC, event_index LIMIT %(limit)s", None),
+]
+
+SCAN_NODES = ('Seq Scan', 'Parallel Seq Scan')
+ORDERED_SCAN_NODES = ('Index Scan', 'Index Only Scan')
+
+
+def candidate_index_name(table_name, candidate):
+    return f"idx_{table_name}_{candidate}"
+
+
+def sample_parameters(cursor, chain_suffix):
+    """
+    Pick parameter values for the endpoint queries from the newest rows of the
+    chain. Filters use the rarest pallet and method among recent rows, the
+    selective kind of filter an index should serve.
+
+    Returns:
+        dict: The parameters, or None if the chain has no blocks yet.
+    """
+    cursor.execute(f"SELECT number, hash FROM blocks_{chain_suffix} ORDER BY number DESC LIMIT 1")
+    block = cursor.fetchone()
+    if block is None:
+        return None
+    # Pages of 50 rows plus the one that tells whether there is a next page, the
+    # second page for page-number queries, and a cursor halfway into the block
+    parameters = {'number': block[0], 'hash': block[1], 'extrinsic_hash': '',
+                  'extrinsic_pallet_method_id': None, 'event_pallet_method_id': None,
+                  'first_number': block[0] - 99, 'recent_blocks': 100, 'limit': 51, 'offset': 50, 'event_index': 25}
+    cursor.execute(f"""
+        SELECT min(extrinsic_hash), pallet_method_id
+        FROM (SELECT * FROM extrinsics_{chain_suffix} ORDER BY number DESC LIMIT 1000) recent
+        GROUP BY pallet_method_id ORDER BY count(*), pallet_method_id LIMIT 1
+    """)
+    extrinsic = cursor.fetchone()
+    if extrinsic is not None:
+        parameters.update(extrinsic_hash=extrinsic[0], extrinsic_pallet_method_id=extrinsic[1])
+    cursor.execute(f"""
+        SELECT pallet_method_id
+        FROM (SELECT * FROM events_{chain_suffix} ORDER BY number DESC LIMIT 1000) recent
+        GROUP BY pallet_method_id ORDER BY count(*), pallet_method_id LIMIT 1
+    """)
+    event = cursor.fetchone()
+    if event is not None:
+        parameters.update(event_pallet_method_id=event[0])
+    return parameters
+
+
+def explain(cursor, query, parameters):
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {query}", parameters)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']
+
+
+def plan_problems(cursor, plan, min_rows):
+    """
+    Describe the parts of a plan that read or sort a large share of a table.
+
+    A relation counts as read in full when it is scanned sequentially, or
+    through an index that only provides the order while a filter discards
+    rows. Reads of the partitions of one table are counted together.
+
+    Args:
+        cursor: A database cursor.
+        plan (dict): The root node of a JSON plan.
+        min_rows (int): Reads and sorts of fewer estimated rows are not reported.
+    """
+    problems = []
+    scanned = set()
+    nodes = [plan]
+    while nodes:
+        node = nodes.pop()
+        nodes.extend(node.get('Plans', []))
+        if node['Node Type'] in SCAN_NODES or (node['Node Type'] in ORDERED_SCAN_NODES and
+                                               'Filter' in node and 'Index Cond' not in node):
+            scanned.add(node['Relation Name'])
+        elif node['Node Type'] == 'Sort' and node.get('Plans') and node['Plans'][0].get('Plan Rows', 0) >= min_rows:
+            problems.append(f"sort of {node['Plans'][0]['Plan Rows']} rows")
+    if scanned:
+        cursor.execute("SELECT sum(greatest(reltuples, 0))::bigint FROM pg_class WHERE oid = ANY(%s::regclass[])",
+                       (sorted(scanned),))
+        rows = cursor.fetchone()[0] or 0
+        if rows >= min_rows:
+            relations = sorted(scanned)
+            listed = ', '.join(relations[:3]) + (f" and {len(relations) - 3} more" if len(relations) > 3 else '')
+            problems.insert(0, f"full read of {rows} rows in {listed}")
+    return problems
+
+
+def existing_indexes(cursor, table_names):
+    cursor.execute("""
+        SELECT c.relname FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_class t ON t.oid = i.indrelid
+        WHERE t.relname = ANY(%s) AND t.relnamespace = current_schema()::regnamespace
+    """, (list(table_names),))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def check_endpoints(cursor, chain_suffix, min_rows):
+    """
+    Run the planner on every endpoint query and propose an index where the plan scans or sorts a large table.
+
+    Returns:
+        list: (endpoint, total cost, problems, proposed candidate or None) for each endpoint.
+    """
+    parameters = sample_parameters(cursor, chain_suffix)
+    if parameters is None:
+        logger.info(f"{chain_suffix} has no blocks yet, skipping endpoint plans")
+        return []
+    indexes = existing_indexes(cursor, [f"{table}_{chain_suffix}" for table in TABLE_COLUMNS])
+    results = []
+    for endpoint, table, query, candidate in ENDPOINT_QUERIES:
+        table_name = f"{table}_{chain_suffix}"
+        plan = explain(cursor, query.format(table=table_name), parameters)
+        problems = plan_problems(cursor, plan, min_rows)
+        proposed = None
+        if problems and candidate is not None and candidate_index_name(table_name, candidate) not in indexes:
+            proposed = candidate
+        results.append((endpoint, plan['Total Cost'], problems, proposed))
+    return results
+
+
+def create_candidate_index(cursor, table_name, candidate):
+    """
+    Build a proposed index without blocking writes. Partitioned indexes
+    cannot be built concurrently, so the parent index is created empty and
+    each partition's index is built concurrently and attached.
+    """
+    _, columns = CANDIDATE_INDEXES[candidate]
+    index_name = candidate_index_name(table_name, candidate)
+    if is_partitioned(cursor, table_name):
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON ONLY {table_name} ({columns})")
+        for partition in leaf_tables(cursor, [table_name]):
+            partition_index = f"{partition}_{candidate}"
+            cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition_index} ON {partition} ({columns})")
+            cursor.execute(f"""
+                SELECT 1 FROM pg_inherits WHERE inhrelid = %s::regclass AND inhparent = %s::regclass
+            """, (partition_index, index_name))
+            if cursor.fetchone() is None:
+                cursor.execute(f"ALTER INDEX {index_name} ATTACH PARTITION {partition_index}")
+    else:
+        cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON {table_name} ({columns})")
+    # Expression indexes only help the planner once their expressions have statistics
+    cursor.execute(f"ANALYZE {table_name}")
+
+
+def statement_statistics(cursor, chain_suffix, limit=10):
+    """
+    The most expensive statements on the chain's tables, from pg_stat_statements.
+
+    Returns:
+        list: (calls, total ms, mean ms, rows, query) tuples, or None if pg_stat_statements is not available.
+    """
+    cursor.execute("SELECT to_regclass('pg_stat_statements') IS NOT NULL")
+    if not cursor.fetchone()[0]:
+        return None
+    try:
+        cursor.execute("""
+            SELECT calls, total_exec_time, mean_exec_time, rows, query
+            FROM pg_stat_statements
+            WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+            AND query LIKE %s
+            ORDER BY total_exec_time DESC
+            LIMIT %s
+        """, (f"%\\_{chain_suffix}%", limit))
+    except Exception as e:
+        # The extension exists but the library is not in shared_preload_libraries
+        logger.warning(f"Could not read pg_stat_statements: {str(e).strip()}")
+        cursor.connection.rollback()
+        return None
+    return cursor.fetchall()
+
+
+def index_usage(cursor, chain_suffix):
+    """
+    Scans, size and key columns of every index on the chain's tables. Scans
+    and sizes of partition indexes are added up on their partitioned index.
+
+    Returns:
+        list: (index, table, scans, size in bytes, unique, access method, predicate, keys) tuples.
+    """
+    table_names = [f"{table}_{chain_suffix}" for table in TABLE_COLUMNS]
+    cursor.execute("""
+        WITH usage AS (
+            SELECT coalesce(inh.inhparent, s.indexrelid) AS index_oid,
+                   sum(s.idx_scan) AS scans, sum(pg_relation_size(s.indexrelid)) AS size
+            FROM pg_stat_user_indexes s
+            LEFT JOIN pg_inherits inh ON inh.inhrelid = s.indexrelid
+            WHERE s.relid = ANY(%s::regclass[])
+            GROUP BY 1
+        )
+        SELECT u.index_oid::regclass::text, i.indrelid::regclass::text, u.scans, u.size,
+               i.indisunique OR i.indisprimary, am.amname, pg_get_expr(i.indpred, i.indrelid),
+               array(SELECT pg_get_indexdef(i.indexrelid, k, true) || ' ' || (i.indoption[k - 1] & 1)::text
+                     FROM generate_series(1, i.indnkeyatts) k)
+        FROM usage u
+        JOIN pg_index i ON i.indexrelid = u.index_oid
+        JOIN pg_class c ON c.oid = u.index_oid
+        JOIN pg_am am ON am.oid = c.relam
+        ORDER BY 2, 1
+    """, (leaf_tables(cursor, table_names),))
+    return cursor.fetchall()
+
+
+def redundant_indexes(usage):
+    """
+    Find non-unique indexes whose key columns are a leading part of another
+    index on the same table, like an index on blocks.number next to its
+    primary key. Such an index can serve no query the other cannot.
+
+    Returns:
+        list: (index, covering index) pairs.
+    """
+    redundant = []
+    for index, table, _, _, unique, method, predicate, keys in usage:
+        if unique:
+            continue
+        for other, other_table, _, _, other_unique, other_method, other_predicate, other_keys in usage:
+            if other == index or (other_table, other_method, other_predicate) != (table, method, predicate):
+                continue
+            if other_keys[:len(keys)] != keys:
+                continue
+            # Of two identical non-unique indexes only one is reported
+            if len(other_keys) > len(keys) or other_unique or other < index:
+                redundant.append((index, other))
+                break
+    return redundant
+
+
+def advise(conn, chain_suffix, apply=False, min_rows=10000):
+    """
+    Report index problems of one chain and optionally create the proposed indexes.
+
+    Args:
+        conn: An autocommit PostgreSQL connection.
+        chain_suffix (str): The <relay_chain>_<chain> suffix of the chain's tables.
+        apply (bool): Create the proposed indexes and report the new plan costs.
+        min_rows (int): Scans and sorts of fewer estimated rows are not reported.
+    """
+    with conn.cursor() as cur:
+        logger.info(f"Index report for {chain_suffix}")
+
+        statements = statement_statistics(cur, chain_suffix)
+        if statements is None:
+            logger.info("pg_stat_statements is not available. Add it to shared_preload_libraries and run "
+                        "CREATE EXTENSION pg_stat_statements to include the slowest statements in this report.")
+        else:
+            for calls, total_ms, mean_ms, rows, query in statements:
+                logger.info(f"Statement: {calls} calls, {total_ms:.0f} ms total, {mean_ms:.1f} ms mean, {rows} rows: "
+                            f"{' '.join(query.split())[:200]}")
+
+        results = check_endpoints(cur, chain_suffix, min_rows)
+        for endpoint, cost, problems, proposed in results:
+            if not problems:
+                logger.info(f"Endpoint {endpoint}: cost {cost:.0f}, ok")
+            elif proposed is not None:
+                table_name = f"{CANDIDATE_INDEXES[proposed][0]}_{chain_suffix}"
+                logger.info(f"Endpoint {endpoint}: cost {cost:.0f}, {'; '.join(problems)}. Proposed: CREATE INDEX "
+                            f"{candidate_index_name(table_name, proposed)} ON {table_name} ({CANDIDATE_INDEXES[proposed][1]})")
+            else:
+                logger.info(f"Endpoint {endpoint}: cost {cost:.0f}, {'; '.join(problems)}")
+
+        usage = index_usage(cur, chain_suffix)
+        for index, table, scans, size, unique, *_ in usage:
+            if scans == 0 and not unique:
+                logger.info(f"Unused index: {index} on {table} ({size / 1024 / 1024:.1f} MB, no scans since the "
+                            f"statistics were reset). Consider DROP INDEX CONCURRENTLY {index}")
+        for index, covering in redundant_indexes(usage):
+            logger.info(f"Redundant index: {index} is covered by {covering}. Consider DROP INDEX CONCURRENTLY {index}")
+
+        if not apply:
+            return results
+
+        proposed = sorted({candidate for *_, candidate in results if candidate is not None})
+        for candidate in proposed:
+            table_name = f"{CANDIDATE_INDEXES[candidate][0]}_{chain_suffix}"
+            started = time.time()
+            create_candidate_index(cur, table_name, candidate)
+            logger.info(f"Created {candidate_index_name(table_name, candidate)} in {time.time() - started:.1f} seconds")
+        if proposed:
+            before = {endpoint: cost for endpoint, cost, *_ in results}
+            results = check_endpoints(cur, chain_suffix, min_rows)
+            for endpoint, cost, problems, _ in results:
+                if cost != before.get(endpoint):
+                    logger.info(f"Endpoint {endpoint}: cost {before.get(endpoint):.0f} -> {cost:.0f}")
+        return results
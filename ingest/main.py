@@ -2,10 +2,14 @@ import argparse
 import os
 import json
 import time
-import requests
+import httpx
 import traceback
+import logging
 import subprocess
 from write_block import writeBlock
+from backfill import BackfillEngine
+from sidecar_client import get_client
+from connection_pool import get_pool
 from database_utils import *
 
 def parse_arguments():
@@ -28,11 +32,20 @@ def parse_arguments():
     parser.add_argument("--db_user", required=False, help="Database user")
     parser.add_argument("--db_password", required=False, help="Database password")
     parser.add_argument("--db_name", required=False, help="Database name")
+    parser.add_argument("--workers", required=False, type=int, default=8, help="Number of concurrent fetch workers for historical ingestion")
+    parser.add_argument("--write_mode", required=False, choices=["row", "batch", "copy"], default="batch", help="Insert rows one at a time, with multi-row statements per block, or with COPY for historical ranges")
+    parser.add_argument("--group_commit_blocks", required=False, type=int, default=1, help="Maximum number of blocks committed per transaction in historical ingestion (1 disables group commit)")
+    parser.add_argument("--group_commit_ms", required=False, type=int, default=1000, help="Maximum time a block waits for its group commit, in milliseconds")
+    parser.add_argument("--partition_size", required=False, type=int, default=0, help="Blocks per partition of the PostgreSQL extrinsics and events tables (0 disables partitioning)")
+    parser.add_argument("--binary_ids", action="store_true", help="Store hashes and SS58 addresses as bytes in new PostgreSQL tables, and follow tables converted with migrate_schema.py --binary_ids")
+    parser.add_argument("--bulk_load", action="store_true", help="Defer secondary indexes and database maintenance until a historical range is ingested (PostgreSQL only)")
+    parser.add_argument("--fetch_batch_size", required=False, type=int, default=50, help="Number of blocks fetched per sidecar range request")
     return parser.parse_args()
 
 
 def main():
     args = parse_arguments()
+    logging.basicConfig(level=logging.INFO)
     
     database_info = {
         'database': args.database,
@@ -46,40 +59,49 @@ def main():
         'database_port': args.db_port,
         'database_user': args.db_user,
         'database_password': args.db_password,
-        'database_name': args.db_name
+        'database_name': args.db_name,
+        'write_mode': args.write_mode,
+        'partition_size': args.partition_size,
+        'binary_ids': args.binary_ids
     }
 
-    # Connect to the database
-    db_connection = connect_to_database(database_info)
-    create_tables(db_connection, database_info, args.chain, args.relay_chain)
-    close_connection(db_connection, database_info)
+    # Connect to the database. The pool keeps connections open for reuse
+    # across blocks, ingest stages and the live loop.
+    db_pool = get_pool(database_info)
+    with db_pool.connection() as db_connection:
+        create_tables(db_connection, database_info, args.chain, args.relay_chain)
     print(f"Connected to {args.database} and created tables for {args.chain} on {args.relay_chain}")
 
     sidecar_url = "http://172.18.0.1:8080"
+    # Shared keep-alive client for every sidecar request made by this process
+    get_client(sidecar_url, max_in_flight=max(args.workers, 4))
 
     last_block = -1 if args.ingest_mode == "live" else args.start_block - 1
 
     if args.ingest_mode == "historical":
         try:
-            # Process blocks from start_block to end_block
-            for block_id in range(args.start_block, args.end_block + 1):
-                # Prepare the request for writing a block
-                block_write_request = {
-                    "chainName": args.chain,
-                    "relayChain": args.relay_chain,
-                    "blockId": block_id,
-                    "endpoint": sidecar_url,
-                    "bucket": "test-polka-data"
-                }
-                # Attempt to write the block, retry if unsuccessful
-                write_status = writeBlock(block_write_request, database_info)
-                while not write_status:
-                    write_status = writeBlock(block_write_request, database_info)
-                print(f"Processed block {block_id}")
+            # Fetch blocks in parallel and commit them in order, resuming
+            # after the last block committed by a previous run of this range
+            engine = BackfillEngine(
+                database_info,
+                args.chain,
+                args.relay_chain,
+                sidecar_url,
+                args.start_block,
+                args.end_block,
+                workers=args.workers,
+                fetch_batch_size=args.fetch_batch_size,
+                group_commit_blocks=args.group_commit_blocks,
+                group_commit_ms=args.group_commit_ms,
+                bulk_load=args.bulk_load
+            )
+            engine.run()
         except Exception as e:
-            # Handle any exceptions that occur during processing
-            print(f"An error occurred: {e}. Retrying in 6 seconds.")
+            # The engine retries the errors that can succeed, anything raised stops the range
+            print(f"An error occurred: {e}. Stopping the ingest.")
             print(traceback.format_exc())
+        finally:
+            db_pool.close()
     else:
         # For live ingest_mode, the original logic remains unchanged
         while True:
@@ -94,6 +116,9 @@ def main():
                     # First run, start from the block before the current head
                     last_block = chain_head - 1
                 elif chain_head is not None:
+                    # Create the partitions for the new blocks, and the next one, ahead of the writes
+                    with db_pool.connection() as db_connection:
+                        ensure_partitions(db_connection, database_info, args.chain, args.relay_chain, last_block + 1, chain_head)
                     # Process new blocks
                     for block_id in range(last_block + 1, chain_head + 1):
                         # Prepare the request for writing a block
@@ -104,10 +129,9 @@ def main():
                             "endpoint": sidecar_url,
                             "bucket": "test-polka-data"
                         }
-                        # Attempt to write the block, retry if unsuccessful
-                        write_status = writeBlock(block_write_request, database_info)
-                        while not write_status:
-                            write_status = writeBlock(block_write_request, database_info)
+                        # Each block is written in a single transaction. If it fails, the
+                        # loop resumes after the last block committed to the database.
+                        writeBlock(block_write_request, database_info)
                         print(f"Processed block {block_id}")
                     # Update last processed block
                     last_block = chain_head
@@ -116,9 +140,8 @@ def main():
                     print("Failed to fetch chain head. Retrying in 6 seconds.")
                 
                 # Fetch the latest block number from the database
-                db_connection = connect_to_database(database_info)
-                df = query_last_block(db_connection, database_info, args.chain, args.relay_chain)
-                close_connection(db_connection, database_info)
+                with db_pool.connection() as db_connection:
+                    df = query_last_block(db_connection, database_info, args.chain, args.relay_chain)
 
                 last_block = int(df['number'].iloc[0])
             except Exception as e:
@@ -134,11 +157,8 @@ def main():
 
 def fetch_chain_head(sidecar_url):
     try:
-        response = requests.get(f"{sidecar_url}/blocks/head")
-        response.raise_for_status()
-        head_data = response.json()
-        return int(head_data['number'])
-    except requests.RequestException as e:
+        return get_client(sidecar_url).get_chain_head()
+    except httpx.HTTPError as e:
         print(f"Error fetching chain head: {e}")
         return None
     
@@ -0,0 +1,567 @@
+import argparse
+import logging
+import time
+from database_utils import connect_to_database, close_connection
+from postgres_utils import (NATURAL_KEYS, PARTITIONED_TABLES, create_table_statement, create_natural_keys, upsert_clause,
+                            is_partitioned, create_partitions, create_event_counters, create_sort_keys,
+                            create_pallet_methods, BINARY_ID_COLUMNS, uses_binary_ids, leaf_tables, SORT_KEYS,
+                            PALLET_METHOD_KEYS, has_column, create_pallet_method_names)
+from binary_ids import ADDRESS_COLUMNS, BASE58_ALPHABET
+
+logger = logging.getLogger('migrate-schema')
+
+TABLES = ['blocks', 'extrinsics', 'events', 'logs']
+
+# Columns stored as VARCHAR by earlier versions and their typed replacements
+TYPED_COLUMNS = {
+    'number': 'BIGINT',
+    'index': 'INT',
+    'tip': 'NUMERIC',
+    'nonce': 'BIGINT'
+}
+
+# Converts a text hash or address to the bytes binary_ids.encode_id stores it as,
+# and must stay in sync with it.
+# The SS58 checksum is not verified, as the ingest verified it when it wrote the address.
+BINARY_ID_FUNCTION = f"""
+    CREATE OR REPLACE FUNCTION dotlake_binary_id(value text, address boolean) RETURNS bytea
+    LANGUAGE plpgsql IMMUTABLE STRICT AS $$
+    DECLARE
+        number numeric := 0;
+        digit int;
+        payload bytea := '';
+    BEGIN
+        IF value LIKE '0x%' OR NOT address THEN
+            RETURN decode(substr(value, 3), 'hex');
+        END IF;
+        FOR i IN 1..length(value) LOOP
+            digit := strpos('{BASE58_ALPHABET}', substr(value, i, 1)) - 1;
+            IF digit < 0 THEN
+                RAISE EXCEPTION 'Not an SS58 address: %', value;
+            END IF;
+            number := number * 58 + digit;
+        END LOOP;
+        WHILE number > 0 LOOP
+            payload := set_byte('\\x00'::bytea, 0, mod(number, 256)::int) || payload;
+            number := div(number, 256);
+        END LOOP;
+        payload := decode(repeat('00', length(value) - length(ltrim(value, '1'))), 'hex') || payload;
+        -- Without the two checksum bytes
+        RETURN substr(payload, 1, length(payload) - 2);
+    END
+    $$
+"""
+
+SHADOW_SUFFIX = '__typed'
+LEGACY_SUFFIX = '__legacy'
+
+# Partitions created beyond the highest block when a table is partitioned, so
+# that blocks ingested while the migration runs always have a partition
+PARTITIONS_AHEAD = 2
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Convert VARCHAR chain tables to the typed schema without stopping the ingest")
+    parser.add_argument("--chain", required=True, help="Name of the chain")
+    parser.add_argument("--relay_chain", required=True, help="Name of the relay chain")
+    parser.add_argument("--db_host", required=True, help="Database host")
+    parser.add_argument("--db_port", required=True, help="Database port")
+    parser.add_argument("--db_user", required=True, help="Database user")
+    parser.add_argument("--db_password", default="", help="Database password")
+    parser.add_argument("--db_name", required=True, help="Database name")
+    parser.add_argument("--tables", nargs="+", choices=TABLES, default=TABLES, help="Tables to migrate")
+    parser.add_argument("--batch_pages", type=int, default=1000, help="Heap pages copied per batch")
+    parser.add_argument("--lock_timeout", default="5s", help="How long the final swap waits for its table lock before retrying")
+    parser.add_argument("--partition_size", type=int, default=0, help="Also range-partition the extrinsics and events tables with this many blocks per partition")
+    parser.add_argument("--binary_ids", action="store_true", help="Also store hashes and SS58 addresses as bytes")
+    parser.add_argument("--drop_pallet_method_names", action="store_true", help="Drop the pallet and method name columns of the extrinsics and events tables once the API reads the ids")
+    parser.add_argument("--keep_legacy", action="store_true", help=f"Keep the old table as <table>{LEGACY_SUFFIX} instead of dropping it")
+    return parser.parse_args()
+
+
+def is_typed(cursor, table_name):
+    cursor.execute("""
+        SELECT data_type FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s AND column_name = 'number'
+    """, (table_name,))
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'bigint'
+
+
+def table_columns(cursor, table_name):
+    cursor.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s AND is_generated = 'NEVER'
+        ORDER BY ordinal_position
+    """, (table_name,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def text_columns(cursor, table_name):
+    cursor.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s AND data_type IN ('character varying', 'text')
+    """, (table_name,))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def converted(column, legacy_text_columns, record=None, binary_id_columns=()):
+    source = f"{record}.{column}" if record else column
+    if column in TYPED_COLUMNS and column in legacy_text_columns:
+        return f"NULLIF(TRIM({source}), '')::{TYPED_COLUMNS[column]}"
+    if column in binary_id_columns and column in legacy_text_columns:
+        return f"dotlake_binary_id({source}, {column in ADDRESS_COLUMNS})"
+    return source
+
+
+def table_indexes(cursor, table_name):
+    cursor.execute("SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s",
+                   (table_name,))
+    return cursor.fetchall()
+
+
+def page_batches(cursor, table_name, batch_pages):
+    """
+    Split the rows of a table into batches of heap pages.
+
+    Yields:
+        tuple: The table holding the rows, which is a partition for a partitioned
+            table, and the first and the end tid of the batch.
+    """
+    for leaf in leaf_tables(cursor, [table_name]):
+        cursor.execute("SELECT pg_relation_size(%s) / current_setting('block_size')::int", (leaf,))
+        page_count = cursor.fetchone()[0]
+        for first_page in range(0, page_count + 1, batch_pages):
+            yield leaf, f"({first_page},0)", f"({first_page + batch_pages},0)"
+
+
+def is_valid_index(cursor, index_name):
+    cursor.execute("SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(%s) AND indisvalid", (index_name,))
+    return cursor.fetchone() is not None
+
+
+def drop_invalid_index(cursor, index_name):
+    # Left by an interrupted concurrent build, and not replaced by IF NOT EXISTS
+    cursor.execute("SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(%s) AND NOT indisvalid", (index_name,))
+    if cursor.fetchone():
+        cursor.execute(f"DROP INDEX {index_name}")
+
+
+def create_index_concurrently(cursor, index_name, table_name, columns, unique=False):
+    """
+    Build an index without blocking writes. The cursor's connection must be in
+    autocommit mode.
+
+    Partitioned indexes cannot be built concurrently. The parent index is
+    created empty and each partition's index is built concurrently and attached.
+    """
+    index = "UNIQUE INDEX" if unique else "INDEX"
+    drop_invalid_index(cursor, index_name)
+    if not is_partitioned(cursor, table_name):
+        cursor.execute(f"CREATE {index} CONCURRENTLY IF NOT EXISTS {index_name} ON {table_name} ({columns})")
+        return
+    cursor.execute(f"CREATE {index} IF NOT EXISTS {index_name} ON ONLY {table_name} ({columns})")
+    for partition in table_partitions(cursor, table_name):
+        partition_index = f"{partition}_{index_name[len(table_name) + 1:]}"
+        drop_invalid_index(cursor, partition_index)
+        cursor.execute(f"CREATE {index} CONCURRENTLY IF NOT EXISTS {partition_index} ON {partition} ({columns})")
+        cursor.execute("SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(%s)", (partition_index,))
+        if cursor.fetchone() is None:
+            cursor.execute(f"ALTER INDEX {index_name} ATTACH PARTITION {partition_index}")
+
+
+def build_natural_keys(connection, chain, relay_chain, tables, batch_pages):
+    """
+    Build the natural keys of tables created before the keys existed.
+
+    Duplicate rows from retried writes are removed in batches of heap pages,
+    keeping the oldest copy, and logs are numbered in insertion order within
+    their block. A temporary index on the block number serves the lookups.
+    The key is then built concurrently. The ingest cannot write to a table
+    without its key, so no duplicates are added in the meantime.
+    """
+    cursor = connection.cursor()
+    for table in tables:
+        if table not in NATURAL_KEYS:
+            continue
+        table_name = f"{table}_{relay_chain}_{chain}"
+        index_name = f"{table_name}_natural_key"
+        if is_valid_index(cursor, index_name):
+            continue
+
+        started = time.time()
+        lookup_index = f"{table_name}_dedupe"
+        create_index_concurrently(cursor, lookup_index, table_name, 'number')
+        removed = 0
+        if table == 'logs':
+            # Copies of a log that was written twice only differ in their position
+            for leaf, first_tid, end_tid in page_batches(cursor, table_name, batch_pages):
+                cursor.execute(f"""
+                    DELETE FROM {leaf} a
+                    WHERE a.ctid >= %s::tid AND a.ctid < %s::tid AND a.log_id IS NULL AND EXISTS (
+                        SELECT 1 FROM {leaf} b
+                        WHERE b.number = a.number AND b.log_id IS NULL AND b.ctid < a.ctid
+                        AND b.type IS NOT DISTINCT FROM a.type AND b.index IS NOT DISTINCT FROM a.index
+                        AND b.value IS NOT DISTINCT FROM a.value
+                    )
+                """, (first_tid, end_tid))
+                removed += cursor.rowcount
+            # All logs of a block are numbered by the batch that reaches the first of them
+            for leaf, first_tid, end_tid in page_batches(cursor, table_name, batch_pages):
+                cursor.execute(f"""
+                    UPDATE {leaf} SET log_id = numbered.number || '-' || numbered.position
+                    FROM (
+                        SELECT ctid, number, row_number() OVER (PARTITION BY number ORDER BY ctid) - 1 AS position
+                        FROM {leaf}
+                        WHERE log_id IS NULL AND number IN (
+                            SELECT number FROM {leaf} WHERE ctid >= %s::tid AND ctid < %s::tid AND log_id IS NULL
+                        )
+                    ) numbered
+                    WHERE {leaf}.ctid = numbered.ctid
+                """, (first_tid, end_tid))
+
+        key_match = ' AND '.join(f"b.{column} = a.{column}" for column in NATURAL_KEYS[table])
+        for leaf, first_tid, end_tid in page_batches(cursor, table_name, batch_pages):
+            cursor.execute(f"""
+                DELETE FROM {leaf} a
+                WHERE a.ctid >= %s::tid AND a.ctid < %s::tid AND EXISTS (
+                    SELECT 1 FROM {leaf} b WHERE {key_match} AND b.ctid < a.ctid
+                )
+            """, (first_tid, end_tid))
+            removed += cursor.rowcount
+
+        create_index_concurrently(cursor, index_name, table_name, ', '.join(NATURAL_KEYS[table]), unique=True)
+        partitioned = is_partitioned(cursor, table_name)
+        cursor.execute(f"DROP INDEX {'' if partitioned else 'CONCURRENTLY '}IF EXISTS {lookup_index}")
+        logger.info(f"Built the natural key of {table_name}, removing {removed} duplicate rows, "
+                    f"in {time.time() - started:.1f} seconds")
+
+
+def fill_sort_keys(connection, chain, relay_chain, tables, batch_pages):
+    """
+    Fill in the sort keys of rows written before the keys existed, from the
+    row ids, in batches of heap pages, and build the indexes listings are
+    read in order from.
+    """
+    cursor = connection.cursor()
+    for table, (column, id_column, index_columns) in SORT_KEYS.items():
+        if table not in tables:
+            continue
+        table_name = f"{table}_{relay_chain}_{chain}"
+        # The index is only built once every row has its key
+        if is_valid_index(cursor, f"{table_name}_block_order"):
+            continue
+        started = time.time()
+        filled = 0
+        for leaf, first_tid, end_tid in page_batches(cursor, table_name, batch_pages):
+            cursor.execute(f"""
+                UPDATE {leaf} SET {column} = split_part({id_column}, '-', 2)::int
+                WHERE ctid >= %s::tid AND ctid < %s::tid AND {column} IS NULL AND {id_column} IS NOT NULL
+            """, (first_tid, end_tid))
+            filled += cursor.rowcount
+        create_index_concurrently(cursor, f"{table_name}_block_order", table_name, index_columns)
+        if filled:
+            logger.info(f"Filled in {column} of {filled} rows of {table_name} in {time.time() - started:.1f} seconds")
+
+
+def fill_pallet_method_ids(connection, chain, relay_chain, tables, batch_pages):
+    """
+    Refer the rows of tables that still store pallet and method names to
+    their pair by id, in batches of heap pages, and build the indexes the
+    pallet and method filters use.
+
+    Events counted by name are then recounted by id. The names are kept for
+    other readers until drop_pallet_method_names.
+    """
+    cursor = connection.cursor()
+    pallet_methods_table = f"pallet_methods_{relay_chain}_{chain}"
+    for table, index_columns in PALLET_METHOD_KEYS.items():
+        if table not in tables:
+            continue
+        table_name = f"{table}_{relay_chain}_{chain}"
+        if has_column(cursor, table_name, 'pallet'):
+            started = time.time()
+            filled = 0
+            for leaf, first_tid, end_tid in page_batches(cursor, table_name, batch_pages):
+                # Pairs are inserted in sorted order, so the ingest interning them concurrently cannot deadlock
+                cursor.execute(f"""
+                    INSERT INTO {pallet_methods_table} (pallet, method)
+                    SELECT DISTINCT pallet, method FROM {leaf}
+                    WHERE ctid >= %s::tid AND ctid < %s::tid AND pallet_method_id IS NULL
+                    AND pallet IS NOT NULL AND method IS NOT NULL
+                    ORDER BY pallet, method
+                    ON CONFLICT (pallet, method) DO NOTHING
+                """, (first_tid, end_tid))
+                cursor.execute(f"""
+                    UPDATE {leaf} SET pallet_method_id = pallet_methods.id
+                    FROM {pallet_methods_table} pallet_methods
+                    WHERE {leaf}.ctid >= %s::tid AND {leaf}.ctid < %s::tid AND {leaf}.pallet_method_id IS NULL
+                    AND {leaf}.pallet = pallet_methods.pallet AND {leaf}.method = pallet_methods.method
+                """, (first_tid, end_tid))
+                filled += cursor.rowcount
+            logger.info(f"Filled in the pallet_method_id of {filled} rows of {table_name} in {time.time() - started:.1f} seconds")
+        if table == 'events':
+            recount_events(cursor, chain, relay_chain)
+        if not is_valid_index(cursor, f"{table_name}_pallet_method"):
+            create_index_concurrently(cursor, f"{table_name}_pallet_method", table_name, index_columns)
+
+
+def recount_events(cursor, chain, relay_chain):
+    """
+    Replace event counts kept by pallet and method name with counts by id.
+    """
+    events_table = f"events_{relay_chain}_{chain}"
+    counts_table = f"event_counts_{relay_chain}_{chain}"
+    if not has_column(cursor, counts_table, 'pallet'):
+        return
+    cursor.execute("BEGIN")
+    for operation in ('insert', 'update', 'delete'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {events_table}_count_{operation} ON {events_table}")
+    cursor.execute(f"DROP TABLE {counts_table}, event_count_deltas_{relay_chain}_{chain}")
+    create_event_counters(cursor, chain, relay_chain)
+    cursor.execute("COMMIT")
+
+
+def drop_pallet_method_names(connection, chain, relay_chain, tables, lock_timeout):
+    """
+    Drop the pallet and method name columns of the extrinsics and events
+    tables once all their rows have a pallet_method_id. Other readers of the
+    names break, so this only runs when requested.
+    """
+    cursor = connection.cursor()
+    for table in PALLET_METHOD_KEYS:
+        table_name = f"{table}_{relay_chain}_{chain}"
+        if table not in tables or not has_column(cursor, table_name, 'pallet'):
+            continue
+        cursor.execute(f"SELECT 1 FROM {table_name} WHERE pallet_method_id IS NULL AND pallet IS NOT NULL LIMIT 1")
+        if cursor.fetchone():
+            logger.error(f"Kept the pallet and method names of {table_name}, as some of its rows have no pallet_method_id")
+            continue
+
+        def drop_names(locked_cursor):
+            locked_cursor.execute(f"DROP TRIGGER IF EXISTS pallet_method_names ON {table_name}")
+            locked_cursor.execute(f"ALTER TABLE {table_name} DROP COLUMN pallet, DROP COLUMN method")
+
+        with_lock_timeout(connection, lock_timeout, f"Dropping the pallet and method names of {table_name}", drop_names)
+        logger.info(f"Dropped the pallet and method names of {table_name}")
+    if not any(has_column(cursor, f"{table}_{relay_chain}_{chain}", 'pallet') for table in PALLET_METHOD_KEYS):
+        cursor.execute(f"DROP FUNCTION IF EXISTS pallet_methods_{relay_chain}_{chain}_names()")
+
+
+def migrate_table(connection, table, table_name, batch_pages, lock_timeout, keep_legacy, partition_size=0,
+                  binary_ids=False):
+    """
+    Convert one table to the typed schema while it keeps receiving writes.
+
+    A typed shadow table is created next to the old one and a trigger copies
+    every new write into it. Existing rows are then copied in batches of heap
+    pages, each in its own short transaction, and the secondary indexes are
+    rebuilt concurrently. Finally the two tables swap names in one brief
+    transaction. Re-running the migration after an interruption continues
+    with the existing shadow table.
+
+    With a partition_size, extrinsics and events tables are migrated into a
+    range-partitioned shadow table, which also partitions typed tables. With
+    binary_ids, the hashes and addresses of the shadow table are stored as
+    bytes. Tables that already store them as bytes keep doing so.
+    """
+    cursor = connection.cursor()
+    partition_size = partition_size if table in PARTITIONED_TABLES else 0
+    already_binary = uses_binary_ids(cursor, table_name)
+    if (is_typed(cursor, table_name) and (not partition_size or is_partitioned(cursor, table_name))
+            and (not binary_ids or already_binary)):
+        logger.info(f"{table_name} already uses the typed schema")
+        return
+    binary_ids = binary_ids or already_binary
+    binary_id_columns = BINARY_ID_COLUMNS[table] if binary_ids else {}
+
+    started = time.time()
+    shadow = f"{table_name}{SHADOW_SUFFIX}"
+    key_columns = ('number',) if table == 'blocks' else NATURAL_KEYS[table]
+    legacy_text_columns = text_columns(cursor, table_name)
+    cursor.execute(create_table_statement(table, shadow, partition_size, binary_ids))
+    if table in PALLET_METHOD_KEYS and has_column(cursor, table_name, 'pallet'):
+        # The names are kept until drop_pallet_method_names
+        cursor.execute(f"ALTER TABLE {shadow} ADD COLUMN IF NOT EXISTS pallet VARCHAR(255), "
+                       f"ADD COLUMN IF NOT EXISTS method VARCHAR(255)")
+        create_pallet_method_names(cursor, shadow, table_name.replace(table, 'pallet_methods', 1))
+    shadow_columns = set(table_columns(cursor, shadow))
+    columns = [column for column in table_columns(cursor, table_name) if column in shadow_columns]
+
+    if partition_size:
+        number = converted('number', legacy_text_columns)
+        cursor.execute(f"SELECT min({number}), max({number}) FROM {table_name}")
+        first_block, last_block = cursor.fetchone()
+        create_partitions(connection, shadow, first_block or 0, (last_block or 0) + PARTITIONS_AHEAD * partition_size,
+                          partition_size)
+
+    # Unique key of the shadow table, needed by the trigger's upserts
+    if table == 'blocks':
+        cursor.execute(f"ALTER INDEX IF EXISTS {shadow}_pkey RENAME TO {table_name}_pkey{SHADOW_SUFFIX}")
+    else:
+        cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {table_name}_natural_key{SHADOW_SUFFIX} "
+                       f"ON {shadow} ({', '.join(key_columns)})")
+
+    old_key_match = ' AND '.join(f"{column} = {converted(column, legacy_text_columns, 'OLD')}" for column in key_columns)
+    new_values = ', '.join(converted(column, legacy_text_columns, 'NEW', binary_id_columns) for column in columns)
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION {shadow}_sync() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM {shadow} WHERE {old_key_match};
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO {shadow} AS target ({', '.join(columns)})
+                VALUES ({new_values})
+                {upsert_clause(key_columns, columns)};
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    cursor.execute(f"DROP TRIGGER IF EXISTS {shadow}_sync ON {table_name}")
+    cursor.execute(f"CREATE TRIGGER {shadow}_sync AFTER INSERT OR UPDATE OR DELETE ON {table_name} "
+                   f"FOR EACH ROW EXECUTE FUNCTION {shadow}_sync()")
+
+    # Rows written from here on reach the shadow table through the trigger and
+    # land in pages past the current end of the heap
+    copied = 0
+    for batch, (leaf, first_tid, end_tid) in enumerate(page_batches(cursor, table_name, batch_pages)):
+        cursor.execute(f"""
+            INSERT INTO {shadow} ({', '.join(columns)})
+            SELECT {', '.join(converted(column, legacy_text_columns, binary_id_columns=binary_id_columns) for column in columns)}
+            FROM {leaf}
+            WHERE ctid >= %s::tid AND ctid < %s::tid
+            ON CONFLICT ({', '.join(key_columns)}) DO NOTHING
+        """, (first_tid, end_tid))
+        copied += cursor.rowcount
+        if batch % 50 == 0:
+            logger.info(f"{table_name}: copied {copied} rows (up to page {end_tid} of {leaf})")
+
+    # Rebuild the remaining indexes of the old table on the shadow table
+    shadow_indexes = {name for name, _ in table_indexes(cursor, shadow)}
+    for name, definition in table_indexes(cursor, table_name):
+        shadow_name = f"{name}{SHADOW_SUFFIX}"
+        if name in (f"{table_name}_pkey", f"{table_name}_natural_key") or shadow_name in shadow_indexes:
+            continue
+        try:
+            if partition_size:
+                # Partitioned indexes cannot be built concurrently. The parent index is
+                # created empty and each partition's index is built concurrently and attached.
+                cursor.execute(definition.replace(f" INDEX {name} ON ", f" INDEX {shadow_name} ON ONLY ", 1)
+                                         .replace(f".{table_name} ", f".{shadow} ", 1))
+                for partition in table_partitions(cursor, shadow):
+                    partition_index = f"{partition}_{name}"
+                    cursor.execute(definition.replace(f" INDEX {name} ON ", f" INDEX CONCURRENTLY IF NOT EXISTS {partition_index} ON ", 1)
+                                             .replace(f".{table_name} ", f".{partition} ", 1))
+                    cursor.execute(f"ALTER INDEX {shadow_name} ATTACH PARTITION {partition_index}")
+            else:
+                cursor.execute(definition.replace(f" INDEX {name} ON ", f" INDEX CONCURRENTLY {shadow_name} ON ", 1)
+                                         .replace(f".{table_name} ", f".{shadow} ", 1))
+        except Exception as e:
+            # Expression indexes written for VARCHAR columns may not apply to the typed columns
+            logger.warning(f"Skipped index {name} on {shadow}: {e}")
+            cursor.execute(f"DROP INDEX IF EXISTS {shadow_name}")
+
+    swap_tables(connection, table_name, shadow, lock_timeout, keep_legacy)
+    logger.info(f"Migrated {table_name} ({copied} rows) in {time.time() - started:.1f} seconds")
+
+
+def table_partitions(cursor, table_name):
+    cursor.execute("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = %s::regclass ORDER BY 1",
+                   (table_name,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def with_lock_timeout(connection, lock_timeout, description, apply):
+    """
+    Run apply(cursor) in one short transaction.
+
+    Its locks are only needed for a moment. If one is not granted within
+    lock_timeout the attempt is abandoned, so queued readers and writers are
+    not blocked behind it, and is retried.
+    """
+    cursor = connection.cursor()
+    while True:
+        try:
+            cursor.execute("BEGIN")
+            cursor.execute(f"SET LOCAL lock_timeout = '{lock_timeout}'")
+            apply(cursor)
+            cursor.execute("COMMIT")
+            return
+        except Exception as e:
+            cursor.execute("ROLLBACK")
+            logger.warning(f"{description} failed: {e}. Retrying in 5 seconds.")
+            time.sleep(5)
+
+
+def swap_tables(connection, table_name, shadow, lock_timeout, keep_legacy):
+    """
+    Replace the old table with the shadow table in one short transaction.
+    """
+    legacy = f"{table_name}{LEGACY_SUFFIX}"
+
+    def swap(cursor):
+        cursor.execute(f"LOCK TABLE {table_name}, {shadow} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"DROP TRIGGER {shadow}_sync ON {table_name}")
+        for name, _ in table_indexes(cursor, table_name):
+            cursor.execute(f"ALTER INDEX {name} RENAME TO {name}{LEGACY_SUFFIX}")
+        for name, _ in table_indexes(cursor, shadow):
+            if name.endswith(SHADOW_SUFFIX):
+                cursor.execute(f"ALTER INDEX {name} RENAME TO {name[:-len(SHADOW_SUFFIX)]}")
+        cursor.execute(f"ALTER TABLE {table_name} RENAME TO {legacy}")
+        cursor.execute(f"ALTER TABLE {shadow} RENAME TO {table_name}")
+        for partition in table_partitions(cursor, table_name):
+            cursor.execute(f"ALTER TABLE {partition} RENAME TO {partition.replace(shadow, table_name, 1)}")
+
+    with_lock_timeout(connection, lock_timeout, f"Swapping {table_name}", swap)
+    cursor = connection.cursor()
+    cursor.execute(f"DROP FUNCTION IF EXISTS {shadow}_sync()")
+    if not keep_legacy:
+        cursor.execute(f"DROP TABLE {legacy}")
+
+
+def main():
+    args = parse_arguments()
+    logging.basicConfig(level=logging.INFO)
+    database_info = {
+        'database': 'postgres',
+        'database_host': args.db_host,
+        'database_port': args.db_port,
+        'database_user': args.db_user,
+        'database_password': args.db_password,
+        'database_name': args.db_name
+    }
+    db_connection = connect_to_database(database_info)
+
+    # The sort keys and pallet and method ids are copied over with the other columns
+    cursor = db_connection.cursor()
+    create_natural_keys(cursor, args.chain, args.relay_chain)
+    create_sort_keys(cursor, args.chain, args.relay_chain)
+    create_pallet_methods(cursor, args.chain, args.relay_chain)
+    if args.binary_ids:
+        cursor.execute(BINARY_ID_FUNCTION)
+    db_connection.commit()
+
+    # Every batch commits on its own, and CREATE INDEX CONCURRENTLY needs autocommit
+    db_connection.autocommit = True
+    # Logs are numbered before they are copied, as the shadow tables are upserted on the natural keys
+    build_natural_keys(db_connection, args.chain, args.relay_chain, args.tables, args.batch_pages)
+    fill_sort_keys(db_connection, args.chain, args.relay_chain, args.tables, args.batch_pages)
+    fill_pallet_method_ids(db_connection, args.chain, args.relay_chain, args.tables, args.batch_pages)
+    for table in args.tables:
+        migrate_table(db_connection, table, f"{table}_{args.relay_chain}_{args.chain}", args.batch_pages,
+                      args.lock_timeout, args.keep_legacy, args.partition_size, args.binary_ids)
+
+    if args.drop_pallet_method_names:
+        drop_pallet_method_names(db_connection, args.chain, args.relay_chain, args.tables, args.lock_timeout)
+
+    # The event count triggers stayed on the replaced events table
+    db_connection.autocommit = False
+    create_event_counters(db_connection.cursor(), args.chain, args.relay_chain)
+    db_connection.commit()
+    close_connection(db_connection, database_info)
+
+
+if __name__ == "__main__":
+    main()
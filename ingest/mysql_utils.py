@@ -165,6 +165,25 @@ def delete_table(connection, table_name):
             cursor.close()
 
 
+def check_connection(connection):
+    """
+    Check that a MySQL connection is open and answering queries.
+
+    Args:
+        connection (mysql.connector.connection.MySQLConnection): The database connection object.
+
+    Returns:
+        bool: True if the connection is usable, False otherwise.
+    """
+    if connection is None:
+        return False
+    try:
+        connection.ping(reconnect=False)
+        return True
+    except Error:
+        return False
+
+
 def close_connection(connection):
     """
     Safely close the MySQL database connection.
@@ -1,10 +1,13 @@
 import psycopg2
-from psycopg2 import Error
+from psycopg2 import Error, errors
+from psycopg2.extras import execute_values
 import pandas as pd
 import json
 import os
+import re
 import subprocess
 import logging
+from binary_ids import encode_id, decode_id
 
 def connect_to_postgres(host, port, database, user, password):
     """
@@ -34,14 +37,131 @@ def connect_to_postgres(host, port, database, user, password):
         print(f"Error connecting to PostgreSQL database: {e}")
         return None
 
-def create_tables(connection, chain, relay_chain):
+# Column definitions of the typed schema. Block numbers and indexes are
+# integers so that sorts and range scans follow numeric order and can use
+# the primary key and natural key indexes. Extrinsics and events refer to
+# their pallet and method by the id of the pair in the pallet_methods table.
+TABLE_COLUMNS = {
+    'blocks': """
+        relay_chain VARCHAR(255),
+        chain VARCHAR(255),
+        timestamp BIGINT,
+        number BIGINT PRIMARY KEY,
+        hash VARCHAR(255),
+        parenthash VARCHAR(255),
+        stateroot VARCHAR(255),
+        extrinsicsroot VARCHAR(255),
+        authorid VARCHAR(255),
+        finalized BOOLEAN,
+        extrinsics_count INT,
+        events_count INT,
+        logs_count INT,
+        block_time TIMESTAMPTZ GENERATED ALWAYS AS (to_timestamp(timestamp / 1000.0)) STORED
+    """,
+    'extrinsics': """
+        relay_chain VARCHAR(255),
+        chain VARCHAR(255),
+        timestamp BIGINT,
+        number BIGINT,
+        hash VARCHAR(255),
+        extrinsic_id VARCHAR(255),
+        extrinsic_index INT,
+        pallet_method_id INT,
+        args JSONB,
+        info JSONB,
+        extrinsic_hash VARCHAR(255),
+        tip NUMERIC,
+        nonce BIGINT,
+        signature VARCHAR(255),
+        era VARCHAR(255),
+        success BOOLEAN,
+        pays_fee BOOLEAN,
+        event_count INT
+    """,
+    'events': """
+        relay_chain VARCHAR(255),
+        chain VARCHAR(255),
+        timestamp BIGINT,
+        number BIGINT,
+        hash VARCHAR(255),
+        extrinsic_id VARCHAR(255),
+        event_id VARCHAR(255),
+        event_index INT,
+        pallet_method_id INT,
+        data JSONB,
+        source VARCHAR(255)
+    """,
+    'logs': """
+        relay_chain VARCHAR(255),
+        chain VARCHAR(255),
+        timestamp BIGINT,
+        number BIGINT,
+        hash VARCHAR(255),
+        type VARCHAR(255),
+        index INT,
+        value JSONB,
+        log_id VARCHAR(255)
+    """
+}
+
+# Tables that can be range-partitioned by block number
+PARTITIONED_TABLES = ('extrinsics', 'events')
+
+# Columns holding hashes and SS58 addresses, and the keys of their values in the
+# block rows. Tables created with binary ids store them as BYTEA instead of text,
+# converted with binary_ids.encode_id.
+BINARY_ID_COLUMNS = {
+    'blocks': {'hash': 'block_hash', 'parenthash': 'parent_hash', 'stateroot': 'state_root',
+               'extrinsicsroot': 'extrinsics_root', 'authorid': 'author'},
+    'extrinsics': {'hash': 'block_hash', 'extrinsic_hash': 'extrinsic_hash'},
+    'events': {'hash': 'block_hash'},
+    'logs': {'hash': 'block_hash'}
+}
+
+# Tables seen to store binary ids, as seen by this process
+_binary_id_tables = {}
+
+# Tables seen to be partitioned, and the lower bounds of the partitions
+# known to exist, as seen by this process
+_partitioned_tables = {}
+_created_partitions = {}
+
+def create_table_statement(table, table_name, partition_size=0, binary_ids=False):
+    """
+    Build the CREATE TABLE statement of one of the chain tables.
+
+    Args:
+        table (str): One of 'blocks', 'extrinsics', 'events' or 'logs'.
+        table_name (str): The name of the table to create.
+        partition_size (int): Blocks per partition. Extrinsics and events are
+            range-partitioned by block number when this is greater than 0.
+        binary_ids (bool): Store the BINARY_ID_COLUMNS as BYTEA.
+
+    Returns:
+        str: The CREATE TABLE IF NOT EXISTS statement.
+    """
+    columns = TABLE_COLUMNS[table]
+    if binary_ids:
+        for column in BINARY_ID_COLUMNS[table]:
+            columns = re.sub(rf"^(\s*{column}) VARCHAR\(255\)", r"\1 BYTEA", columns, flags=re.MULTILINE)
+    partitioning = " PARTITION BY RANGE (number)" if partition_size and table in PARTITIONED_TABLES else ""
+    return f"CREATE TABLE IF NOT EXISTS {table_name} ({columns}){partitioning}"
+
+def create_tables(connection, chain, relay_chain, partition_size=0, binary_ids=False):
     """
     Create necessary tables in the PostgreSQL database if they don't exist.
 
+    Tables created by earlier versions keep their VARCHAR columns until they
+    are converted with migrate_schema.py.
+
     Args:
         connection (psycopg2.extensions.connection): The database connection object.
         chain (str): The name of the chain.
         relay_chain (str): The name of the relay chain.
+        partition_size (int): Blocks per partition of the extrinsics and events
+            tables, or 0 for unpartitioned tables. Partitions are added with
+            ensure_partitions.
+        binary_ids (bool): Store hashes and addresses as bytes in new tables.
     """
     try:
         cursor = connection.cursor()
@@ -51,75 +171,31 @@ def create_tables(connection, chain, relay_chain):
         # delete_table(connection, f"events_{relay_chain}_{chain}")
         # delete_table(connection, f"logs_{relay_chain}_{chain}")
 
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS blocks_{relay_chain}_{chain} (
-                relay_chain VARCHAR(255),
-                chain VARCHAR(255),
-                timestamp BIGINT,
-                number VARCHAR(255) PRIMARY KEY,
-                hash VARCHAR(255),
-                parenthash VARCHAR(255),
-                stateroot VARCHAR(255),
-                extrinsicsroot VARCHAR(255),
-                authorid VARCHAR(255),
-                finalized BOOLEAN,
-                extrinsics_count INT,
-                events_count INT,
-                logs_count INT
-            )
-        """)
-
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS extrinsics_{relay_chain}_{chain} (
-                relay_chain VARCHAR(255),
-                chain VARCHAR(255),
-                timestamp BIGINT,
-                number VARCHAR(255),
-                hash VARCHAR(255),
-                extrinsic_id VARCHAR(255),
-                pallet VARCHAR(255),
-                method VARCHAR(255),
-                args JSONB,
-                info JSONB,
-                extrinsic_hash VARCHAR(255),
-                tip VARCHAR(255),
-                nonce VARCHAR(255),
-                signature VARCHAR(255),
-                era VARCHAR(255),
-                success BOOLEAN,
-                pays_fee BOOLEAN,
-                event_count INT
-            )
-        """)    
+        for table in TABLE_COLUMNS:
+            cursor.execute(create_table_statement(table, f"{table}_{relay_chain}_{chain}", partition_size, binary_ids))
+            if partition_size and table in PARTITIONED_TABLES and not is_partitioned(cursor, f"{table}_{relay_chain}_{chain}"):
+                print(f"{table}_{relay_chain}_{chain} already exists unpartitioned. "
+                      f"Use migrate_schema.py --partition_size to partition it.")
+            if binary_ids and not uses_binary_ids(cursor, f"{table}_{relay_chain}_{chain}"):
+                print(f"{table}_{relay_chain}_{chain} already exists with text ids. "
+                      f"Use migrate_schema.py --binary_ids to convert it.")
 
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS events_{relay_chain}_{chain} (
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ingest_checkpoints (
                 relay_chain VARCHAR(255),
                 chain VARCHAR(255),
-                timestamp BIGINT,
-                number VARCHAR(255),
-                hash VARCHAR(255),
-                extrinsic_id VARCHAR(255),
-                event_id VARCHAR(255),
-                pallet VARCHAR(255),
-                method VARCHAR(255),
-                data JSONB,
-                source VARCHAR(255)
+                start_block BIGINT,
+                end_block BIGINT,
+                high_water_mark BIGINT,
+                updated_at TIMESTAMPTZ DEFAULT now(),
+                PRIMARY KEY (relay_chain, chain, start_block, end_block)
             )
         """)
 
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS logs_{relay_chain}_{chain} (
-                relay_chain VARCHAR(255),   
-                chain VARCHAR(255),
-                timestamp BIGINT,
-                number VARCHAR(255),
-                hash VARCHAR(255),
-                type VARCHAR(255),
-                index VARCHAR(255), 
-                value JSONB
-            )
-        """)
+        create_natural_keys(cursor, chain, relay_chain)
+        create_sort_keys(cursor, chain, relay_chain)
+        create_pallet_methods(cursor, chain, relay_chain)
+        create_event_counters(cursor, chain, relay_chain)
         
         connection.commit()
         print("Tables created successfully")
@@ -182,23 +258,44 @@ def insert_block_data(connection, block_data, chain, relay_chain):
     except Error as e:
         print(f"Error inserting block data: {e}")
 
-def insert_basic_block_data(connection, basic_block_data, chain, relay_chain):
-    """
-    Insert basic block data into the PostgreSQL database.
+BLOCK_COLUMNS = ('relay_chain', 'chain', 'timestamp', 'number', 'hash', 'parenthash', 'stateroot', 'extrinsicsroot',
+                 'authorid', 'finalized', 'extrinsics_count', 'events_count', 'logs_count')
+EXTRINSIC_COLUMNS = ('relay_chain', 'chain', 'timestamp', 'number', 'hash', 'extrinsic_id', 'extrinsic_index',
+                     'pallet_method_id', 'args', 'info', 'extrinsic_hash', 'tip', 'nonce', 'signature', 'era', 'success',
+                     'pays_fee', 'event_count')
+EVENT_COLUMNS = ('relay_chain', 'chain', 'timestamp', 'number', 'hash', 'extrinsic_id', 'event_id', 'event_index',
+                 'pallet_method_id', 'data', 'source')
+LOG_COLUMNS = ('relay_chain', 'chain', 'timestamp', 'number', 'hash', 'type', 'index', 'value', 'log_id')
 
-    Args:
-        connection (psycopg2.extensions.connection): The database connection object.
-        basic_block_data (dict): The basic block data to be inserted.
-        chain (str): The name of the chain.
-        relay_chain (str): The name of the relay chain.
-    """
-    try:
-        cursor = connection.cursor()
-        
-        insert_query = f"""
-        INSERT INTO blocks_{relay_chain}_{chain} 
-        (relay_chain, chain, timestamp, number, hash, parenthash, stateroot, extrinsicsroot, authorid, finalized, extrinsics_count, events_count, logs_count)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+# Unique key of each child table. Rows are numbered by their position in the block.
+NATURAL_KEYS = {
+    'extrinsics': ('number', 'extrinsic_id'),
+    'events': ('number', 'event_id'),
+    'logs': ('number', 'log_id')
+}
+
+# Integer position of each row within its block, the part of its id after the block
+# number: (column, id column, key columns of the index listings are read in order by).
+# Recent extrinsics are listed newest first, recent events by block newest first and
+# in block order within a block.
+SORT_KEYS = {
+    'extrinsics': ('extrinsic_index', 'extrinsic_id', 'number, extrinsic_index'),
+    'events': ('event_index', 'event_id', 'number DESC, event_index')
+}
+
+# Key columns of the index that serves the pallet and method filters of each
+# table, in the order the filtered listings are read in
+PALLET_METHOD_KEYS = {
+    'extrinsics': 'pallet_method_id, number DESC, extrinsic_index DESC',
+    'events': 'pallet_method_id, number DESC, event_index'
+}
+
+# Ids of the pallet and method pairs of each chain, as seen by this process
+_pallet_method_ids = {}
+
+# Statements that use these clauses must alias the target table as "target".
+# A block is only rewritten when its finality (or, after a reorg, its hash) changes.
+BLOCK_UPSERT = """
         ON CONFLICT (number) DO UPDATE SET
         relay_chain = EXCLUDED.relay_chain,
         chain = EXCLUDED.chain,
@@ -212,31 +309,576 @@ def insert_basic_block_data(connection, basic_block_data, chain, relay_chain):
         extrinsics_count = EXCLUDED.extrinsics_count,
         events_count = EXCLUDED.events_count,
         logs_count = EXCLUDED.logs_count
+        WHERE target.finalized IS DISTINCT FROM EXCLUDED.finalized
+        OR target.hash IS DISTINCT FROM EXCLUDED.hash
         """
 
-        values = (
-            basic_block_data['relay_chain'],
-            basic_block_data['chain'],
-            basic_block_data['timestamp'],
-            basic_block_data['number'],
-            basic_block_data['block_hash'],
-            basic_block_data['parent_hash'],
-            basic_block_data['state_root'],
-            basic_block_data['extrinsics_root'],
-            basic_block_data['author'],
-            basic_block_data['finalized'],
-            basic_block_data['extrinsics_count'],
-            basic_block_data['events_count'],
-            basic_block_data['logs_count']
+def upsert_clause(key_columns, columns):
+    """
+    Build an ON CONFLICT clause that updates a row only if one of its values changed.
+    """
+    updated = [column for column in columns if column not in key_columns]
+    return f"""
+        ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET
+        {', '.join(f'{column} = EXCLUDED.{column}' for column in updated)}
+        WHERE ({', '.join(f'target.{column}' for column in updated)})
+        IS DISTINCT FROM ({', '.join(f'EXCLUDED.{column}' for column in updated)})
+        """
+
+EXTRINSIC_UPSERT = upsert_clause(NATURAL_KEYS['extrinsics'], EXTRINSIC_COLUMNS)
+EVENT_UPSERT = upsert_clause(NATURAL_KEYS['events'], EVENT_COLUMNS)
+LOG_UPSERT = upsert_clause(NATURAL_KEYS['logs'], LOG_COLUMNS)
+
+def is_partitioned(cursor, table_name):
+    cursor.execute("""
+        SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid
+        WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace
+    """, (table_name,))
+    return cursor.fetchone() is not None
+
+def has_column(cursor, table_name, column):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s AND column_name = %s
+    """, (table_name, column))
+    return cursor.fetchone() is not None
+
+def has_index(cursor, table_name, index_name):
+    cursor.execute("SELECT 1 FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s AND indexname = %s",
+                   (table_name, index_name))
+    return cursor.fetchone() is not None
+
+def is_empty(cursor, table_name):
+    cursor.execute(f"SELECT NOT EXISTS (SELECT 1 FROM {table_name})")
+    return cursor.fetchone()[0]
+
+def uses_binary_ids(cursor, table_name):
+    cursor.execute("""
+        SELECT 1 FROM pg_attribute
+        WHERE attrelid = to_regclass(%s) AND attname = 'hash' AND atttypid = 'bytea'::regtype
+    """, (table_name,))
+    return cursor.fetchone() is not None
+
+def encode_binary_ids(connection, chain, relay_chain, block_rows_list, binary_ids=False):
+    """
+    Convert the hashes and addresses of some blocks' rows to bytes, in place,
+    for the tables of the chain that store binary ids.
+
+    Each table's format is looked up once per process. With binary_ids, tables
+    still storing text are looked up again for every call, so the rows follow
+    them as soon as migrate_schema.py --binary_ids has converted them. The
+    lookup is committed, so call this outside of a write transaction.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection object.
+        chain (str): The name of the chain.
+        relay_chain (str): The name of the relay chain.
+        block_rows_list (list): Block rows as returned by write_block.build_block_rows.
+        binary_ids (bool): Whether the ingest runs with binary ids.
+    """
+    for table, columns in BINARY_ID_COLUMNS.items():
+        table_name = f"{table}_{relay_chain}_{chain}"
+        if table_name not in _binary_id_tables or (binary_ids and not _binary_id_tables[table_name]):
+            cursor = connection.cursor()
+            try:
+                _binary_id_tables[table_name] = uses_binary_ids(cursor, table_name)
+            finally:
+                cursor.close()
+            connection.commit()
+        if not _binary_id_tables[table_name]:
+            continue
+        if table == 'blocks':
+            rows = [block_rows['block'] for block_rows in block_rows_list]
+        else:
+            rows = [row for block_rows in block_rows_list for row in block_rows[table]]
+        for row in rows:
+            for column, key in columns.items():
+                try:
+                    row[key] = encode_id(column, row[key])
+                except ValueError as e:
+                    raise ValueError(f"Cannot store {key} {row[key]!r} of block {row['number']} "
+                                     f"in the binary {column} column of {table_name}: {e}") from e
+
+def leaf_tables(cursor, table_names):
+    """
+    List the tables that hold the rows of the given tables: the table itself
+    for a plain table and its partitions for a partitioned one. Missing
+    tables are skipped.
+    """
+    cursor.execute("""
+        SELECT c.oid::regclass::text FROM pg_class c
+        WHERE c.relkind = 'r' AND c.oid IN (
+            SELECT to_regclass(t.name) FROM unnest(%(tables)s::text[]) AS t(name)
+            UNION
+            SELECT p.relid FROM unnest(%(tables)s::text[]) AS t(name), pg_partition_tree(to_regclass(t.name)) p
         )
+        ORDER BY 1
+    """, {'tables': list(table_names)})
+    return [row[0] for row in cursor.fetchall()]
 
-        cursor.execute(insert_query, values)
-        connection.commit()
+def partition_bounds(first_block, last_block, partition_size):
+    """
+    List the (lower, upper) bounds of the partitions covering a block range.
+    """
+    lower = first_block - first_block % partition_size
+    return [(bound, bound + partition_size) for bound in range(lower, last_block + 1, partition_size)]
+
+def create_partitions(connection, table_name, first_block, last_block, partition_size):
+    """
+    Create the partitions of a range-partitioned table that cover a block range.
+
+    Each partition is created and committed on its own, so it only holds the
+    parent table's lock for a moment. Partitions created concurrently by
+    another ingest process are skipped.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection object.
+        table_name (str): The partitioned table.
+        first_block (int): The first block that must be covered.
+        last_block (int): The last block that must be covered.
+        partition_size (int): Blocks per partition.
+    """
+    created = _created_partitions.setdefault(table_name, set())
+    cursor = connection.cursor()
+    try:
+        for lower, upper in partition_bounds(first_block, last_block, partition_size):
+            if lower in created:
+                continue
+            try:
+                cursor.execute(f"CREATE TABLE IF NOT EXISTS {table_name}_p{lower} PARTITION OF {table_name} "
+                               f"FOR VALUES FROM ({lower}) TO ({upper})")
+                connection.commit()
+            except (errors.DuplicateTable, errors.UniqueViolation):
+                connection.rollback()
+            created.add(lower)
+    finally:
+        cursor.close()
+
+def ensure_partitions(connection, chain, relay_chain, first_block, last_block, partition_size):
+    """
+    Make sure the partitioned tables can take a block range.
+
+    One partition beyond last_block is created ahead of time, so the live
+    ingest never waits on DDL when it crosses into the next partition.
+    Tables that are not partitioned are left alone. Partitions are committed
+    as they are created, so call this outside of a write transaction.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection object.
+        chain (str): The name of the chain.
+        relay_chain (str): The name of the relay chain.
+        first_block (int): The first block about to be written.
+        last_block (int): The last block about to be written.
+        partition_size (int): Blocks per partition.
+    """
+    for table in PARTITIONED_TABLES:
+        table_name = f"{table}_{relay_chain}_{chain}"
+        # Unpartitioned tables are checked again, as migrate_schema.py may have partitioned them since
+        if not _partitioned_tables.get(table_name):
+            cursor = connection.cursor()
+            try:
+                _partitioned_tables[table_name] = is_partitioned(cursor, table_name)
+            finally:
+                cursor.close()
+            connection.commit()
+        if _partitioned_tables[table_name]:
+            create_partitions(connection, table_name, first_block, last_block + partition_size, partition_size)
+
+def maintenance_lock_key(chain, relay_chain):
+    """
+    Name of the advisory lock that bulk loads hold shared and database
+    maintenance takes exclusively, so maintenance never runs during a bulk load.
+    """
+    return f"dotlake-maintenance:{relay_chain}_{chain}"
+
+def create_natural_keys(cursor, chain, relay_chain):
+    """
+    Add the unique natural keys to the extrinsics, events and logs tables.
+
+    The keys are built on tables that are still empty. Tables created before
+    the keys existed may hold duplicate rows from retried writes, which
+    migrate_schema.py removes in batches before it builds the key without
+    blocking writes. Until then their upserts fail, so a message is printed.
+
+    Args:
+        cursor (psycopg2.extensions.cursor): A cursor in the caller's transaction.
+        chain (str): The name of the chain.
+        relay_chain (str): The name of the relay chain.
+    """
+    logs_table = f"logs_{relay_chain}_{chain}"
+    if not has_column(cursor, logs_table, 'log_id'):
+        cursor.execute(f"ALTER TABLE {logs_table} ADD COLUMN log_id VARCHAR(255)")
+    for table, key_columns in NATURAL_KEYS.items():
+        table_name = f"{table}_{relay_chain}_{chain}"
+        index_name = f"{table_name}_natural_key"
+        if has_index(cursor, table_name, index_name):
+            continue
+        if is_empty(cursor, table_name):
+            cursor.execute(f"CREATE UNIQUE INDEX {index_name} ON {table_name} ({', '.join(key_columns)})")
+        else:
+            print(f"{table_name} has no natural key, so blocks cannot be written to it. "
+                  f"Use migrate_schema.py to remove its duplicate rows and build the key.")
+
+def create_sort_keys(cursor, chain, relay_chain):
+    """
+    Add the integer sort keys of SORT_KEYS to the extrinsics and events
+    tables, and the indexes listings are read in order from.
+
+    Tables created before the keys existed only get the nullable column,
+    which the ingest writes for every new row. migrate_schema.py fills it in
+    for the existing rows in batches and builds the index without blocking
+    writes, so a message is printed until then.
+
+    Args:
+        cursor (psycopg2.extensions.cursor): A cursor in the caller's transaction.
+        chain (str): The name of the chain.
+        relay_chain (str): The name of the relay chain.
+    """
+    for table, (column, _, index_columns) in SORT_KEYS.items():
+        table_name = f"{table}_{relay_chain}_{chain}"
+        if not has_column(cursor, table_name, column):
+            cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} INT")
+        index_name = f"{table_name}_block_order"
+        if has_index(cursor, table_name, index_name):
+            continue
+        if is_empty(cursor, table_name):
+            cursor.execute(f"CREATE INDEX {index_name} ON {table_name} ({index_columns})")
+        else:
+            print(f"{table_name} has no {column} for its existing rows. "
+                  f"Use migrate_schema.py to fill it in and build the {index_name} index.")
+
+def create_pallet_methods(cursor, chain, relay_chain):
+    """
+    Create the pallet_methods table of a chain, which numbers every pallet and
+    method pair seen, and the indexes the pallet and method filters use.
+
+    Extrinsics and events tables created before it existed store the pallet
+    and method names in every row. They get the nullable pallet_method_id
+    column, which the ingest writes for new rows, and a trigger that keeps
+    filling in the names for other readers. migrate_schema.py fills in the
+    ids of the existing rows in batches and builds the index without blocking
+    writes, and drops the names on request, so a message is printed until then.
+
+    Args:
+        cursor (psycopg2.extensions.cursor): A cursor in the caller's transaction.
+        chain (str): The name of the chain.
+        relay_chain (str): The name of the relay chain.
+    """
+    pallet_methods_table = f"pallet_methods_{relay_chain}_{chain}"
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {pallet_methods_table} (
+            id SERIAL PRIMARY KEY,
+            pallet VARCHAR(255) NOT NULL,
+            method VARCHAR(255) NOT NULL,
+            UNIQUE (pallet, method)
+        )
+    """)
+    for table, index_columns in PALLET_METHOD_KEYS.items():
+        table_name = f"{table}_{relay_chain}_{chain}"
+        if not has_column(cursor, table_name, 'pallet_method_id'):
+            cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN pallet_method_id INT")
+        if has_column(cursor, table_name, 'pallet'):
+            create_pallet_method_names(cursor, table_name, pallet_methods_table)
+            print(f"{table_name} still stores pallet and method names. Use migrate_schema.py to fill in the "
+                  f"pallet_method_id of its existing rows, and --drop_pallet_method_names once the API reads the ids.")
+        index_name = f"{table_name}_pallet_method"
+        if has_index(cursor, table_name, index_name):
+            continue
+        if is_empty(cursor, table_name):
+            cursor.execute(f"CREATE INDEX {index_name} ON {table_name} ({index_columns})")
+        else:
+            print(f"{table_name} has no {index_name} index. Use migrate_schema.py to build it.")
+
+def create_pallet_method_names(cursor, table_name, pallet_methods_table):
+    """
+    Fill in the pallet and method names of the rows written to a table that
+    still has the name columns, from their pallet_method_id.
+    """
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION {pallet_methods_table}_names() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            SELECT pallet, method INTO NEW.pallet, NEW.method FROM {pallet_methods_table} WHERE id = NEW.pallet_method_id;
+            RETURN NEW;
+        END
+        $$
+    """)
+    cursor.execute("SELECT 1 FROM pg_trigger WHERE tgrelid = to_regclass(%s) AND tgname = 'pallet_method_names'",
+                   (table_name,))
+    if cursor.fetchone() is None:
+        cursor.execute(f"""
+            CREATE TRIGGER pallet_method_names BEFORE INSERT OR UPDATE OF pallet_method_id ON {table_name}
+            FOR EACH ROW WHEN (NEW.pallet_method_id IS NOT NULL) EXECUTE FUNCTION {pallet_methods_table}_names()
+        """)
+
+def intern_pallet_methods(connection, chain, relay_chain, block_rows_list):
+    """
+    Set the pallet_method_id of the extrinsics and events of some blocks.
+
+    Ids are cached by this process. Pairs it has not seen before are looked
+    up in the pallet_methods table and added to it if they are new, which is
+    committed right away, so call this outside of a write transaction. An id
+    is never reused, so one cached by a process stays valid.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection object.
+        chain (str): The name of the chain.
+        relay_chain (str): The name of the relay chain.
+        block_rows_list (list): Block rows as returned by write_block.build_block_rows.
+    """
+    ids = _pallet_method_ids.setdefault(f"{relay_chain}_{chain}", {})
+    rows = [row for block_rows in block_rows_list for table in ('extrinsics', 'events') for row in block_rows[table]]
+    missing = sorted({(row['pallet'], row['method']) for row in rows} - ids.keys())
+    if missing:
+        pallets, methods = [list(names) for names in zip(*missing)]
+        cursor = connection.cursor()
+        try:
+            # Pairs are inserted in sorted order, so concurrent ingest processes cannot deadlock
+            cursor.execute(f"""
+                INSERT INTO pallet_methods_{relay_chain}_{chain} (pallet, method)
+                SELECT * FROM unnest(%s::varchar[], %s::varchar[])
+                ON CONFLICT (pallet, method) DO NOTHING
+            """, (pallets, methods))
+            cursor.execute(f"""
+                SELECT id, pallet, method FROM pallet_methods_{relay_chain}_{chain}
+                WHERE (pallet, method) IN (SELECT * FROM unnest(%s::varchar[], %s::varchar[]))
+            """, (pallets, methods))
+            found = {(pallet, method): pallet_method_id for pallet_method_id, pallet, method in cursor.fetchall()}
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+        ids.update(found)
+    for row in rows:
+        row['pallet_method_id'] = ids[(row['pallet'], row['method'])]
+
+def create_event_counters(cursor, chain, relay_chain):
+    """
+    Keep exact per pallet and method row counts of the events table.
+
+    Statement-level triggers append the net change of every write to the
+    event_count_deltas table, which only ever receives inserts so that
+    concurrent writers never wait on each other. The database maintenance
+    service folds the deltas into event_counts, and the API adds up both
+    tables instead of counting the events. Events are counted by the id of
+    their pallet and method pair. Rows without one, written before the ids
+    existed and not yet migrated, are counted once they get it.
+
+    The counts are seeded from the events table when its triggers are
+    created, in the transaction that holds the trigger lock, so no write is
+    missed or counted twice.
+
+    Args:
+        cursor (psycopg2.extensions.cursor): A cursor in the caller's transaction.
+        chain (str): The name of the chain.
+        relay_chain (str): The name of the relay chain.
+    """
+    events_table = f"events_{relay_chain}_{chain}"
+    counts_table = f"event_counts_{relay_chain}_{chain}"
+    deltas_table = f"event_count_deltas_{relay_chain}_{chain}"
+    cursor.execute("SELECT 1 FROM pg_trigger WHERE tgrelid = to_regclass(%s) AND tgname = %s",
+                   (events_table, f"{events_table}_count_insert"))
+    if cursor.fetchone():
+        return
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {counts_table} (
+            pallet_method_id INT PRIMARY KEY,
+            count BIGINT
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {deltas_table} (
+            pallet_method_id INT,
+            delta BIGINT
+        )
+    """)
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION {events_table}_count() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO {deltas_table} (pallet_method_id, delta)
+                SELECT pallet_method_id, count(*) FROM new_rows WHERE pallet_method_id IS NOT NULL GROUP BY 1;
+            ELSIF TG_OP = 'DELETE' THEN
+                INSERT INTO {deltas_table} (pallet_method_id, delta)
+                SELECT pallet_method_id, -count(*) FROM old_rows WHERE pallet_method_id IS NOT NULL GROUP BY 1;
+            ELSE
+                INSERT INTO {deltas_table} (pallet_method_id, delta)
+                SELECT pallet_method_id, sum(delta) FROM (
+                    SELECT pallet_method_id, 1 AS delta FROM new_rows
+                    UNION ALL
+                    SELECT pallet_method_id, -1 FROM old_rows
+                ) changes
+                WHERE pallet_method_id IS NOT NULL
+                GROUP BY 1 HAVING sum(delta) <> 0;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for operation, transition_tables in (('insert', 'NEW TABLE AS new_rows'),
+                                         ('update', 'OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+                                         ('delete', 'OLD TABLE AS old_rows')):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {events_table}_count_{operation} ON {events_table}")
+        cursor.execute(f"""
+            CREATE TRIGGER {events_table}_count_{operation}
+            AFTER {operation.upper()} ON {events_table}
+            REFERENCING {transition_tables}
+            FOR EACH STATEMENT EXECUTE FUNCTION {events_table}_count()
+        """)
+
+    # The new triggers hold off writers until commit, so the seed is consistent with them
+    cursor.execute(f"TRUNCATE {counts_table}, {deltas_table}")
+    cursor.execute(f"""
+        INSERT INTO {counts_table} (pallet_method_id, count)
+        SELECT pallet_method_id, count(*) FROM {events_table} WHERE pallet_method_id IS NOT NULL GROUP BY 1
+    """)
+    print(f"Counted the events of {events_table} by pallet and method")
+
+def fold_event_counts(cursor, chain, relay_chain):
+    """
+    Move the pending deltas of create_event_counters into the event counts.
+
+    Returns:
+        int: The number of delta rows folded.
+    """
+    cursor.execute(f"""
+        WITH folded AS (
+            DELETE FROM event_count_deltas_{relay_chain}_{chain} RETURNING pallet_method_id, delta
+        ), summed AS (
+            INSERT INTO event_counts_{relay_chain}_{chain} AS target (pallet_method_id, count)
+            SELECT pallet_method_id, sum(delta) FROM folded GROUP BY 1
+            ON CONFLICT (pallet_method_id) DO UPDATE SET count = target.count + EXCLUDED.count
+        )
+        SELECT count(*) FROM folded
+    """)
+    return cursor.fetchone()[0]
+
+def block_channel(chain, relay_chain):
+    """
+    Name of the notification channel on which committed blocks of a chain are announced.
+    """
+    return f"dotlake_blocks_{relay_chain}_{chain}"
+
+def notify_blocks_committed(connection, chain, relay_chain, first_block, last_block):
+    """
+    Announce that the current transaction writes blocks first_block to last_block.
+
+    PostgreSQL delivers the notification to the listeners when the
+    transaction commits, after all its rows are visible, and drops it if the
+    transaction rolls back.
+
+    Args:
+        connection (psycopg2.extensions.connection): The connection holding the transaction.
+        chain (str): The name of the chain.
+        relay_chain (str): The name of the relay chain.
+        first_block (int): The lowest block number written.
+        last_block (int): The highest block number written.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT pg_notify(%s, %s)", (block_channel(chain, relay_chain),
+                                                   json.dumps({'first': int(first_block), 'last': int(last_block)})))
+    finally:
+        cursor.close()
+
+def basic_block_values(basic_block_data):
+    return (
+        basic_block_data['relay_chain'],
+        basic_block_data['chain'],
+        basic_block_data['timestamp'],
+        basic_block_data['number'],
+        basic_block_data['block_hash'],
+        basic_block_data['parent_hash'],
+        basic_block_data['state_root'],
+        basic_block_data['extrinsics_root'],
+        basic_block_data['author'],
+        basic_block_data['finalized'],
+        basic_block_data['extrinsics_count'],
+        basic_block_data['events_count'],
+        basic_block_data['logs_count']
+    )
+
+def extrinsic_values(extrinsics):
+    return (
+        extrinsics['relay_chain'],
+        extrinsics['chain'],
+        extrinsics['timestamp'],
+        extrinsics['number'],
+        extrinsics['block_hash'],
+        extrinsics['extrinsic_id'],
+        extrinsics['extrinsic_index'],
+        extrinsics['pallet_method_id'],
+        json.dumps(extrinsics['args']),
+        json.dumps(extrinsics['info']),
+        extrinsics['extrinsic_hash'],
+        extrinsics['tip'],
+        extrinsics['nonce'],
+        json.dumps(extrinsics['signature']),
+        json.dumps(extrinsics['era']),
+        extrinsics['success'],
+        extrinsics['pays_fee'],
+        extrinsics['event_count']
+    )
+
+def event_values(events):
+    return (
+        events['relay_chain'],
+        events['chain'],
+        events['timestamp'],
+        events['number'],
+        events['block_hash'],
+        events['extrinsic_id'],
+        events['event_id'],
+        events['event_index'],
+        events['pallet_method_id'],
+        json.dumps(events['data']),
+        events['source']
+    )
+
+def log_values(logs):
+    return (
+        logs['relay_chain'],
+        logs['chain'],
+        logs['timestamp'],
+        logs['number'],
+        logs['block_hash'],
+        logs['type'],
+        logs['index'],
+        json.dumps(logs['value']),
+        logs['log_id']
+    )
+
+def insert_basic_block_data(connection, basic_block_data, chain, relay_chain, commit=True):
+    """
+    Insert basic block data into the PostgreSQL database.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection object.
+        basic_block_data (dict): The basic block data to be inserted.
+        chain (str): The name of the chain.
+        relay_chain (str): The name of the relay chain.
+        commit (bool): Whether to commit, or leave the row in the caller's transaction.
+    """
+    try:
+        cursor = connection.cursor()
+        
+        insert_query = f"""
+        INSERT INTO blocks_{relay_chain}_{chain} AS target
+        ({', '.join(BLOCK_COLUMNS)})
+        VALUES ({', '.join(['%s'] * len(BLOCK_COLUMNS))})
+        {BLOCK_UPSERT}"""
+
+        cursor.execute(insert_query, basic_block_values(basic_block_data))
+        if commit:
+            connection.commit()
         print(f"Block {basic_block_data['number']} inserted/updated successfully")  
     except Error as e:
         print(f"Error inserting basic block data: {e}")
+        raise
 
-def insert_extrinsics(connection, extrinsics, chain, relay_chain):
+def insert_extrinsics(connection, extrinsics, chain, relay_chain, commit=True):
     """
     Insert extrinsics data into the PostgreSQL database.
 
@@ -245,44 +887,26 @@ def insert_extrinsics(connection, extrinsics, chain, relay_chain):
         extrinsics (dict): The extrinsics data to be inserted.
         chain (str): The name of the chain.
         relay_chain (str): The name of the relay chain.
+        commit (bool): Whether to commit, or leave the row in the caller's transaction.
     """
     try:
         cursor = connection.cursor()
         
         insert_query = f"""
-        INSERT INTO extrinsics_{relay_chain}_{chain} 
-        (relay_chain, chain, timestamp, number, hash, extrinsic_id, pallet, method, args, info, extrinsic_hash, tip, nonce, signature, era, success, pays_fee, event_count)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
+        INSERT INTO extrinsics_{relay_chain}_{chain} AS target
+        ({', '.join(EXTRINSIC_COLUMNS)})
+        VALUES ({', '.join(['%s'] * len(EXTRINSIC_COLUMNS))})
+        {EXTRINSIC_UPSERT}"""
 
-        values = (
-            extrinsics['relay_chain'],
-            extrinsics['chain'],
-            extrinsics['timestamp'],
-            extrinsics['number'],
-            extrinsics['block_hash'],
-            extrinsics['extrinsic_id'],
-            extrinsics['pallet'],
-            extrinsics['method'],
-            json.dumps(extrinsics['args']),
-            json.dumps(extrinsics['info']),
-            extrinsics['extrinsic_hash'],
-            extrinsics['tip'],
-            extrinsics['nonce'],
-            json.dumps(extrinsics['signature']),
-            json.dumps(extrinsics['era']),
-            extrinsics['success'],
-            extrinsics['pays_fee'],
-            extrinsics['event_count']
-        )
-
-        cursor.execute(insert_query, values)
-        connection.commit() 
+        cursor.execute(insert_query, extrinsic_values(extrinsics))
+        if commit:
+            connection.commit() 
         print(f"Extrinsics {extrinsics['extrinsic_id']} inserted/updated successfully")
     except Error as e:
         print(f"Error inserting extrinsics: {e}")
+        raise
 
-def insert_events(connection, events, chain, relay_chain):
+def insert_events(connection, events, chain, relay_chain, commit=True):
     """
     Insert events data into the PostgreSQL database.
 
@@ -291,37 +915,26 @@ def insert_events(connection, events, chain, relay_chain):
         events (dict): The events data to be inserted.
         chain (str): The name of the chain.
         relay_chain (str): The name of the relay chain.
+        commit (bool): Whether to commit, or leave the row in the caller's transaction.
     """
     try:
         cursor = connection.cursor()
         
         insert_query = f"""
-        INSERT INTO events_{relay_chain}_{chain} 
-        (relay_chain, chain, timestamp, number, hash, extrinsic_id, event_id, pallet, method, data, source)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-
-        values = (
-            events['relay_chain'],
-            events['chain'],
-            events['timestamp'],
-            events['number'],
-            events['block_hash'],
-            events['extrinsic_id'],
-            events['event_id'],
-            events['pallet'],   
-            events['method'],
-            json.dumps(events['data']),
-            events['source']
-        )
+        INSERT INTO events_{relay_chain}_{chain} AS target
+        ({', '.join(EVENT_COLUMNS)})
+        VALUES ({', '.join(['%s'] * len(EVENT_COLUMNS))})
+        {EVENT_UPSERT}"""
 
-        cursor.execute(insert_query, values)
-        connection.commit()
+        cursor.execute(insert_query, event_values(events))
+        if commit:
+            connection.commit()
         print(f"Event {events['event_id']} inserted/updated successfully")
     except Error as e:
         print(f"Error inserting events: {e}")
+        raise
 
-def insert_logs(connection, logs, chain, relay_chain):
+def insert_logs(connection, logs, chain, relay_chain, commit=True):
     """
     Insert logs data into the PostgreSQL database.
 
@@ -330,32 +943,121 @@ def insert_logs(connection, logs, chain, relay_chain):
         logs (dict): The logs data to be inserted.
         chain (str): The name of the chain.
         relay_chain (str): The name of the relay chain.
+        commit (bool): Whether to commit, or leave the row in the caller's transaction.
     """
     try:
         cursor = connection.cursor()
         
         insert_query = f"""
-        INSERT INTO logs_{relay_chain}_{chain} 
-        (relay_chain, chain, timestamp, number, hash, type, index, value)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """
+        INSERT INTO logs_{relay_chain}_{chain} AS target
+        ({', '.join(LOG_COLUMNS)})
+        VALUES ({', '.join(['%s'] * len(LOG_COLUMNS))})
+        {LOG_UPSERT}"""
 
-        values = (
-            logs['relay_chain'],
-            logs['chain'],
-            logs['timestamp'],
-            logs['number'],
-            logs['block_hash'],
-            logs['type'],
-            logs['index'],
-            json.dumps(logs['value'])
+        cursor.execute(insert_query, log_values(logs))
+        if commit:
+            connection.commit()
+        print(f"Log {logs['index']} inserted/updated successfully")
+    except Error as e:
+        print(f"Error inserting logs: {e}")
+        raise
+
+def insert_blocks_batch(connection, block_rows_list, chain, relay_chain, page_size=1000, commit=True):
+    """
+    Insert the rows of one or more blocks with multi-row statements in a single transaction.
+
+    Each table gets one INSERT ... VALUES statement per page_size rows instead of
+    one statement and one commit per row.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection object.
+        block_rows_list (list): Block rows as returned by write_block.build_block_rows.
+        chain (str): The name of the chain.
+        relay_chain (str): The name of the relay chain.
+        page_size (int): The maximum number of rows per statement.
+        commit (bool): Whether to commit, or leave the rows in the caller's transaction.
+    """
+    cursor = connection.cursor()
+    try:
+        execute_values(
+            cursor,
+            f"INSERT INTO blocks_{relay_chain}_{chain} AS target ({', '.join(BLOCK_COLUMNS)}) VALUES %s {BLOCK_UPSERT}",
+            [basic_block_values(block_rows['block']) for block_rows in block_rows_list],
+            page_size=page_size
         )
+        for table, columns, upsert, to_values in (
+            ('extrinsics', EXTRINSIC_COLUMNS, EXTRINSIC_UPSERT, extrinsic_values),
+            ('events', EVENT_COLUMNS, EVENT_UPSERT, event_values),
+            ('logs', LOG_COLUMNS, LOG_UPSERT, log_values)
+        ):
+            rows = [to_values(row) for block_rows in block_rows_list for row in block_rows[table]]
+            if rows:
+                execute_values(
+                    cursor,
+                    f"INSERT INTO {table}_{relay_chain}_{chain} AS target ({', '.join(columns)}) VALUES %s {upsert}",
+                    rows,
+                    page_size=page_size
+                )
 
-        cursor.execute(insert_query, values)
-        connection.commit()
-        print(f"Log {logs['index']} inserted/updated successfully")
+        if commit:
+            connection.commit()
     except Error as e:
-        print(f"Error inserting logs: {e}") 
+        print(f"Error inserting block batch: {e}")
+        raise
+    finally:
+        cursor.close()
+
+def query_checkpoint(connection, chain, relay_chain, start_block, end_block):
+    """
+    Fetch the high-water mark of a historical ingest range.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection object.
+        chain (str): The name of the chain.
+        relay_chain (str): The name of the relay chain.
+        start_block (int): The first block of the range.
+        end_block (int): The last block of the range.
+
+    Returns:
+        int: The last block committed in order, or None if the range has not been started.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+            SELECT high_water_mark FROM ingest_checkpoints
+            WHERE relay_chain = %s AND chain = %s AND start_block = %s AND end_block = %s
+        """, (relay_chain, chain, start_block, end_block))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    finally:
+        cursor.close()
+
+def save_checkpoint(connection, chain, relay_chain, start_block, end_block, high_water_mark, commit=True):
+    """
+    Record the last block of a historical ingest range committed in order.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection object.
+        chain (str): The name of the chain.
+        relay_chain (str): The name of the relay chain.
+        start_block (int): The first block of the range.
+        end_block (int): The last block of the range.
+        high_water_mark (int): The last block committed with no gaps before it.
+        commit (bool): Whether to commit, or leave the update in the caller's transaction.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO ingest_checkpoints (relay_chain, chain, start_block, end_block, high_water_mark, updated_at)
+            VALUES (%s, %s, %s, %s, %s, now())
+            ON CONFLICT (relay_chain, chain, start_block, end_block) DO UPDATE SET
+            high_water_mark = EXCLUDED.high_water_mark,
+            updated_at = EXCLUDED.updated_at
+        """, (relay_chain, chain, start_block, end_block, high_water_mark))
+        if commit:
+            connection.commit()
+    finally:
+        cursor.close()
 
 def close_connection(connection):
     """
@@ -369,6 +1071,30 @@ def close_connection(connection):
         print("PostgreSQL connection closed")
 
 
+def check_connection(connection):
+    """
+    Check that a PostgreSQL connection is open and answering queries.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection object.
+
+    Returns:
+        bool: True if the connection is usable, False otherwise.
+    """
+    if connection is None or connection.closed:
+        return False
+    try:
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        finally:
+            cursor.close()
+        connection.rollback()
+        return True
+    except Error:
+        return False
+
+
 def delete_table(connection, table_name):
     """
     Delete a table from the PostgreSQL database.
@@ -402,7 +1128,10 @@ def query(connection, query_str):
         cursor = connection.cursor()
         cursor.execute(query_str)
         columns = [desc[0] for desc in cursor.description]
-        results = cursor.fetchall()
+        # Binary ids arrive as memoryviews and are shown as the hashes and addresses they store
+        results = [tuple(decode_id(column, value) if isinstance(value, memoryview) else value
+                         for column, value in zip(columns, row))
+                   for row in cursor.fetchall()]
         df = pd.DataFrame(results, columns=columns)
         return df
     except Error as e:
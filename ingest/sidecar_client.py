@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import threading
+import httpx
+
+logger = logging.getLogger('sidecar-client')
+
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MAX_CONNECTIONS = 32
+DEFAULT_MAX_IN_FLIGHT = 16
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class AsyncSidecarClient:
+    """
+    Pooled async client for the Substrate API Sidecar.
+
+    Connections are kept alive and reused across requests, responses are
+    negotiated as gzip, every request has a timeout and the number of
+    requests in flight is bounded by a semaphore.
+    """
+
+    def __init__(self, base_url, timeout=DEFAULT_TIMEOUT, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        """
+        Args:
+            base_url (str): The sidecar base URL.
+            timeout (float): Seconds allowed for each request.
+            max_connections (int): The size of the keep-alive connection pool.
+            max_in_flight (int): The maximum number of concurrent requests.
+        """
+        self.base_url = base_url.rstrip('/')
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            headers={'Accept-Encoding': 'gzip'}
+        )
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def get(self, path, params=None):
+        """
+        Issue a GET request against the sidecar.
+
+        Args:
+            path (str): The request path, e.g. '/blocks/head'.
+            params (dict): Optional query parameters.
+
+        Returns:
+            httpx.Response: The response, which has not been status-checked.
+        """
+        async with self._in_flight:
+            return await self._client.get(path, params=params)
+
+    async def get_json(self, path, params=None):
+        response = await self.get(path, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def get_block(self, block_id):
+        """
+        Fetch a single block and check it is the one requested.
+
+        Args:
+            block_id (int): The block number to fetch.
+
+        Returns:
+            dict: The raw sidecar block payload.
+        """
+        block_data = await self.get_json(f'/blocks/{block_id}')
+        if int(block_id) != int(block_data['number']):
+            raise Exception(f"Block Id mismatch for {block_id}. Sidecar cloud run service returned wrong block. "
+                            f"Returned block data {block_data}")
+        return block_data
+
+    async def get_block_range(self, first_block, last_block):
+        """
+        Fetch a contiguous window of blocks with a single /blocks?range= call.
+
+        Every returned block is checked against the requested window. Blocks
+        missing from the response, returned twice or outside the window are
+        fetched individually instead, as is the whole window if the range
+        request fails. The other blocks of the response are kept.
+
+        Args:
+            first_block (int): The first block of the window.
+            last_block (int): The last block of the window, inclusive.
+
+        Returns:
+            dict: The raw sidecar block payloads keyed by block number.
+        """
+        try:
+            range_data = await self.get_json('/blocks', params={'range': f'{first_block}-{last_block}'})
+            if not isinstance(range_data, list):
+                raise Exception(f"Sidecar returned {type(range_data).__name__} instead of a list of blocks")
+        except Exception as e:
+            logger.warning(f"Range fetch {first_block}-{last_block} failed: {e}. Falling back to single blocks.")
+            range_data = []
+
+        blocks = {}
+        duplicates = set()
+        for block_data in range_data:
+            try:
+                block_id = int(block_data['number'])
+            except (KeyError, TypeError, ValueError):
+                logger.warning(f"Range fetch {first_block}-{last_block} returned a block without a number")
+                continue
+            if block_id < first_block or block_id > last_block:
+                logger.warning(f"Range fetch {first_block}-{last_block} returned block {block_id} outside the window")
+            elif block_id in blocks or block_id in duplicates:
+                # Neither copy can be trusted, so the block is fetched on its own
+                logger.warning(f"Range fetch {first_block}-{last_block} returned block {block_id} twice")
+                duplicates.add(block_id)
+                blocks.pop(block_id, None)
+            else:
+                blocks[block_id] = block_data
+
+        missing = [block_id for block_id in range(first_block, last_block + 1) if block_id not in blocks]
+        if missing:
+            fetched = await asyncio.gather(*(self.get_block(block_id) for block_id in missing))
+            blocks.update(zip(missing, fetched))
+        return blocks
+
+    async def get_chain_head(self):
+        head_data = await self.get_json('/blocks/head')
+        return int(head_data['number'])
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+class SidecarClient:
+    """
+    Blocking facade over AsyncSidecarClient for the threaded ingest.
+
+    The async client runs on a private event loop in a daemon thread, so
+    every caller thread shares one connection pool and one in-flight limit.
+    """
+
+    def __init__(self, base_url, **client_options):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='sidecar-client', daemon=True)
+        self._thread.start()
+        self._client = self._call(self._create_client(base_url, client_options))
+
+    async def _create_client(self, base_url, client_options):
+        # The semaphore must be created on the loop that will use it
+        return AsyncSidecarClient(base_url, **client_options)
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def get_json(self, path, params=None):
+        return self._call(self._client.get_json(path, params=params))
+
+    def get_block(self, block_id):
+        return self._call(self._client.get_block(block_id))
+
+    def get_block_range(self, first_block, last_block):
+        return self._call(self._client.get_block_range(first_block, last_block))
+
+    def get_chain_head(self):
+        return self._call(self._client.get_chain_head())
+
+    def close(self):
+        self._call(self._client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+def get_client(base_url, **client_options):
+    """
+    Return the process-wide client for a sidecar, creating it on first use.
+
+    Args:
+        base_url (str): The sidecar base URL.
+        **client_options: Options passed to AsyncSidecarClient when the client is created.
+
+    Returns:
+        SidecarClient: The shared client for base_url.
+    """
+    with _clients_lock:
+        client = _clients.get(base_url)
+        if client is None:
+            client = SidecarClient(base_url, **client_options)
+            _clients[base_url] = client
+        return client
@@ -11,6 +11,48 @@ if [[ -z "$END_BLOCK" ]]; then
   END_BLOCK=0
 fi
 
+if [[ -z "$INGEST_WORKERS" ]]; then
+  INGEST_WORKERS=8
+fi
+
+if [[ -z "$INGEST_FETCH_BATCH_SIZE" ]]; then
+  INGEST_FETCH_BATCH_SIZE=50
+fi
+
+if [[ -z "$INGEST_WRITE_MODE" ]]; then
+  INGEST_WRITE_MODE=batch
+fi
+
+if [[ -z "$INGEST_GROUP_COMMIT_BLOCKS" ]]; then
+  INGEST_GROUP_COMMIT_BLOCKS=1
+fi
+
+if [[ -z "$INGEST_GROUP_COMMIT_MS" ]]; then
+  INGEST_GROUP_COMMIT_MS=1000
+fi
+
+if [[ -z "$INGEST_PARTITION_SIZE" ]]; then
+  INGEST_PARTITION_SIZE=0
+fi
+
+if [[ -z "$INGEST_BULK_LOAD" ]]; then
+  INGEST_BULK_LOAD=false
+fi
+
+BULK_LOAD_ARG=""
+if [[ "$INGEST_BULK_LOAD" == "true" ]]; then
+  BULK_LOAD_ARG="--bulk_load"
+fi
+
+if [[ -z "$INGEST_BINARY_IDS" ]]; then
+  INGEST_BINARY_IDS=false
+fi
+
+BINARY_IDS_ARG=""
+if [[ "$INGEST_BINARY_IDS" == "true" ]]; then
+  BINARY_IDS_ARG="--binary_ids"
+fi
+
 echo "Connection Info"
 echo "Chain: $CHAIN"
 echo "Relay Chain: $RELAY_CHAIN"
@@ -30,11 +72,19 @@ echo "SQLAlchemy URI: $SQLALCHEMY_URI"
 echo "Ingest Mode: $INGEST_MODE"
 echo "Start Block: $START_BLOCK"
 echo "End Block: $END_BLOCK"
+echo "Ingest Workers: $INGEST_WORKERS"
+echo "Fetch Batch Size: $INGEST_FETCH_BATCH_SIZE"
+echo "Write Mode: $INGEST_WRITE_MODE"
+echo "Group Commit Blocks: $INGEST_GROUP_COMMIT_BLOCKS"
+echo "Group Commit Delay (ms): $INGEST_GROUP_COMMIT_MS"
+echo "Partition Size: $INGEST_PARTITION_SIZE"
+echo "Bulk Load: $INGEST_BULK_LOAD"
+echo "Binary IDs: $INGEST_BINARY_IDS"
 
 
 # Start the main.py script
 echo "Starting main.py script..."
-python3 main.py --chain "$CHAIN" --relay_chain "$RELAY_CHAIN" --wss "$WSS" --db_path "$DB_PATH" --database "$DB_TYPE" --db_project "$DB_PROJECT" --db_cred_path "$DB_CRED_PATH" --db_credentials "$DB_CREDENTIALS" --db_dataset "$DB_DATASET" --db_table "$DB_TABLE" --db_host "$DB_HOST" --db_port "$DB_PORT" --db_user "$DB_USER" --db_password "$DB_PASSWORD" --db_name "$DB_NAME" --ingest_mode "$INGEST_MODE" --start_block "$START_BLOCK" --end_block "$END_BLOCK" 2>&1 &
+python3 main.py --chain "$CHAIN" --relay_chain "$RELAY_CHAIN" --wss "$WSS" --db_path "$DB_PATH" --database "$DB_TYPE" --db_project "$DB_PROJECT" --db_cred_path "$DB_CRED_PATH" --db_credentials "$DB_CREDENTIALS" --db_dataset "$DB_DATASET" --db_table "$DB_TABLE" --db_host "$DB_HOST" --db_port "$DB_PORT" --db_user "$DB_USER" --db_password "$DB_PASSWORD" --db_name "$DB_NAME" --ingest_mode "$INGEST_MODE" --start_block "$START_BLOCK" --end_block "$END_BLOCK" --workers "$INGEST_WORKERS" --fetch_batch_size "$INGEST_FETCH_BATCH_SIZE" --write_mode "$INGEST_WRITE_MODE" --group_commit_blocks "$INGEST_GROUP_COMMIT_BLOCKS" --group_commit_ms "$INGEST_GROUP_COMMIT_MS" --partition_size "$INGEST_PARTITION_SIZE" $BULK_LOAD_ARG $BINARY_IDS_ARG 2>&1 &
 
 
 # Start the Streamlit app
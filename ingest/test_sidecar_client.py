@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tests of the sidecar range fetch against a mocked sidecar.
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from sidecar_client import AsyncSidecarClient
+
+
+def fetch_range(range_response, first_block=10, last_block=14):
+    """
+    Fetch a window from a sidecar whose range request returns range_response.
+
+    Returns:
+        tuple: The blocks by number and the numbers fetched one at a time.
+    """
+    single_fetches = []
+
+    def handler(request):
+        if request.url.path == '/blocks':
+            if isinstance(range_response, int):
+                return httpx.Response(range_response)
+            return httpx.Response(200, json=range_response)
+        block_id = int(request.url.path.rsplit('/', 1)[1])
+        single_fetches.append(block_id)
+        return httpx.Response(200, json={'number': str(block_id), 'single': True})
+
+    async def run():
+        client = AsyncSidecarClient('http://sidecar')
+        await client.aclose()
+        client._client = httpx.AsyncClient(base_url='http://sidecar', transport=httpx.MockTransport(handler))
+        try:
+            return await client.get_block_range(first_block, last_block)
+        finally:
+            await client.aclose()
+
+    return asyncio.run(run()), sorted(single_fetches)
+
+
+def block(number):
+    return {'number': str(number)}
+
+
+def test_complete_range_needs_no_single_fetches():
+    blocks, single_fetches = fetch_range([block(n) for n in range(10, 15)])
+    assert sorted(blocks) == list(range(10, 15))
+    assert single_fetches == []
+
+
+@pytest.mark.parametrize("range_response, refetched", [
+    ([block(10), block(11), block(13), block(14)], [12]),
+    ([block(10), block(11), block(12), block(12), block(13), block(14)], [12]),
+    ([block(10), block(11), block(12), block(13), block(13), block(13), block(14)], [13]),
+    ([block(9), block(10), block(11), block(12), block(13), block(14), block(15)], []),
+    ([block(10), block(11), {'hash': '0x'}, block(13), block(14)], [12]),
+])
+def test_only_bad_blocks_are_refetched(range_response, refetched):
+    blocks, single_fetches = fetch_range(range_response)
+    assert sorted(blocks) == list(range(10, 15))
+    assert single_fetches == refetched
+    assert [n for n, data in blocks.items() if data.get('single')] == refetched
+
+
+@pytest.mark.parametrize("range_response", [500, {'number': '10'}])
+def test_failed_range_is_refetched(range_response):
+    blocks, single_fetches = fetch_range(range_response)
+    assert sorted(blocks) == list(range(10, 15))
+    assert single_fetches == list(range(10, 15))
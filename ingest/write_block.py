@@ -1,23 +1,51 @@
-import requests
 from google.cloud import storage
 import datetime
 import json
 import logging
+from sidecar_client import get_client
 
-def writeBlock(request, database_info):
-    request_json = request
-    logging.basicConfig(level='INFO')
-    logging.getLogger('writeBlock-logger')
-    logger = logging.getLogger('writeBlock-logger')
-    block_id = request_json['blockId']
-    url = request_json['endpoint']
-    chain_name = request_json['chainName']
-    relay_chain = request_json['relayChain']
-    bucket = request_json['bucket']
-    block_data = requests.get(f'{url}/blocks/{block_id}').json()
-    if int(block_id) != int(block_data['number']):
-        raise Exception(f"Block Id mismatch for {block_id}. Sidecar cloud run service returned wrong block. "
-                        f"Returned block data {block_data}")
+def fetch_block(url, block_id):
+    """
+    Fetch a single block from the sidecar and check it is the one requested.
+
+    Args:
+        url (str): The sidecar base URL.
+        block_id (int): The block number to fetch.
+
+    Returns:
+        dict: The raw sidecar block payload.
+    """
+    return get_client(url).get_block(block_id)
+
+
+def fetch_block_range(url, first_block, last_block):
+    """
+    Fetch a contiguous window of blocks from the sidecar in one request.
+
+    Args:
+        url (str): The sidecar base URL.
+        first_block (int): The first block of the window.
+        last_block (int): The last block of the window, inclusive.
+
+    Returns:
+        dict: The raw sidecar block payloads keyed by block number.
+    """
+    return get_client(url).get_block_range(first_block, last_block)
+
+
+def build_block_rows(block_data, chain_name, relay_chain):
+    """
+    Flatten a sidecar block payload into the rows stored per table.
+
+    Args:
+        block_data (dict): The raw sidecar block payload.
+        chain_name (str): The name of the chain.
+        relay_chain (str): The name of the relay chain.
+
+    Returns:
+        dict: The block row under 'block' and lists of rows under
+        'extrinsics', 'events' and 'logs'.
+    """
     block_id = block_data['number']
 
     ts = [ex['args']['now'] for ex in block_data['extrinsics'] if ex['method']['pallet'] == 'timestamp']
@@ -71,6 +99,7 @@ def writeBlock(request, database_info):
             'relay_chain': relay_chain,
             'timestamp': block_data['timestamp'],
             'extrinsic_id': f'{block_id}-{index}',
+            'extrinsic_index': index,
             'pallet': extrinsic['method']['pallet'],
             'method': extrinsic['method']['method'],
             'args': extrinsic['args'],
@@ -95,6 +124,7 @@ def writeBlock(request, database_info):
             'timestamp': block_data['timestamp'],
             'extrinsic_id': None,
             'event_id': f'{block_id}-{len(events) + 1}',
+            'event_index': len(events) + 1,
             'pallet': event['method']['pallet'],
             'method': event['method']['method'],
             'data': event['data'],
@@ -110,6 +140,7 @@ def writeBlock(request, database_info):
             'timestamp': block_data['timestamp'],
             'extrinsic_id': None,
             'event_id': f'{block_id}-{len(events) + 1}',
+            'event_index': len(events) + 1,
             'pallet': event['method']['pallet'],
             'method': event['method']['method'],
             'data': event['data'],
@@ -126,6 +157,7 @@ def writeBlock(request, database_info):
                 'timestamp': block_data['timestamp'],
                 'extrinsic_id': f'{block_id}-{extrinsic_index}',
                 'event_id': f'{block_id}-{len(events) + 1}',
+                'event_index': len(events) + 1,
                 'pallet': event['method']['pallet'],
                 'method': event['method']['method'],
                 'data': event['data'],
@@ -133,7 +165,7 @@ def writeBlock(request, database_info):
             })
 
     logs = []
-    for log in block_data['logs']:
+    for index, log in enumerate(block_data['logs']):
         logs.append({
             'number': block_id,
             'block_hash': block_data['hash'],
@@ -142,7 +174,8 @@ def writeBlock(request, database_info):
             'timestamp': block_data['timestamp'],
             'type': log['type'],
             'index': log['index'],
-            'value': log['value']
+            'value': log['value'],
+            'log_id': f'{block_id}-{index}'
         })
 
     basic_block_data = {
@@ -161,17 +194,36 @@ def writeBlock(request, database_info):
         'logs_count': len(logs)
     }
 
+    return {
+        'block': basic_block_data,
+        'extrinsics': extrinsics,
+        'events': events,
+        'logs': logs
+    }
+
+
+def writeBlock(request, database_info):
+    request_json = request
+    logging.basicConfig(level='INFO')
+    logging.getLogger('writeBlock-logger')
+    logger = logging.getLogger('writeBlock-logger')
+    block_id = request_json['blockId']
+    url = request_json['endpoint']
+    chain_name = request_json['chainName']
+    relay_chain = request_json['relayChain']
+    bucket = request_json['bucket']
+    block_data = fetch_block(url, block_id)
+    block_rows = build_block_rows(block_data, chain_name, relay_chain)
+    block_id = block_data['number']
+
     # try:
-    from database_utils import connect_to_database, insert_block_data, close_connection, insert_basic_block_data, insert_extrinsics, insert_events, insert_logs
-    
-    db_connection = connect_to_database(database_info)
-    # insert_block_data(database_info , db_connection, block_data, chain_name, relay_chain)
-    insert_basic_block_data(database_info, db_connection, basic_block_data, chain_name, relay_chain)
-    insert_extrinsics(database_info, db_connection, extrinsics, chain_name, relay_chain)
-    insert_events(database_info, db_connection, events, chain_name, relay_chain)
-    insert_logs(database_info, db_connection, logs, chain_name, relay_chain)
+    from database_utils import insert_block_rows
+    from connection_pool import get_pool
+
+    with get_pool(database_info).connection() as db_connection:
+        # insert_block_data(database_info , db_connection, block_data, chain_name, relay_chain)
+        insert_block_rows(database_info, db_connection, block_rows, chain_name, relay_chain)
     print(f"Successfully inserted block {block_id} into {database_info['database']}")
-    close_connection(db_connection, database_info)
     # except Exception as e:
     #     print(f"Error inserting block {block_id} into {database_info['database']}: {str(e)}")
     #     return False